@@ -0,0 +1,183 @@
+import contextlib
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+
+from utils.profiler import Profiler
+from video_pose import VideoPose
+
+
+# VideoPose of the worker process, created once by initWorker and reused for every video of the worker
+worker_video_pose = None
+# error raised while creating the pose estimator of the worker process, reported as the error of each of its videos
+worker_error = None
+
+
+def initWorker(pose_estimator_factory):
+    """
+    Create the pose estimator of a worker process, so that its startup cost is paid once per worker, an error is
+    kept instead of raised, as the pool would otherwise restart the worker again and again
+    @param pose_estimator_factory: Function returning a PoseEstimatorBackend, a PoseEstimator with OpenPose if None
+    """
+    global worker_video_pose, worker_error
+    try:
+        if pose_estimator_factory is None:
+            from utils.pose_estimator import PoseEstimator
+            pose_estimator = PoseEstimator(face=False, hand=False)
+        else:
+            pose_estimator = pose_estimator_factory()
+        worker_video_pose = VideoPose(pose_estimator)
+    except Exception as e:
+        worker_error = repr(e)
+
+
+def analyzeVideo(video_path, options, quiet):
+    """
+    Analyze a video with the VideoPose of the worker process
+    @param video_path: Path of the video
+    @param options: Dictionary of arguments of VideoPose.analyze
+    @param quiet: Discard the output printed while analyzing the video
+    @return: Dictionary of the result of the video
+    """
+    profiler = Profiler()
+    result = {'video': video_path, 'worker': os.getpid(), 'frames': 0, 'time': 0.0, 'error': None}
+    if worker_error is not None:
+        result['error'] = 'worker failed to start: ' + worker_error
+        return result
+    start = time.perf_counter()
+    try:
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull) if quiet is True else contextlib.nullcontext():
+            worker_video_pose.analyze(video_path, profiler=profiler, **options)
+    except Exception as e:
+        result['error'] = repr(e)
+    result['time'] = time.perf_counter() - start
+    result['frames'] = len(profiler.getDurations('frame'))
+    return result
+
+
+class BatchVideoPose:
+    """
+    Analyze many videos with VideoPose on a pool of worker processes, e.g.
+
+        batch = BatchVideoPose(num_workers=4)
+        batch.analyze(BatchVideoPose.listVideos('videos'), fps=4, log=True, export_video=True)
+        batch.printSummary()
+
+    Every worker creates its pose estimator once and analyzes the videos given to it one after another, and the
+    outputs and log of each video are written to the directory of that video as with VideoPose.analyze
+    """
+
+    video_extensions = ('.mp4', '.avi', '.mov', '.mkv')
+
+    def __init__(self, num_workers=None, pose_estimator_factory=None, start_method='spawn'):
+        """
+        @param num_workers: Number of worker processes, the number of CPUs if not given
+        @param pose_estimator_factory: Picklable function returning a PoseEstimatorBackend, called once in each worker,
+                                       e.g. functools.partial(SyntheticPoseEstimator, num_people=20), a PoseEstimator
+                                       with OpenPose if not given
+        @param start_method: Start method of the worker processes, 'spawn' starts them without the state of this
+                             process, which OpenPose and CUDA require
+        """
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        if num_workers < 1:
+            raise Exception("argument 'num_workers' in BatchVideoPose() cannot be less than 1")
+        self.__num_workers = num_workers
+        self.__pose_estimator_factory = pose_estimator_factory
+        self.__context = multiprocessing.get_context(start_method)
+        self.__results = []
+        self.__elapsed = 0
+
+    @staticmethod
+    def listVideos(directory):
+        """
+        @param directory: Path of the directory
+        @return: Sorted list of paths of the videos in the directory
+        """
+        return [os.path.join(directory, file_name) for file_name in sorted(os.listdir(directory))
+                if os.path.splitext(file_name)[1].lower() in BatchVideoPose.video_extensions]
+
+    def analyze(self, video_paths, quiet=True, **options):
+        """
+        Analyze the videos on the worker processes, a video that fails is reported in the results and does not stop
+        the others
+        @param video_paths: List of paths of videos, or path of a directory of videos
+        @param quiet: Discard the output printed by the workers, the log of each video is kept with log=True
+        @param options: Arguments of VideoPose.analyze, except display_image and profiler
+        @return: List of dictionary of each video with 'video', 'worker' (process ID), 'frames', 'time' in seconds
+                 and 'error'
+        """
+        if 'profiler' in options:
+            raise Exception("argument 'profiler' cannot be passed to BatchVideoPose.analyze()")
+        if isinstance(video_paths, str):
+            video_paths = BatchVideoPose.listVideos(video_paths)
+        # images cannot be displayed from the worker processes
+        options['display_image'] = False
+        # the largest videos start first, so that a long video does not finish alone at the end
+        video_paths = sorted(video_paths, key=lambda path: os.path.getsize(path) if os.path.exists(path) else 0,
+                             reverse=True)
+
+        self.__results = []
+        start = time.perf_counter()
+        with self.__context.Pool(processes=min(self.__num_workers, max(len(video_paths), 1)), initializer=initWorker,
+                                 initargs=(self.__pose_estimator_factory,)) as pool:
+            tasks = [pool.apply_async(analyzeVideo, (video_path, options, quiet)) for video_path in video_paths]
+            for task in tasks:
+                result = task.get()
+                if result['error'] is None:
+                    print('{}: {} frames in {:.2f} s'.format(result['video'], result['frames'], result['time']))
+                else:
+                    print('{}: failed with {}'.format(result['video'], result['error']))
+                self.__results.append(result)
+        self.__elapsed = time.perf_counter() - start
+        return list(self.__results)
+
+    def getSummary(self):
+        """
+        @return: OrderedDict of worker process ID and 'overall' to dictionary of videos, frames, time in seconds and
+                 fps, the time of a worker is the time spent analyzing its videos and the overall time is the wall
+                 time of the last analyze
+        """
+        summary = OrderedDict()
+        for result in self.__results:
+            if result['worker'] not in summary:
+                summary[result['worker']] = {'videos': 0, 'frames': 0, 'time': 0.0}
+            summary[result['worker']]['videos'] += 1
+            summary[result['worker']]['frames'] += result['frames']
+            summary[result['worker']]['time'] += result['time']
+        summary['overall'] = {
+            'videos': len(self.__results),
+            'frames': sum(result['frames'] for result in self.__results),
+            'time': self.__elapsed
+        }
+        for stats in summary.values():
+            stats['fps'] = stats['frames'] / stats['time'] if stats['time'] > 0 else 0.0
+        return summary
+
+    def printSummary(self, logger=None):
+        lines = ['{:<10} {:>7} {:>8} {:>10} {:>8}'.format('Worker', 'Videos', 'Frames', 'Time (s)', 'FPS')]
+        for worker, stats in self.getSummary().items():
+            lines.append('{:<10} {:>7} {:>8} {:>10.2f} {:>8.2f}'.format(
+                str(worker), stats['videos'], stats['frames'], stats['time'], stats['fps']))
+        print('\n'.join(lines))
+        if logger is not None:
+            logger.info('Batch Summary:\n' + '\n'.join(lines))
+
+
+if __name__ == "__main__":
+
+    batch = BatchVideoPose(num_workers=2)
+    batch.analyze(
+        "videos",
+        fps=4,
+        max_frame=200,
+        classify_pose=True,
+        show_pose=True,
+        track_pose_id=True,
+        show_pose_id=True,
+        log=True,
+        export_video=True
+    )
+    batch.printSummary()
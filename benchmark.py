@@ -0,0 +1,925 @@
+import os
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+
+
+def benchmarkStartup(modules=None, repeat=5):
+    """
+    Measure the time taken to import each module in a fresh interpreter
+    @param modules: List of module names, all modules in utils if not given
+    @param repeat: Number of fresh interpreters started for each module
+    @return: Dictionary of module name to median import time in milliseconds
+    """
+    if modules is None:
+        modules = ['utils.' + file_name[:-3] for file_name in sorted(os.listdir(os.path.join(dir_path, 'utils')))
+                   if file_name.endswith('.py')]
+    code = "import time; t = time.perf_counter(); import {}; print(time.perf_counter() - t)"
+    results = dict()
+    for module in modules:
+        times = []
+        for i in range(repeat):
+            output = subprocess.run([sys.executable, '-c', code.format(module)], cwd=dir_path,
+                                    capture_output=True, text=True)
+            if output.returncode != 0:
+                break
+            times.append(float(output.stdout.strip().split('\n')[-1]) * 1000)
+        if len(times) == 0:
+            print('{:<30} failed to import'.format(module))
+            continue
+        results[module] = np.median(times)
+        print('{:<30} {:>10.2f} ms'.format(module, results[module]))
+    return results
+
+
+def benchmarkModelWarmUp():
+    """
+    Measure the time taken to load and trace the classifier models, and the first prediction after warming up
+    @return: Tuple of (warm up time, first prediction time) in milliseconds
+    """
+    from utils.pose_classifier import PoseClassifier
+
+    start = time.perf_counter()
+    PoseClassifier.warmUp()
+    warm_up = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    PoseClassifier.predictPoseModelBatch(np.zeros(shape=(1, 25, 3)))
+    first_prediction = (time.perf_counter() - start) * 1000
+    print('Model warm up: {:.2f} ms'.format(warm_up))
+    print('First prediction after warm up: {:.2f} ms'.format(first_prediction))
+    return warm_up, first_prediction
+
+
+def benchmarkNumpyBackend(batch_sizes=(1, 10, 30, 100), repeat=20, seed=0):
+    """
+    Compare the Keras and NumPy backends of PoseClassifier on load time, single-person and batched latency,
+    and the difference of their outputs
+    @param batch_sizes: Number of people in each batch
+    @param repeat: Number of predictions timed for each batch size
+    @param seed: Seed of the random keypoints
+    @return: Dictionary of backend to dictionary of batch size to mean latency in milliseconds
+    """
+    from utils.pose_classifier import PoseClassifier
+
+    rng = np.random.default_rng(seed)
+    batches = dict()
+    for batch_size in batch_sizes:
+        keypoints = rng.random(size=(batch_size, 25, 3)) * [640, 480, 1]
+        keypoints[rng.random(size=(batch_size, 25)) < 0.2] = 0
+        batches[batch_size] = keypoints
+
+    results = dict()
+    probabilities = dict()
+    for backend in PoseClassifier.Backend:
+        PoseClassifier.setBackend(backend)
+        start = time.perf_counter()
+        PoseClassifier.warmUp()
+        print('{} load and warm up: {:.2f} ms'.format(backend.name, (time.perf_counter() - start) * 1000))
+        results[backend] = dict()
+        probabilities[backend] = dict()
+        for batch_size, keypoints in batches.items():
+            start = time.perf_counter()
+            for i in range(repeat):
+                _, probabilities[backend][batch_size] = PoseClassifier.predictPoseModelBatch(keypoints)
+            results[backend][batch_size] = (time.perf_counter() - start) * 1000 / repeat
+            print('{} batch size {:>4}: {:>8.3f} ms'.format(backend.name, batch_size, results[backend][batch_size]))
+
+    for batch_size in batch_sizes:
+        difference = np.max(np.abs(probabilities[PoseClassifier.Backend.KERAS][batch_size] -
+                                   probabilities[PoseClassifier.Backend.NUMPY][batch_size]))
+        print('Batch size {:>4} max difference: {:.2e}'.format(batch_size, difference))
+    return results
+
+
+def loadDatasetKeypoints(dataset_path):
+    """
+    Load the keypoints and poses of a dataset created by generate_dataset.py
+    @param dataset_path: Path of the csv or pkl file
+    @return: tuple of (keypoints with shape number of people x 25 x 3, array of pose names)
+    """
+    import pandas as pd
+
+    if dataset_path.endswith('.pkl'):
+        df = pd.read_pickle(dataset_path)
+        keypoints = np.array([np.asarray(keypoint, dtype=float) for keypoint in df['KEYPOINTS']])
+    else:
+        df = pd.read_csv(dataset_path)
+        # numpy arrays are saved as their string representation in the csv file
+        keypoints = np.array([np.array(keypoint.replace('[', ' ').replace(']', ' ').split(), dtype=float)
+                              for keypoint in df['KEYPOINTS']])
+    return keypoints.reshape((-1, 25, 3)), df['POSE'].to_numpy()
+
+
+def benchmarkPredictionCache(dataset_path, steps=(0.005, 0.01, 0.02, 0.05, 0.1), max_size=4096, batch_size=20,
+                             model=False):
+    """
+    Measure the hit rate of the prediction cache and the accuracy of the predictions for each quantization step
+    @param dataset_path: Path of the dataset created by generate_dataset.py
+    @param steps: Quantization steps to be compared
+    @param max_size: Maximum size of the cache
+    @param batch_size: Number of people classified in each call, similar to the number of people in a frame
+    @param model: Use predictPoseModelBatch if True, otherwise use predictPoseBody25Batch
+    @return: Dictionary of step to dictionary of cache statistics, accuracy and agreement with the uncached predictions
+    """
+    from utils.pose_classifier import PoseClassifier
+
+    keypoints, labels = loadDatasetKeypoints(dataset_path)
+    if model is True:
+        predict = lambda x: PoseClassifier.predictPoseModelBatch(x)[0]
+    else:
+        predict = lambda x: PoseClassifier.predictPoseBody25Batch(x)[0]
+
+    def run():
+        start = time.perf_counter()
+        poses = np.concatenate([predict(keypoints[i:i + batch_size]) for i in range(0, len(keypoints), batch_size)])
+        return np.array([PoseClassifier.Pose(pose).name for pose in poses]), time.perf_counter() - start
+
+    PoseClassifier.disableCache()
+    reference, reference_time = run()
+    print('No cache: accuracy {:.4f}, {:.2f} s'.format(np.mean(reference == labels), reference_time))
+
+    results = dict()
+    for step in steps:
+        cache = PoseClassifier.enableCache(max_size=max_size, step=step)
+        poses, elapsed = run()
+        results[step] = cache.getStats()
+        results[step]['accuracy'] = np.mean(poses == labels)
+        results[step]['agreement'] = np.mean(poses == reference)
+        results[step]['time'] = elapsed
+        print('Step {:<6}: hit rate {:.4f}, evictions {}, accuracy {:.4f}, agreement {:.4f}, {:.2f} s'.format(
+            step, results[step]['hit_rate'], results[step]['evictions'], results[step]['accuracy'],
+            results[step]['agreement'], elapsed))
+    PoseClassifier.disableCache()
+    return results
+
+
+def randomPeople(rng, num_people, frame_width=1920, frame_height=1080):
+    """
+    Generate keypoints of people scattered randomly in a frame, with some parts missing
+    @param rng: numpy.random.Generator
+    @param num_people: Number of people
+    @param frame_width: Width of the frame
+    @param frame_height: Height of the frame
+    @return: 3D array, number of people x 25 keypoints x 3
+    """
+    centers = rng.random(size=(num_people, 1, 2)) * [frame_width, frame_height]
+    sizes = rng.uniform(60, 200, size=(num_people, 1, 1)) * [0.5, 1]
+    keypoints = np.zeros(shape=(num_people, 25, 3))
+    keypoints[:, :, :2] = centers + (rng.random(size=(num_people, 25, 2)) - 0.5) * sizes
+    keypoints[:, :, 2] = rng.uniform(0.3, 1, size=(num_people, 25))
+    keypoints[rng.random(size=(num_people, 25)) < 0.15] = 0
+    return keypoints
+
+
+def benchmarkKeypointTracker(track_counts=(5, 10, 20, 50, 100, 200), frames=3, repeat=20, seed=0):
+    """
+    Measure the time taken by KeypointTracker.update and by the greedy and optimal assignments alone
+    @param track_counts: Number of people tracked at the same time
+    @param frames: Number of frames updated for each number of people
+    @param repeat: Number of times each assignment is timed
+    @param seed: Seed of the random keypoints
+    @return: Dictionary of number of people to dictionary of timings in milliseconds
+    """
+    import contextlib
+    import io
+
+    from utils.keypoint_tracker import KeypointTracker
+
+    rng = np.random.default_rng(seed)
+    # import scipy before timing
+    KeypointTracker.assignOptimal(np.zeros(shape=(1, 1)))
+    results = dict()
+    for count in track_counts:
+        keypoints = randomPeople(rng, count)
+        moved = keypoints.copy()
+        moved[:, :, :2] = np.where(keypoints[:, :, :2] != 0,
+                                   keypoints[:, :, :2] + rng.normal(0, 5, size=(count, 1, 2)), 0)
+        results[count] = dict()
+        for assignment in KeypointTracker.Assignment:
+            tracker = KeypointTracker(1920, 1080, assignment=assignment)
+            tracker.update(keypoints)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for i in range(frames):
+                    tracker.update(moved if i % 2 == 0 else keypoints)
+            results[count][assignment.name + ' update'] = (time.perf_counter() - start) * 1000 / frames
+
+        error_matrix = rng.random(size=(count, count))
+        error_matrix[rng.random(size=(count, count)) < 0.5] = np.inf
+        for name, assign in (('GREEDY', KeypointTracker.assignGreedy), ('OPTIMAL', KeypointTracker.assignOptimal)):
+            start = time.perf_counter()
+            for i in range(repeat):
+                rows, cols = assign(error_matrix)
+            results[count][name + ' assignment'] = (time.perf_counter() - start) * 1000 / repeat
+            results[count][name + ' matched'] = len(rows)
+            results[count][name + ' mean error'] = error_matrix[rows, cols].mean()
+        print('{:>4} people: '.format(count) + ', '.join(
+            '{} {:.3f}'.format(name, value) for name, value in results[count].items()))
+    return results
+
+
+def benchmarkErrorMatrixPruning(track_counts=(5, 10, 20, 50, 100, 200, 400), frame_size=(1920, 1080), repeat=10,
+                                seed=0):
+    """
+    Compare the time taken by the full error matrix and the pruned error matrix of KeypointTracker, to find the
+    number of people from which pruning is faster
+    @param track_counts: Number of people in the frame
+    @param frame_size: Width and height of the frame, a smaller frame gives a denser crowd
+    @param repeat: Number of times each error matrix is calculated
+    @param seed: Seed of the random keypoints
+    @return: Dictionary of number of people to dictionary of timings in milliseconds and fraction of pairs calculated
+    """
+    from utils.keypoint_tracker import KeypointTracker
+
+    frame_width, frame_height = frame_size
+    rng = np.random.default_rng(seed)
+    # import scipy before timing
+    KeypointTracker.calculateErrorMatrix(randomPeople(rng, 1), randomPeople(rng, 1), frame_width, frame_height,
+                                         prune=True)
+    results = dict()
+    for count in track_counts:
+        keypoints = randomPeople(rng, count, frame_width, frame_height).astype(np.float32)
+        moved = keypoints.copy()
+        moved[:, :, :2] = np.where(keypoints[:, :, :2] != 0,
+                                   keypoints[:, :, :2] + rng.normal(0, 5, size=(count, 1, 2)), 0)
+        results[count] = dict()
+        for prune in (False, True):
+            start = time.perf_counter()
+            for i in range(repeat):
+                error_matrix = KeypointTracker.calculateErrorMatrix(keypoints, moved, frame_width, frame_height,
+                                                                    prune=prune)
+            results[count]['pruned' if prune else 'full'] = (time.perf_counter() - start) * 1000 / repeat
+        results[count]['candidates'] = np.count_nonzero(np.isfinite(error_matrix)) / error_matrix.size
+        print('{:>4} people: full {:.3f} ms, pruned {:.3f} ms, finite pairs {:.3f}'.format(
+            count, results[count]['full'], results[count]['pruned'], results[count]['candidates']))
+    return results
+
+
+def walkingPeople(rng, num_people, frames, speed=4, frame_width=1920, frame_height=1080):
+    """
+    Generate a sequence of keypoints of people walking in straight lines at constant speed, bouncing off the edges
+    of the frame, with some jitter and missing detections
+    @param rng: numpy.random.Generator
+    @param num_people: Number of people
+    @param frames: Number of frames
+    @param speed: Standard deviation of the speed of the people in pixels per frame
+    @param frame_width: Width of the frame
+    @param frame_height: Height of the frame
+    @return: List of tuple of (keypoints of the people detected, ids of the people detected) of every frame
+    """
+    keypoints = randomPeople(rng, num_people, frame_width, frame_height)
+    detected = keypoints[:, :, :2] != 0
+    velocity = rng.normal(0, speed, size=(num_people, 1, 2))
+    sequence = []
+    for i in range(frames):
+        centre = np.array([np.mean(keypoint[mask.any(axis=1), :2], axis=0) for keypoint, mask in
+                           zip(keypoints, detected)])
+        bounce = (centre < 0) | (centre > [frame_width, frame_height])
+        velocity[:, 0][bounce] *= -1
+        keypoints[:, :, :2] = np.where(detected, keypoints[:, :, :2] + velocity, 0)
+        frame_keypoints = keypoints.copy()
+        frame_keypoints[:, :, :2] = np.where(detected, frame_keypoints[:, :, :2] +
+                                             rng.normal(0, 1.5, size=frame_keypoints[:, :, :2].shape), 0)
+        ids = np.flatnonzero(rng.random(size=num_people) > 0.05)
+        ids = ids[rng.permutation(len(ids))]
+        sequence.append((frame_keypoints[ids].astype(np.float32), ids))
+    return sequence
+
+
+def benchmarkTrackerMotion(strides=(1, 2, 4), num_people=60, frames=240, speed=8, seed=0):
+    """
+    Replay a sequence of people walking to KeypointTracker sampling every stride frames, and count the identity
+    switches with and without the constant velocity motion model
+    @param strides: Number of frames between the frames passed to the tracker, e.g. 2 for half of the fps
+    @param num_people: Number of people
+    @param frames: Number of frames in the sequence
+    @param speed: Standard deviation of the speed of the people in pixels per frame
+    @param seed: Seed of the sequence
+    @return: Dictionary of (stride, motion name) to dictionary of number of frames processed, identity switches
+             and time taken by the tracker in milliseconds per frame
+    """
+    import contextlib
+    import io
+
+    from utils.keypoint_tracker import KeypointTracker
+
+    sequence = walkingPeople(np.random.default_rng(seed), num_people, frames, speed)
+    results = dict()
+    for stride in strides:
+        for motion in KeypointTracker.Motion:
+            tracker = KeypointTracker(1920, 1080, motion=motion)
+            last_id = dict()
+            switches = 0
+            elapsed = 0
+            for frame_keypoints, ids in sequence[::stride]:
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    tracker.update(frame_keypoints)
+                elapsed += time.perf_counter() - start
+                # the tracker keeps the matched keypoints, which identify the person
+                person = {keypoint.tobytes(): person_id for keypoint, person_id in zip(frame_keypoints, ids)}
+                for object_id, keypoint in tracker.getKeypointsInFrame().items():
+                    person_id = person[keypoint.tobytes()]
+                    if person_id in last_id and last_id[person_id] != object_id:
+                        switches += 1
+                    last_id[person_id] = object_id
+            processed = len(sequence[::stride])
+            results[(stride, motion.name)] = {
+                'frames': processed,
+                'switches': switches,
+                'time': elapsed * 1000 / processed
+            }
+            print('Stride {} {:<17}: {:>4} frames, {:>4} identity switches, {:.3f} ms per frame'.format(
+                stride, motion.name, processed, switches, elapsed * 1000 / processed))
+    return results
+
+
+def benchmarkDecode(video_paths=None, strides=(1, 2, 4, 8, 15), max_frames=100):
+    """
+    Measure the decode throughput of sampling every stride frames of a video, when the skipped frames are decoded with
+    read() and discarded, and when they are skipped with grab() as in VideoPose.analyze, and the time taken to reach
+    the middle of the video by reading, grabbing and seeking
+    @param video_paths: List of paths of videos, all videos in the videos directory if not given
+    @param strides: Number of frames between the frames sampled, int(original_fps / fps) in VideoPose.analyze
+    @param max_frames: Maximum number of frames sampled from each video for each stride
+    @return: Dictionary of video path to dictionary of timings
+    """
+    import cv2
+
+    if video_paths is None:
+        video_dir = os.path.join(dir_path, 'videos')
+        video_paths = [os.path.join(video_dir, file_name) for file_name in sorted(os.listdir(video_dir))
+                       if os.path.splitext(file_name)[1].lower() in ('.mp4', '.avi', '.mov', '.mkv')]
+    if len(video_paths) == 0:
+        print('No videos found')
+    results = dict()
+    for video_path in video_paths:
+        results[video_path] = dict()
+        print(video_path)
+        for stride in strides:
+            for method in ('read', 'grab'):
+                cap = cv2.VideoCapture(video_path)
+                sampled = 0
+                start = time.perf_counter()
+                while sampled < max_frames:
+                    for i in range(stride - 1):
+                        if method == 'read':
+                            cap.read()
+                        else:
+                            cap.grab()
+                    ret, frame = cap.read()
+                    if ret is False or frame is None:
+                        break
+                    sampled += 1
+                elapsed = time.perf_counter() - start
+                cap.release()
+                results[video_path]['stride {} {}'.format(stride, method)] = sampled / elapsed
+                print('Stride {:>3} {}: {:>8.1f} sampled frames per second'.format(stride, method, sampled / elapsed))
+
+        cap = cv2.VideoCapture(video_path)
+        middle = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) / 2)
+        cap.release()
+        for method in ('read', 'grab', 'seek'):
+            cap = cv2.VideoCapture(video_path)
+            start = time.perf_counter()
+            if method == 'seek':
+                cap.set(cv2.CAP_PROP_POS_FRAMES, middle)
+            else:
+                for i in range(middle):
+                    if method == 'read':
+                        cap.read()
+                    else:
+                        cap.grab()
+            cap.read()
+            elapsed = time.perf_counter() - start
+            cap.release()
+            results[video_path]['start ' + method] = elapsed * 1000
+            print('Start at frame {} by {}: {:.1f} ms'.format(middle, method, elapsed * 1000))
+    return results
+
+
+def benchmarkExport(video_path=None, max_frames=100, writer_threads=2):
+    """
+    Compare the export options of VideoPose.analyze on the frames of a video, writing each frame with cv2.imwrite on
+    the loop, writing each frame with the background FrameWriter, and writing all frames into one video with
+    cv2.VideoWriter
+    @param video_path: Path of the video, the first video in the videos directory if not given
+    @param max_frames: Number of frames exported
+    @param writer_threads: Number of threads of the FrameWriter
+    @return: Dictionary of option to dictionary of loop time in milliseconds per frame, total time in seconds and
+             disk usage in bytes
+    """
+    import shutil
+    import tempfile
+
+    import cv2
+
+    from utils.frame_writer import FrameWriter
+
+    if video_path is None:
+        video_dir = os.path.join(dir_path, 'videos')
+        video_path = [os.path.join(video_dir, file_name) for file_name in sorted(os.listdir(video_dir))
+                      if os.path.splitext(file_name)[1].lower() in ('.mp4', '.avi', '.mov', '.mkv')][0]
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if ret is False or frame is None:
+            break
+        frames.append(frame)
+    cap.release()
+    height, width = frames[0].shape[:2]
+
+    results = dict()
+    for option in ('imwrite', 'FrameWriter', 'VideoWriter'):
+        output_dir = tempfile.mkdtemp()
+        try:
+            start = time.perf_counter()
+            if option == 'imwrite':
+                for i, frame in enumerate(frames):
+                    cv2.imwrite(os.path.join(output_dir, 'Frame {}.jpg'.format(i)), frame)
+                loop_time = time.perf_counter() - start
+            elif option == 'FrameWriter':
+                writer = FrameWriter(num_workers=writer_threads, queue_size=writer_threads * 8)
+                for i, frame in enumerate(frames):
+                    writer.write(os.path.join(output_dir, 'Frame {}.jpg'.format(i)), frame)
+                loop_time = time.perf_counter() - start
+                writer.close()
+            else:
+                writer = cv2.VideoWriter(os.path.join(output_dir, 'video.mp4'), cv2.VideoWriter_fourcc(*'mp4v'), fps,
+                                         (width, height))
+                for frame in frames:
+                    writer.write(frame)
+                loop_time = time.perf_counter() - start
+                writer.release()
+            total_time = time.perf_counter() - start
+            disk_usage = sum(os.path.getsize(os.path.join(output_dir, file_name))
+                             for file_name in os.listdir(output_dir))
+            num_files = len(os.listdir(output_dir))
+        finally:
+            shutil.rmtree(output_dir)
+        results[option] = {
+            'loop': loop_time * 1000 / len(frames),
+            'total': total_time,
+            'disk': disk_usage,
+            'files': num_files
+        }
+        print('{:<12}: loop {:.2f} ms per frame, total {:.2f} s, {:.2f} MB in {} files'.format(
+            option, loop_time * 1000 / len(frames), total_time, disk_usage / 2 ** 20, num_files))
+    return results
+
+
+def benchmarkReplay(people_counts=(5, 10, 20), frames=3000, dtype=np.float32, seed=0):
+    """
+    Record the keypoints of people walking with KeypointRecorder, and measure the size of the recording, the time taken
+    to replay it with VideoPose.replay and to read random frames
+    @param people_counts: Number of people in each frame
+    @param frames: Number of frames recorded
+    @param dtype: Data type of the keypoints stored
+    @param seed: Seed of the keypoints
+    @return: Dictionary of number of people to dictionary of results
+    """
+    import shutil
+    import tempfile
+
+    from utils.keypoint_recording import KeypointRecorder, KeypointRecording
+    from video_pose import VideoPose
+
+    rng = np.random.default_rng(seed)
+    results = dict()
+    for count in people_counts:
+        sequence = walkingPeople(rng, count, frames)
+        output_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(output_dir, 'keypoints.kpr')
+            start = time.perf_counter()
+            recorder = KeypointRecorder(path, 1920, 1080, 30, dtype=dtype)
+            for i, (keypoints, ids) in enumerate(sequence):
+                recorder.write(i + 1, keypoints)
+            recorder.close()
+            results[count] = {
+                'write fps': frames / (time.perf_counter() - start),
+                'size': os.path.getsize(path) + os.path.getsize(path + KeypointRecorder.index_extension)
+            }
+            for name, options in (('track', {'classify_pose': False}), ('track and classify', {})):
+                start = time.perf_counter()
+                VideoPose().replay(path, **options)
+                results[count][name + ' fps'] = frames / (time.perf_counter() - start)
+            recording = KeypointRecording(path)
+            frame_numbers = rng.integers(1, frames + 1, size=1000)
+            start = time.perf_counter()
+            for frame_number in frame_numbers:
+                recording.getKeypoints(frame_number)
+            results[count]['random access'] = (time.perf_counter() - start) * 1e6 / len(frame_numbers)
+            del recording
+        finally:
+            shutil.rmtree(output_dir)
+        print('{:>3} people: {:.2f} MB, write {:.0f} fps, replay track {:.0f} fps, track and classify {:.0f} fps, '
+              'random access {:.1f} us'.format(count, results[count]['size'] / 2 ** 20, results[count]['write fps'],
+                                               results[count]['track fps'], results[count]['track and classify fps'],
+                                               results[count]['random access']))
+    return results
+
+
+def benchmarkSyntheticCrowd(people_counts=(1, 10, 50, 100, 200), video_path=None, max_frames=50, seed=0):
+    """
+    Measure the throughput of VideoPose.analyze end to end with SyntheticPoseEstimator in place of OpenPose, for
+    crowds of different sizes, so the cost of everything after pose estimation can be measured without OpenPose.
+    The output printed for every person is discarded, and no image is displayed or exported
+    @param people_counts: Number of people in each frame
+    @param video_path: Path of the video decoded, the first video in the videos directory if not given
+    @param max_frames: Number of frames analyzed
+    @param seed: Seed of the crowd
+    @return: Dictionary of number of people to dictionary of option to frames per second
+    """
+    import contextlib
+
+    from utils.synthetic_pose_estimator import SyntheticPoseEstimator
+    from video_pose import VideoPose
+
+    if video_path is None:
+        video_dir = os.path.join(dir_path, 'videos')
+        video_path = [os.path.join(video_dir, file_name) for file_name in sorted(os.listdir(video_dir))
+                      if os.path.splitext(file_name)[1].lower() in ('.mp4', '.avi', '.mov', '.mkv')][0]
+    options = OrderedDict([
+        ('estimate', {}),
+        ('classify', {'classify_pose': True, 'show_pose': True}),
+        ('track and classify', {'classify_pose': True, 'show_pose': True, 'track_pose_id': True,
+                                'show_pose_id': True}),
+        ('track and reuse', {'classify_pose': True, 'show_pose': True, 'track_pose_id': True, 'show_pose_id': True,
+                             'reuse_pose': True})
+    ])
+    results = dict()
+    for count in people_counts:
+        results[count] = dict()
+        for name, option in options.items():
+            video_pose = VideoPose(SyntheticPoseEstimator(num_people=count, seed=seed))
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                video_pose.analyze(video_path, max_frame=max_frames, display_image=False, **option)
+                elapsed = time.perf_counter() - start
+            results[count][name] = max_frames / elapsed
+        print('{:>3} people: '.format(count) + ', '.join('{} {:.1f} fps'.format(name, fps)
+                                                       for name, fps in results[count].items()))
+    return results
+
+
+def poseAccuracy(reference, keypoints, threshold=0.1):
+    """
+    Compare the keypoints of a frame with the reference keypoints of the same frame, each reference person is matched
+    to at most one person by the mean distance of the parts detected in both
+    @param reference: Reference keypoints, number of people x 25 keypoints x 3
+    @param keypoints: Keypoints compared, number of people x 25 keypoints x 3
+    @param threshold: A part is correct when it is within this fraction of the height of the reference person
+    @return: tuple of (number of reference people matched, number of reference parts, number of correct parts)
+    """
+    from scipy.optimize import linear_sum_assignment
+
+    from utils.body25 import Body25
+
+    reference = np.asarray(reference, dtype=float).reshape((-1,) + Body25.Keypoint.getKeypointShape())
+    keypoints = np.asarray(keypoints, dtype=float).reshape((-1,) + Body25.Keypoint.getKeypointShape())
+    reference_mask = Body25.getValidMask(reference)
+    num_parts = int(np.count_nonzero(reference_mask))
+    if len(reference) == 0 or len(keypoints) == 0:
+        return 0, num_parts, 0
+    mask = Body25.getValidMask(keypoints)
+    frames = Body25.getFrameCoordinatesBatch(reference, reference_mask)
+    heights = np.maximum(np.nan_to_num(frames[:, 3] - frames[:, 1]), 1)
+    distances = np.linalg.norm(reference[:, None, :, :2] - keypoints[None, :, :, :2], axis=3)
+    both = reference_mask[:, None, :] & mask[None, :, :]
+    with np.errstate(invalid='ignore'):
+        errors = np.sum(np.where(both, distances, 0), axis=2) / np.count_nonzero(both, axis=2)
+    errors = np.where(np.isnan(errors), np.inf, errors / heights[:, None])
+    rows, cols = linear_sum_assignment(np.where(np.isinf(errors), 1e9, errors))
+    matched = errors[rows, cols] < 1
+    rows, cols = rows[matched], cols[matched]
+    correct = both[rows, cols] & (distances[rows, cols] < threshold * heights[rows, None])
+    return len(rows), num_parts, int(np.count_nonzero(correct))
+
+
+def benchmarkNetResolution(video_path=None, net_resolutions=(368, 320, 256, 208, 160, 128), max_frames=50,
+                           min_person_height=96):
+    """
+    Measure the latency and accuracy of PoseEstimator at each network input height and in adaptive mode, the keypoints
+    at the largest height are the reference of the accuracy
+    @param video_path: Path of the video, the first video in the videos directory if not given
+    @param net_resolutions: Heights of the network input
+    @param max_frames: Number of frames processed
+    @param min_person_height: min_person_height of the adaptive mode
+    @return: Dictionary of height or 'adaptive' to dictionary of latency in milliseconds, people found relative to the
+             reference and fraction of reference parts within 10% of the person height
+    """
+    import cv2
+
+    from utils.pose_estimator import PoseEstimator
+
+    if video_path is None:
+        video_dir = os.path.join(dir_path, 'videos')
+        video_path = [os.path.join(video_dir, file_name) for file_name in sorted(os.listdir(video_dir))
+                      if os.path.splitext(file_name)[1].lower() in ('.mp4', '.avi', '.mov', '.mkv')][0]
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if ret is False or frame is None:
+            break
+        frames.append(frame)
+    cap.release()
+
+    settings = [(net_resolution, {'net_resolution': net_resolution})
+                for net_resolution in sorted(net_resolutions, reverse=True)]
+    settings.append(('adaptive', {'adaptive_resolution': True, 'min_person_height': min_person_height}))
+    reference = None
+    results = OrderedDict()
+    for name, options in settings:
+        pose_estimator = PoseEstimator(face=False, hand=False, **options)
+        # the first image also loads the network
+        pose_estimator.processImage(frames[0])
+        latencies = []
+        outputs = []
+        for frame in frames:
+            start = time.perf_counter()
+            pose_estimator.processImage(frame)
+            latencies.append(time.perf_counter() - start)
+            outputs.append(np.array(pose_estimator.getPoseKeypoints()))
+        if reference is None:
+            reference = outputs
+        matched = num_reference = num_parts = correct = 0
+        for reference_keypoints, keypoints in zip(reference, outputs):
+            frame_matched, frame_parts, frame_correct = poseAccuracy(reference_keypoints, keypoints)
+            matched += frame_matched
+            num_reference += len(reference_keypoints)
+            num_parts += frame_parts
+            correct += frame_correct
+        results[name] = {
+            'latency': np.mean(latencies) * 1000,
+            'people': matched / num_reference if num_reference > 0 else np.nan,
+            'pck': correct / num_parts if num_parts > 0 else np.nan
+        }
+        print('{:>8}: {:.1f} ms, {:.1%} of people found, {:.1%} of parts within 10% of person height'.format(
+            str(name), results[name]['latency'], results[name]['people'], results[name]['pck']))
+        if name == 'adaptive':
+            for net_resolution, stats in pose_estimator.getResolutionStats().items():
+                print('          {} images at {}: {:.1f} ms'.format(stats['images'], net_resolution,
+                                                                    stats['latency']))
+    return results
+
+
+def benchmarkProcessImages(image_dir=None, batch_sizes=(2, 4, 8, 16), max_images=64):
+    """
+    Compare the throughput of PoseEstimator.processImages on batches of images with calling processImage on one image
+    at a time, as generate_dataset.py and directory_test.py do, and check that both give the same keypoints
+    @param image_dir: Directory of the images, images/COCO if not given
+    @param batch_sizes: Number of images passed to each call of processImages
+    @param max_images: Maximum number of images processed
+    @return: Dictionary of batch size (1 for one at a time) to images per second
+    """
+    import cv2
+
+    from utils.pose_estimator import PoseEstimator
+
+    if image_dir is None:
+        image_dir = os.path.join(dir_path, 'images', 'COCO')
+    images = []
+    for file_name in sorted(os.listdir(image_dir)):
+        image = cv2.imread(os.path.join(image_dir, file_name))
+        if image is not None:
+            images.append(image)
+        if len(images) >= max_images:
+            break
+
+    pose_estimator = PoseEstimator(face=False, hand=False)
+    # the first image also loads the network
+    pose_estimator.processImage(images[0])
+    start = time.perf_counter()
+    reference = []
+    for image in images:
+        pose_estimator.processImage(image)
+        reference.append(np.array(pose_estimator.getPoseKeypoints()))
+    results = {1: len(images) / (time.perf_counter() - start)}
+    print('one at a time: {:.2f} images/s'.format(results[1]))
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        keypoints = []
+        for i in range(0, len(images), batch_size):
+            keypoints += pose_estimator.processImages(images[i:i + batch_size])[0]
+        results[batch_size] = len(images) / (time.perf_counter() - start)
+        same = all(np.array_equal(a, b) for a, b in zip(reference, keypoints))
+        print('batch of {:>2}: {:.2f} images/s, {:.2f}x, same keypoints: {}'.format(
+            batch_size, results[batch_size], results[batch_size] / results[1], same))
+    return results
+
+
+def benchmarkWrapperCache(switches=10, cache_sizes=(1, 2)):
+    """
+    Measure the time taken to switch PoseEstimator between body only and body and hand keypoints, with wrapper caches
+    of different sizes, a cache of 1 starts a new wrapper on every switch
+    @param switches: Number of switches
+    @param cache_sizes: Maximum numbers of wrappers kept started
+    @return: Dictionary of cache size to mean time of a switch and the first image after it in milliseconds
+    """
+    import cv2
+
+    from utils.pose_estimator import PoseEstimator
+
+    image = cv2.imread(os.path.join(dir_path, 'images', 'COCO', 'COCO_val2014_000000000192.jpg'))
+    results = dict()
+    for cache_size in cache_sizes:
+        with PoseEstimator(face=False, hand=False, max_wrappers=cache_size) as pose_estimator:
+            pose_estimator.processImage(image)
+            start = time.perf_counter()
+            for i in range(switches):
+                pose_estimator.setHand(i % 2 == 0)
+                pose_estimator.processImage(image)
+            results[cache_size] = (time.perf_counter() - start) * 1000 / switches
+            stats = pose_estimator.getWrapperStats()
+        print('{} wrappers: {:.1f} ms per switch, {} started, {} evicted'.format(
+            cache_size, results[cache_size], stats['misses'], stats['evictions']))
+    return results
+
+
+def producePickledFrames(frame_queue, frame_shape, num_frames):
+    frame = np.zeros(frame_shape, dtype=np.uint8)
+    for i in range(num_frames):
+        frame[0, 0, 0] = i % 256
+        frame_queue.put(frame)
+    frame_queue.put(None)
+
+
+def produceSharedFrames(ring, frame_shape, num_frames):
+    frame = np.zeros(frame_shape, dtype=np.uint8)
+    for i in range(num_frames):
+        frame[0, 0, 0] = i % 256
+        ring.put(frame)
+    ring.finish()
+    ring.close()
+
+
+def benchmarkFrameTransport(frame_sizes=((480, 640), (720, 1280), (1080, 1920)), num_frames=200, num_slots=8):
+    """
+    Measure the rate at which BGR frames are passed from a producer process to this process, pickled through a
+    multiprocessing.Queue and through a FrameRingBuffer in shared memory, the time is measured from the first frame
+    received so that the startup of the producer is not included
+    @param frame_sizes: List of (height, width) of the frames
+    @param num_frames: Number of frames passed
+    @param num_slots: Size of the queue and number of slots of the ring buffer
+    @return: OrderedDict of (height, width) to dictionary of 'queue' and 'ring' to frames per second
+    """
+    import multiprocessing
+
+    from utils.frame_ring_buffer import FrameRingBuffer
+
+    context = multiprocessing.get_context('spawn')
+    results = OrderedDict()
+    for height, width in frame_sizes:
+        frame_shape = (height, width, 3)
+        results[(height, width)] = dict()
+
+        frame_queue = context.Queue(maxsize=num_slots)
+        producer = context.Process(target=producePickledFrames, args=(frame_queue, frame_shape, num_frames))
+        producer.start()
+        frame_queue.get()
+        start = time.perf_counter()
+        while True:
+            frame = frame_queue.get()
+            if frame is None:
+                break
+        results[(height, width)]['queue'] = (num_frames - 1) / (time.perf_counter() - start)
+        producer.join()
+
+        with FrameRingBuffer(num_slots, frame_shape, context=context) as ring:
+            producer = context.Process(target=produceSharedFrames, args=(ring, frame_shape, num_frames))
+            producer.start()
+            ring.release(ring.get()[0])
+            start = time.perf_counter()
+            while True:
+                slot = ring.get()
+                if slot is None:
+                    break
+                ring.release(slot[0])
+            results[(height, width)]['ring'] = (num_frames - 1) / (time.perf_counter() - start)
+            producer.join()
+
+        megabytes = height * width * 3 / 2 ** 20
+        print('{}x{} ({:.2f} MB): pickled queue {:.1f} fps, shared memory ring buffer {:.1f} fps ({:.1f}x)'.format(
+            width, height, megabytes, results[(height, width)]['queue'], results[(height, width)]['ring'],
+            results[(height, width)]['ring'] / results[(height, width)]['queue']))
+    return results
+
+
+def benchmarkEstimatorService(people_counts=(0, 1, 10, 50), requests=50, frame_size=(720, 1280), classify=True):
+    """
+    Measure the round trip time of EstimatorClient requests to an EstimatorServer with SyntheticPoseEstimator, and check
+    that every request is answered, including frames without people
+    @param people_counts: Number of people in the frames of each server
+    @param requests: Number of requests sent to each server
+    @param frame_size: (height, width) of the frames sent
+    @param classify: Ask the server for the poses of the people
+    @return: Dictionary of number of people to median round trip time in milliseconds
+    """
+    import contextlib
+    import functools
+    import tempfile
+
+    from utils.estimator_service import EstimatorClient, EstimatorServer
+    from utils.synthetic_pose_estimator import SyntheticPoseEstimator
+
+    image = np.zeros(frame_size + (3,), dtype=np.uint8)
+    results = dict()
+    for count in people_counts:
+        socket_path = os.path.join(tempfile.mkdtemp(), 'estimator.sock')
+        server = EstimatorServer(socket_path, functools.partial(SyntheticPoseEstimator, num_people=count),
+                                 classify=classify)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            server.start()
+        try:
+            with EstimatorClient(socket_path, classify=classify) as client:
+                round_trips = []
+                for i in range(requests):
+                    client.processImage(image)
+                    round_trips.append(client.getLatency()['round_trip'])
+                    if len(client.getPoseKeypoints()) != count:
+                        raise Exception("EstimatorClient received {} people, expected {}".format(
+                            len(client.getPoseKeypoints()), count))
+                    if classify is True and len(client.getPosePredictions()[0]) != count:
+                        raise Exception("EstimatorClient received {} poses, expected {}".format(
+                            len(client.getPosePredictions()[0]), count))
+        finally:
+            server.stop()
+            os.rmdir(os.path.dirname(socket_path))
+        results[count] = float(np.median(round_trips))
+        print('{:>3} people: {} requests, median round trip {:.2f} ms'.format(count, requests, results[count]))
+    return results
+
+
+def benchmarkImageBatch(image_dir=None, decode_threads=(1, 2, 4), max_images=64, synthetic=False):
+    """
+    Compare the throughput of ImagePose.analyzeBatch, which decodes the images on a pool of threads ahead of the pose
+    estimator, with reading and analyzing one image at a time as directory_test.py used to, the output printed for
+    every image is discarded
+    @param image_dir: Directory of the images, images/COCO if not given
+    @param decode_threads: Numbers of decoding threads
+    @param max_images: Maximum number of images analyzed
+    @param synthetic: Use SyntheticPoseEstimator in place of OpenPose, so that the decoding takes most of the time
+    @return: Dictionary of number of decoding threads (0 for one at a time) to images per second
+    """
+    import contextlib
+
+    import cv2
+
+    from image_pose import ImagePose
+
+    if image_dir is None:
+        image_dir = os.path.join(dir_path, 'images', 'COCO')
+    paths = ImagePose.listImages(image_dir)[:max_images]
+    if synthetic is True:
+        from utils.synthetic_pose_estimator import SyntheticPoseEstimator
+        pose_estimator = SyntheticPoseEstimator()
+    else:
+        from utils.pose_estimator import PoseEstimator
+        pose_estimator = PoseEstimator(face=False, hand=False)
+    image_pose = ImagePose(pose_estimator)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # the first image also loads the network
+        image_pose.analyze(cv2.imread(paths[0]), display_image=False)
+        start = time.perf_counter()
+        for path in paths:
+            image_pose.analyze(cv2.imread(path), image_id=path, display_image=False)
+        results = {0: len(paths) / (time.perf_counter() - start)}
+    print('one at a time: {:.2f} images/s'.format(results[0]))
+    for num_threads in decode_threads:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            _, summary = image_pose.analyzeBatch(paths, decode_threads=num_threads)
+        results[num_threads] = summary['images_per_second']
+        print('{} decoding threads: {:.2f} images/s, {:.2f}x, waited {:.2f} s for decoding'.format(
+            num_threads, results[num_threads], results[num_threads] / results[0], summary['decode_wait']))
+    return results
+
+
+if __name__ == "__main__":
+    benchmarkStartup()
+    # benchmarkModelWarmUp()
+    # benchmarkNumpyBackend()
+    # benchmarkPredictionCache('dataset/20200527-174528-dataset.csv')
+    # benchmarkKeypointTracker()
+    # benchmarkErrorMatrixPruning()
+    # benchmarkTrackerMotion()
+    # benchmarkDecode()
+    # benchmarkExport()
+    # benchmarkReplay()
+    # benchmarkSyntheticCrowd()
+    # benchmarkNetResolution()
+    # benchmarkProcessImages()
+    # benchmarkWrapperCache()
+    # benchmarkFrameTransport()
+    # benchmarkImageBatch()
+    # benchmarkEstimatorService()
@@ -1,43 +1,40 @@
 import os
 from datetime import datetime
 
-import cv2
-
 from image_pose import ImagePose
-from utils.file_path import FilePath
+from utils.estimator_service import EstimatorClient, EstimatorService
 from utils.log import Log
 
 
 try:
     dir_path = os.path.abspath("images/COCO")
-    file_names = os.listdir(dir_path)
-    dir_name = dir_path + "\\processed\\"
-    IP = ImagePose()
-
-    for file_name in file_names:
-
-        fp = FilePath(dir_path + "\\" + file_name)
-        imageToProcess = cv2.imread(fp.getAbsPath())
-        if imageToProcess is None:
-            break
-
-        time_identifier = datetime.now().strftime("%Y%m%d-%H%M%S-")
-        log_file = os.path.abspath(dir_name + time_identifier + fp.getFileName() + ".log")
-        logger = Log.setup_logger(fp.getFileName(), log_file)
-        output_path = dir_name + time_identifier + fp.getFileName() + fp.getExtension()
-
-        IP.analyze(
-            image=imageToProcess,
-            image_id=fp.getFileName(),
-            show_skeleton=True,
-            show_num_of_people=True,
-            classify_pose=True,
-            show_pose=True,
-            display_image=True,
-            wait_key=1,
-            logger=logger,
-            export_path=output_path
-        )
+    dir_name = os.path.join(dir_path, "processed")
+    time_identifier = datetime.now().strftime("%Y%m%d-%H%M%S-")
+    # use the warm estimator of a running server (python -m utils.estimator_service) if there is one
+    pose_estimator = None
+    if EstimatorService.isOwnSocket(EstimatorService.default_socket_path):
+        pose_estimator = EstimatorClient(classify=True)
+    IP = ImagePose(pose_estimator)
+
+    # one log for all the images in the directory
+    os.makedirs(dir_name, exist_ok=True)
+    name = os.path.basename(dir_path)
+    log_file = os.path.join(dir_name, time_identifier + name + ".log")
+    logger = Log.setup_logger(name, log_file)
+
+    results, summary = IP.analyzeBatch(
+        images=dir_path,
+        show_skeleton=True,
+        show_num_of_people=True,
+        classify_pose=True,
+        show_pose=True,
+        display_image=True,
+        wait_key=1,
+        logger=logger,
+        export_dir=dir_name,
+        export_prefix=time_identifier
+    )
+    Log.close_logger(logger)
 
     print("Done")
 
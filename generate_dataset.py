@@ -5,18 +5,17 @@ import numpy as np
 import json
 from datetime import datetime
 
-from keras_preprocessing.image import ImageDataGenerator, load_img
-
 from utils.body25 import Body25
 from utils.file_path import FilePath
 from utils.log import Log
-from utils.pose_estimator import PoseEstimator
 
 
 columns = ['KEYPOINTS', 'NORMALIZED_KEYPOINTS', 'POSE', 'FILENAME', 'SCORE']
 
 
 def imageAugmentation(directory, export_directory=None, prefix="aug", extension="jpg", logger=None):
+    from keras_preprocessing.image import ImageDataGenerator, load_img
+
     aug = ImageDataGenerator(
         rotation_range=10,
         zoom_range=0.15,
@@ -78,7 +77,8 @@ def generateDatasetFromDirectory(directory,
                                  end=None,
                                  logger=None,
                                  df=None,
-                                 config=False
+                                 config=False,
+                                 pose_estimator=None
                                  ):
 
     path = export_path.split('.')
@@ -115,7 +115,9 @@ def generateDatasetFromDirectory(directory,
         if end is None:
             end = len(file_names) - 1
 
-        pose_estimator = PoseEstimator(face=False, hand=False)
+        if pose_estimator is None:
+            from utils.pose_estimator import PoseEstimator
+            pose_estimator = PoseEstimator(face=False, hand=False)
 
         for i, file_name in enumerate(file_names, start=1):
 
@@ -141,10 +143,11 @@ def generateDatasetFromDirectory(directory,
                 logger.info("Processing " + file_name)
             pose_estimator.processImage(imageToProcess)
             output = pose_estimator.getPoseKeypoints()
+            scores = Body25.getAverageScoreBatch(output)
+            normalized_keypoints = Body25.normalizeKeypointBatch(output)
 
             person = 1
-            for keypoint in output:
-                score = Body25.getAverageScore(keypoint)
+            for keypoint, normalized_keypoint, score in zip(output, normalized_keypoints, scores):
                 if score < 0.5:
                     body_pose = "UNKNOWN"
                 else:
@@ -152,7 +155,7 @@ def generateDatasetFromDirectory(directory,
                 df = df.append(
                     {
                         columns[0]: keypoint,
-                        columns[1]: Body25.normalizeKeypoint(keypoint),
+                        columns[1]: normalized_keypoint,
                         columns[2]: body_pose,
                         columns[3]: file_name,
                         columns[4]: score
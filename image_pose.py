@@ -1,19 +1,33 @@
 import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import cv2
+import numpy as np
 
+from utils.estimator_service import EstimatorClient, EstimatorService
 from utils.file_path import FilePath
 from utils.image_processing import ImageProcessing
 from utils.log import Log
 from utils.pose_classifier import PoseClassifier
-from utils.pose_estimator import PoseEstimator
+from utils.profiler import Profiler
 
 
 class ImagePose:
 
-    def __init__(self):
-        self.__pose_estimator = PoseEstimator(face=False, hand=False)
+    image_extensions = ('.jpg', '.jpeg', '.png', '.bmp')
+
+    def __init__(self, pose_estimator=None):
+        """
+        @param pose_estimator: Pose estimator implementing PoseEstimatorBackend, e.g. SyntheticPoseEstimator, a
+                               PoseEstimator with OpenPose is created if not given
+        """
+        if pose_estimator is None:
+            from utils.pose_estimator import PoseEstimator
+            pose_estimator = PoseEstimator(face=False, hand=False)
+        self.__pose_estimator = pose_estimator
 
     def analyze(self,
                 image,
@@ -25,67 +39,244 @@ class ImagePose:
                 display_image=True,
                 wait_key=0,
                 logger=None,
-                export_path=None):
+                export_path=None,
+                profiler=None):
 
-        directory, file = os.path.split(os.path.abspath(export_path))
+        if profiler is None:
+            profiler = Profiler(enabled=False)
 
         if export_path is not None:
-            try:
+            directory = os.path.dirname(os.path.abspath(export_path))
+            if os.path.isdir(directory) is False:
                 os.mkdir(directory)
                 print("Directory", directory, " Created ")
-            except FileExistsError:
-                print("Directory", directory, " already exists")
+
+        outputImage, _, _ = self.__analyzeImage(image, image_id, show_skeleton, show_num_of_people, classify_pose,
+                                                show_pose, logger, export_path, profiler)
+
+        if display_image is True:
+            try:
+                with profiler.stage('display'):
+                    cv2.destroyAllWindows()
+                    cv2.imshow(str(image_id), outputImage)
+                    cv2.waitKey(wait_key)
+            except Exception as e:
+                if logger is not None:
+                    logger.error(e)
+                print(e)
+                raise e
+
+        return outputImage
+
+    def __analyzeImage(self, image, image_id, show_skeleton, show_num_of_people, classify_pose, show_pose, logger,
+                       export_path, profiler, report_error=True):
+        # estimate, classify, draw and export an image, returns the output image, keypoints and poses, an error is
+        # printed and logged here unless the caller reports it
+        image_start = time.perf_counter()
+        profiler.setFrame(image_id)
 
         if logger is not None and image_id is not None:
             logger.info('Processing Image: ' + str(image_id))
 
         try:
-            self.__pose_estimator.processImage(image)
-            if show_skeleton is True:
-                outputImage = self.__pose_estimator.getOutputImage()
-            else:
-                outputImage = image
-            keypoints = self.__pose_estimator.getPoseKeypoints()
+            poses = None
+            with profiler.stage('estimate'):
+                self.__pose_estimator.processImage(image)
+                if show_skeleton is True:
+                    outputImage = self.__pose_estimator.getOutputImage()
+                else:
+                    outputImage = image
+                keypoints = self.__pose_estimator.getPoseKeypoints()
             if show_num_of_people is True:
-                ImageProcessing.outputNumberOfPeopleToImage(outputImage, len(keypoints))
+                with profiler.stage('draw'):
+                    ImageProcessing.outputNumberOfPeopleToImage(outputImage, len(keypoints))
 
             if classify_pose is True:
+                with profiler.stage('classify'):
+                    # poses, _, _, _ = PoseClassifier.predictPoseBody25Batch(keypoints)
+                    predictions = self.__pose_estimator.getPosePredictions()
+                    if predictions is None:
+                        predictions = PoseClassifier.predictPoseModelBatch(keypoints)
+                    poses, probabilities = predictions
+                pose_texts = []
                 index = 1
-                for keypoint in keypoints:
+                for keypoint, pose, probability in zip(keypoints, poses, probabilities):
                     print('Passenger', index)
                     if logger is not None:
                         logger.info('Passenger' + str(index))
                         logger.info('\n' + str(keypoint))
-                    # pose = PoseClassifier.predictPoseBody25(keypoint, logger)
-                    pose = PoseClassifier.predictPoseModel(keypoint, logger)
+                        logger.info(str(probability))
+                    pose = PoseClassifier.Pose(pose)
                     text = str(index) + ': ' + pose.name
                     print(text + "\n")
                     if logger is not None:
                         logger.info('Passenger ' + text + '\n')
-                    if show_pose is True:
-                        ImageProcessing.outputIndividualPoseToImage(outputImage, text, keypoint)
+                    pose_texts.append(text)
                     index += 1
+                if show_pose is True:
+                    with profiler.stage('draw'):
+                        for keypoint, text in zip(keypoints, pose_texts):
+                            ImageProcessing.outputIndividualPoseToImage(outputImage, text, keypoint)
 
             if export_path is not None:
-                cv2.imwrite(export_path, outputImage)
+                with profiler.stage('export'):
+                    cv2.imwrite(export_path, outputImage)
                 print(export_path)
                 print('Successfully saved')
                 if logger is not None:
                     logger.info(export_path)
                     logger.info('Successfully saved' + '\n')
 
-            if display_image is True:
-                cv2.destroyAllWindows()
-                cv2.imshow(image_id, outputImage)
-                cv2.waitKey(wait_key)
+            profiler.record('frame', image_start, time.perf_counter())
 
         except Exception as e:
-            if logger is not None:
-                logger.error(e)
-            print(e)
+            if report_error is True:
+                if logger is not None:
+                    logger.error(e)
+                print(e)
             raise e
 
-        return outputImage
+        return outputImage, keypoints, poses
+
+    @staticmethod
+    def listImages(directory):
+        """
+        @param directory: Path of the directory
+        @return: Sorted list of paths of the images in the directory
+        """
+        return [os.path.join(directory, file_name) for file_name in sorted(os.listdir(directory))
+                if os.path.splitext(file_name)[1].lower() in ImagePose.image_extensions]
+
+    def analyzeBatch(self,
+                     images,
+                     show_skeleton=True,
+                     show_num_of_people=True,
+                     classify_pose=False,
+                     show_pose=False,
+                     display_image=False,
+                     wait_key=1,
+                     logger=None,
+                     export_dir=None,
+                     export_prefix='',
+                     decode_threads=4,
+                     prefetch=8,
+                     profiler=None):
+        """
+        Analyze many images one after another, the images are read and decoded on a pool of threads ahead of the pose
+        estimator, e.g.
+
+            results, summary = ImagePose().analyzeBatch("images/COCO", classify_pose=True, export_dir="processed")
+
+        An image that cannot be read or analyzed is reported in the results and does not stop the others
+        @param images: List of paths of images, or path of a directory of images
+        @param display_image: Show every output image in one window, the images are not displayed without a display
+        @param logger: Logger of the whole batch
+        @param export_dir: Directory the output images are saved into with the file names of the images, the images
+                           are not saved if None
+        @param export_prefix: Prefix of the file names of the output images, e.g. a time identifier
+        @param decode_threads: Number of threads reading and decoding the images
+        @param prefetch: Maximum number of images decoded ahead of the pose estimator
+        @return: tuple of (list of dictionary of each image with 'image' (path), 'people', 'keypoints', 'poses' (list of
+                 PoseClassifier.Pose if classify_pose is True, otherwise None), 'time' in seconds and 'error',
+                 dictionary of the number of 'images' and 'failed', 'time' in seconds, 'images_per_second' and
+                 'decode_wait', the time in seconds the pose estimator waited for decoded images)
+        """
+        if decode_threads < 1:
+            raise Exception("argument 'decode_threads' in ImagePose.analyzeBatch() cannot be less than 1")
+        if prefetch < 1:
+            raise Exception("argument 'prefetch' in ImagePose.analyzeBatch() cannot be less than 1")
+        if profiler is None:
+            profiler = Profiler(enabled=False)
+        if isinstance(images, str):
+            images = ImagePose.listImages(images)
+        if export_dir is not None:
+            os.makedirs(export_dir, exist_ok=True)
+
+        text = 'Processing {} images'.format(len(images))
+        print(text)
+        if logger is not None:
+            logger.info(text)
+
+        results = []
+        decode_wait = 0.0
+        window_name = ImagePose.__name__
+        window_shown = False
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=decode_threads) as executor:
+            pending = deque()
+            paths = iter(images)
+            for image_path in paths:
+                pending.append((image_path, executor.submit(cv2.imread, image_path)))
+                if len(pending) >= prefetch:
+                    break
+            while len(pending) > 0:
+                image_path, future = pending.popleft()
+                # the next image is submitted before waiting, so that prefetch images are always being decoded
+                for next_path in paths:
+                    pending.append((next_path, executor.submit(cv2.imread, next_path)))
+                    break
+                image_id = os.path.splitext(os.path.basename(image_path))[0]
+                result = {'image': image_path, 'people': 0, 'keypoints': np.array([]), 'poses': None, 'time': 0.0,
+                          'error': None}
+                wait_start = time.perf_counter()
+                with profiler.stage('decode', image_id):
+                    image = future.result()
+                decode_wait += time.perf_counter() - wait_start
+
+                image_start = time.perf_counter()
+                try:
+                    if image is None:
+                        raise Exception("ImagePose.analyzeBatch() could not read image " + image_path)
+                    export_path = None
+                    if export_dir is not None:
+                        export_path = os.path.join(export_dir, export_prefix + os.path.basename(image_path))
+                    outputImage, keypoints, poses = self.__analyzeImage(
+                        image, image_id, show_skeleton, show_num_of_people, classify_pose, show_pose, logger,
+                        export_path, profiler, report_error=False)
+                    # the estimator may reuse its buffers for the next image
+                    result['keypoints'] = np.array(keypoints)
+                    result['people'] = len(keypoints)
+                    if poses is not None:
+                        result['poses'] = [PoseClassifier.Pose(pose) for pose in poses]
+                    if display_image is True:
+                        try:
+                            with profiler.stage('display'):
+                                cv2.imshow(window_name, outputImage)
+                                cv2.waitKey(wait_key)
+                            window_shown = True
+                        except cv2.error as e:
+                            # without a display, the rest of the images are not displayed
+                            display_image = False
+                            print('Images are not displayed:', e)
+                            if logger is not None:
+                                logger.error(e)
+                except Exception as e:
+                    result['error'] = repr(e)
+                    print(image_path + ': failed with ' + result['error'])
+                    if logger is not None:
+                        logger.error(image_path + ': failed with ' + result['error'])
+                result['time'] = time.perf_counter() - image_start
+                results.append(result)
+        elapsed = time.perf_counter() - start
+        if window_shown is True:
+            cv2.destroyWindow(window_name)
+
+        summary = {
+            'images': len(results),
+            'failed': sum(1 for result in results if result['error'] is not None),
+            'time': elapsed,
+            'images_per_second': len(results) / elapsed if elapsed > 0 else 0.0,
+            'decode_wait': decode_wait
+        }
+        text = 'Processed {} images ({} failed) in {:.2f} s: {:.2f} images/s, waited {:.2f} s for decoding'.format(
+            summary['images'], summary['failed'], summary['time'], summary['images_per_second'],
+            summary['decode_wait'])
+        print(text)
+        if logger is not None:
+            logger.info(text)
+        if profiler.isEnabled():
+            profiler.printSummary(logger)
+        return results, summary
 
 
 if __name__ == "__main__":
@@ -100,7 +291,12 @@ if __name__ == "__main__":
     logger = Log.setup_logger(fp.getFileName(), log_file)
     imageToProcess = cv2.imread(image_path)
 
-    ImagePose().analyze(
+    # use the warm estimator of a running server (python -m utils.estimator_service) if there is one
+    pose_estimator = None
+    if EstimatorService.isOwnSocket(EstimatorService.default_socket_path):
+        pose_estimator = EstimatorClient(classify=True)
+
+    ImagePose(pose_estimator).analyze(
         image=imageToProcess,
         image_id=None,
         show_skeleton=True,
@@ -118,6 +118,107 @@ class Body25:
         scores = [mean_score, nonzero_score]
         return np.dot(scores, weight) / sum(weight)
 
+    @staticmethod
+    def __toBatch(keypoints):
+        keypoints = np.asarray(keypoints)
+        if not np.issubdtype(keypoints.dtype, np.floating):
+            keypoints = keypoints.astype(float)
+        return keypoints.reshape((-1,) + Body25.Keypoint.getKeypointShape())
+
+    @staticmethod
+    def getValidMask(keypoints):
+        """
+        Get the parts of every person that are detected, a part is missing if its coordinates are all zeros
+        @param keypoints: 3D array, number of people x 25 keypoints x 3 (x, y, score)
+        @return: 2D boolean array, number of people x 25 keypoints
+        """
+        keypoints = Body25.__toBatch(keypoints)
+        return np.any(keypoints[:, :, :Body25.Keypoint.SCORE.value] != 0, axis=2)
+
+    @staticmethod
+    def getCentroidBatch(keypoints, mask=None, to_int=False):
+        """
+        Batch version of getCentroid
+        @param keypoints: 3D array, number of people x 25 keypoints x 3 (x, y, score)
+        @param mask: Result of getValidMask, computed if not given
+        @param to_int: Return integer coordinates
+        @return: 2D array, number of people x 2 (x, y), zeros for people without any detected part
+        """
+        keypoints = Body25.__toBatch(keypoints)
+        if mask is None:
+            mask = Body25.getValidMask(keypoints)
+        coords = keypoints[:, :, :Body25.Keypoint.SCORE.value].astype(float)
+        # accumulate part by part to keep the same summation order as getCentroid
+        sum_coord = np.zeros(shape=(len(keypoints), Body25.Keypoint.getCoordinatesShape()))
+        for part in Body25.Parts:
+            sum_coord += np.where(mask[:, part.value, None], coords[:, part.value], 0)
+        num = np.count_nonzero(mask, axis=1)[:, None]
+        centroid = np.divide(sum_coord, num, out=np.zeros_like(sum_coord), where=num > 0)
+        if to_int is True:
+            return centroid.astype(int)
+        return centroid
+
+    @staticmethod
+    def getFrameCoordinatesBatch(keypoints, mask=None, to_int=False):
+        """
+        Batch version of getFrameCoordinates
+        @param keypoints: 3D array, number of people x 25 keypoints x 3 (x, y, score)
+        @param mask: Result of getValidMask, computed if not given
+        @param to_int: Return integer coordinates
+        @return: 2D array, number of people x 4 (min_x, min_y, max_x, max_y),
+                 nan (or 0 if to_int is True) for people without any detected part
+        """
+        keypoints = Body25.__toBatch(keypoints)
+        if mask is None:
+            mask = Body25.getValidMask(keypoints)
+        coords = keypoints[:, :, :Body25.Keypoint.SCORE.value]
+        inf = np.array(np.inf, dtype=coords.dtype)
+        min_coord = np.amin(np.where(mask[:, :, None], coords, inf), axis=1)
+        max_coord = np.amax(np.where(mask[:, :, None], coords, -inf), axis=1)
+        frames = np.concatenate((min_coord, max_coord), axis=1)
+        frames[~np.any(mask, axis=1)] = np.nan
+        if to_int is True:
+            return np.nan_to_num(frames).astype(int)
+        return frames
+
+    @staticmethod
+    def normalizeKeypointBatch(keypoints, mask=None):
+        """
+        Batch version of normalizeKeypoint
+        @param keypoints: 3D array, number of people x 25 keypoints x 3 (x, y, score)
+        @param mask: Result of getValidMask, computed if not given
+        @return: 3D array, normalized keypoints with the same shape as the input
+        """
+        keypoints = Body25.__toBatch(keypoints)
+        if mask is None:
+            mask = Body25.getValidMask(keypoints)
+        frames = Body25.getFrameCoordinatesBatch(keypoints, mask)
+        min_coord = frames[:, None, :Body25.Keypoint.SCORE.value]
+        max_coord = frames[:, None, Body25.Keypoint.SCORE.value:]
+        kp = keypoints.copy()
+        coords = kp[:, :, :Body25.Keypoint.SCORE.value]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            normalized = (coords - min_coord) / (max_coord - min_coord)
+        # same as normalizeKeypoint, only parts that are all zeros (including score) are left untouched
+        nonzero = np.any(kp != 0, axis=2)
+        kp[:, :, :Body25.Keypoint.SCORE.value] = np.where(nonzero[:, :, None], normalized, coords)
+        return kp
+
+    @staticmethod
+    def getAverageScoreBatch(keypoints):
+        """
+        Batch version of getAverageScore
+        @param keypoints: 3D array, number of people x 25 keypoints x 3 (x, y, score)
+        @return: 1D array, average score of each person
+        """
+        keypoints = Body25.__toBatch(keypoints)
+        # same steps as getAverageScore, the mean is in the type of the keypoints (e.g. float32 of OpenPose) and the
+        # angle is in float64 as the numpy scalar of getAverageScore
+        mean = np.mean(keypoints, axis=1)[:, Body25.Keypoint.SCORE.value]
+        mean_score = np.sin(mean.astype(np.float64) * 0.5 * math.pi)
+        nonzero_score = np.count_nonzero(keypoints, axis=(1, 2)) / np.prod(Body25.Keypoint.getKeypointShape())
+        return (mean_score + nonzero_score) / 2
+
 
 if __name__ == "__main__":
     kp = np.array([
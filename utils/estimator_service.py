@@ -0,0 +1,431 @@
+import getpass
+import json
+import os
+import queue
+import socket
+import stat
+import struct
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from utils.pose_estimator_backend import PoseEstimatorBackend
+from utils.profiler import Profiler
+
+
+class EstimatorService:
+    """
+    Message format shared by EstimatorServer and EstimatorClient over a Unix domain socket. A message is the length of
+    a JSON header and the length of the payload as two unsigned 32-bit integers, the header, then the raw bytes of
+    the arrays listed in the header's 'arrays' as shape and dtype. Arrays are sent as raw bytes instead of pickled, so
+    a client cannot make the server run code.
+    """
+
+    # the socket of each user is in the runtime directory of the user if there is one, which only the user can access
+    default_socket_path = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(),
+                                       'human-activity-recognition-' + getpass.getuser() + '.sock')
+    __prefix = struct.Struct('!II')
+
+    @staticmethod
+    def isOwnSocket(socket_path=default_socket_path):
+        """
+        Check that a path is a socket created by the user running this process, so that the frames are not sent to a
+        server of another user who created the socket first
+        @param socket_path: Path of the Unix domain socket
+        @return: True if the path is a socket owned by this user
+        """
+        try:
+            status = os.lstat(socket_path)
+        except OSError:
+            return False
+        if stat.S_ISSOCK(status.st_mode) is False:
+            return False
+        return not hasattr(os, 'getuid') or status.st_uid == os.getuid()
+
+    @staticmethod
+    def send(sock, header, arrays=()):
+        """
+        @param sock: Connected socket
+        @param header: JSON serializable dictionary
+        @param arrays: List of numpy arrays
+        """
+        arrays = [np.ascontiguousarray(array) for array in arrays]
+        header = dict(header)
+        header['arrays'] = [{'shape': list(array.shape), 'dtype': array.dtype.str} for array in arrays]
+        header_bytes = json.dumps(header).encode('utf-8')
+        payload_size = sum(array.nbytes for array in arrays)
+        # the whole message is prepared before sending, so that an error does not leave half a message on the socket,
+        # and empty arrays, e.g. no people, have no bytes to send
+        buffers = [memoryview(array.reshape(-1)).cast('B') for array in arrays if array.nbytes > 0]
+        sock.sendall(EstimatorService.__prefix.pack(len(header_bytes), payload_size) + header_bytes)
+        for buffer in buffers:
+            sock.sendall(buffer)
+
+    @staticmethod
+    def __receiveExactly(sock, size):
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            count = sock.recv_into(view[received:], size - received)
+            if count == 0:
+                raise ConnectionError("socket closed while receiving a message")
+            received += count
+        return buffer
+
+    @staticmethod
+    def receive(sock):
+        """
+        @param sock: Connected socket
+        @return: tuple of (header, list of numpy arrays), None if the socket is closed before a message starts
+        """
+        try:
+            prefix = EstimatorService.__receiveExactly(sock, EstimatorService.__prefix.size)
+        except ConnectionError:
+            return None
+        header_size, payload_size = EstimatorService.__prefix.unpack(prefix)
+        header = json.loads(EstimatorService.__receiveExactly(sock, header_size).decode('utf-8'))
+        payload = EstimatorService.__receiveExactly(sock, payload_size)
+        arrays = []
+        offset = 0
+        for description in header.pop('arrays', []):
+            dtype = np.dtype(description['dtype'])
+            shape = tuple(description['shape'])
+            size = int(np.prod(shape)) * dtype.itemsize
+            if offset + size > payload_size:
+                raise Exception("message payload is smaller than its arrays")
+            arrays.append(np.frombuffer(payload, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape))
+            offset += size
+        return header, arrays
+
+
+class EstimatorServer:
+    """
+    Keep a pose estimator (and optionally the deep neural network classifier) warm in a long-running process and serve
+    the frames sent by EstimatorClient over a Unix domain socket, e.g.
+
+        server = EstimatorServer(classify=True)
+        server.serveForever()
+
+    Every client is served on its own thread, and the requests of all clients are queued and processed one at a time
+    by the thread owning the estimator, as OpenPose is not thread safe
+    """
+
+    __stop = object()
+
+    def __init__(self, socket_path=EstimatorService.default_socket_path, pose_estimator_factory=None, classify=False,
+                 queue_size=16):
+        """
+        @param socket_path: Path of the Unix domain socket
+        @param pose_estimator_factory: Function returning a PoseEstimatorBackend, called on the thread that uses it,
+                                       a PoseEstimator with OpenPose if not given
+        @param classify: Load and warm up the models of PoseClassifier.predictPoseModelBatch, so clients can ask for
+                         the poses of the people
+        @param queue_size: Maximum number of requests waiting, the clients wait when the queue is full
+        """
+        if queue_size < 1:
+            raise Exception("argument 'queue_size' in EstimatorServer() cannot be less than 1")
+        self.__socket_path = socket_path
+        self.__pose_estimator_factory = pose_estimator_factory
+        self.__classify = classify
+        self.__requests = queue.Queue(maxsize=queue_size)
+        self.__profiler = Profiler()
+        self.__listener = None
+        self.__threads = []
+        self.__clients = set()
+        self.__lock = threading.Lock()
+        self.__ready = threading.Event()
+        self.__running = False
+        self.__error = None
+        self.__served = 0
+
+    def __work(self):
+        try:
+            if self.__pose_estimator_factory is None:
+                from utils.pose_estimator import PoseEstimator
+                pose_estimator = PoseEstimator(face=False, hand=False)
+            else:
+                pose_estimator = self.__pose_estimator_factory()
+            if self.__classify is True:
+                from utils.pose_classifier import PoseClassifier
+                PoseClassifier.warmUp()
+        except BaseException as e:
+            self.__error = e
+            self.__ready.set()
+            raise
+        self.__ready.set()
+
+        while True:
+            request = self.__requests.get()
+            if request is EstimatorServer.__stop:
+                break
+            header, image, received, reply = request
+            start = time.perf_counter()
+            self.__profiler.record('queue', received, start)
+            try:
+                pose_estimator.processImage(image)
+                keypoints = np.asarray(pose_estimator.getPoseKeypoints(), dtype=np.float32)
+                arrays = [keypoints]
+                if header.get('output_image', False) is True:
+                    output_image = pose_estimator.getOutputImage()
+                    arrays.append(np.asarray(output_image if output_image is not None else image))
+                estimated = time.perf_counter()
+                self.__profiler.record('estimate', start, estimated)
+                if header.get('classify', False) is True:
+                    if self.__classify is False:
+                        raise Exception("the server was not started with classify=True")
+                    poses = np.zeros(0, dtype=np.int64)
+                    probabilities = np.zeros((0, len(PoseClassifier.Pose)))
+                    if len(keypoints) > 0:
+                        poses, probabilities = PoseClassifier.predictPoseModelBatch(keypoints)
+                    arrays += [np.asarray(poses, dtype=np.int64), np.asarray(probabilities, dtype=np.float64)]
+                    self.__profiler.record('classify', estimated, time.perf_counter())
+                response = {'status': 'ok', 'queue': (start - received) * 1000,
+                            'process': (time.perf_counter() - start) * 1000}
+            except Exception as e:
+                response = {'status': 'error', 'error': repr(e)}
+                arrays = []
+            reply[0] = (response, arrays)
+            reply[1].set()
+
+    def __serveClient(self, connection):
+        with self.__lock:
+            self.__clients.add(connection)
+        try:
+            while True:
+                try:
+                    message = EstimatorService.receive(connection)
+                except (ConnectionError, OSError):
+                    raise
+                except Exception as e:
+                    # the rest of a malformed message cannot be found, the client is told and disconnected
+                    EstimatorService.send(connection, {'status': 'error', 'error': repr(e)})
+                    break
+                if message is None:
+                    break
+                header, arrays = message
+                received = time.perf_counter()
+                try:
+                    self.__serveRequest(connection, header, arrays, received)
+                except (ConnectionError, OSError):
+                    raise
+                except Exception as e:
+                    # an error in one request does not disconnect the client
+                    EstimatorService.send(connection, {'status': 'error', 'error': repr(e)})
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self.__lock:
+                self.__clients.discard(connection)
+            connection.close()
+
+    def __serveRequest(self, connection, header, arrays, received):
+        if header.get('type') == 'stats':
+            EstimatorService.send(connection, {'status': 'ok', 'stats': self.getStats()})
+            return
+        if header.get('type') != 'process' or len(arrays) != 1:
+            EstimatorService.send(connection, {'status': 'error', 'error': 'unknown request'})
+            return
+        # the worker puts the response in reply and sets the event
+        reply = [None, threading.Event()]
+        self.__requests.put((header, arrays[0], received, reply))
+        reply[1].wait()
+        response, response_arrays = reply[0]
+        EstimatorService.send(connection, response, response_arrays)
+        self.__profiler.record('request', received, time.perf_counter())
+        with self.__lock:
+            self.__served += 1
+
+    def __accept(self):
+        while self.__running is True:
+            try:
+                connection, _ = self.__listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            thread = threading.Thread(target=self.__serveClient, args=(connection,), daemon=True)
+            thread.start()
+
+    def start(self):
+        """
+        Start the estimator and listen on the socket in background threads, returns when the estimator is ready
+        """
+        if os.path.lexists(self.__socket_path):
+            if EstimatorService.isOwnSocket(self.__socket_path) is False:
+                raise Exception(self.__socket_path + " exists and is not a socket of this user")
+            # a socket file left by a server that is not running anymore is removed
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.__socket_path)
+                probe.close()
+                raise Exception("an estimator server is already running on " + self.__socket_path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                if os.path.lexists(self.__socket_path):
+                    os.unlink(self.__socket_path)
+            finally:
+                probe.close()
+
+        worker = threading.Thread(target=self.__work, name='EstimatorServer-worker', daemon=True)
+        worker.start()
+        self.__ready.wait()
+        if self.__error is not None:
+            raise self.__error
+
+        self.__listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # only the user running the server can connect, the socket is created with these permissions by bind
+        umask = os.umask(0o077)
+        try:
+            self.__listener.bind(self.__socket_path)
+        finally:
+            os.umask(umask)
+        self.__listener.listen()
+        # the timeout lets the accepting thread stop
+        self.__listener.settimeout(0.5)
+        self.__running = True
+        acceptor = threading.Thread(target=self.__accept, name='EstimatorServer-accept', daemon=True)
+        acceptor.start()
+        self.__threads = [worker, acceptor]
+        print('Estimator server listening on', self.__socket_path)
+
+    def stop(self):
+        """
+        Stop listening, disconnect the clients and stop the estimator thread
+        """
+        if self.__running is False:
+            return
+        self.__running = False
+        with self.__lock:
+            clients = list(self.__clients)
+        for connection in clients:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.__requests.put(EstimatorServer.__stop)
+        for thread in self.__threads:
+            thread.join()
+        self.__listener.close()
+        if EstimatorService.isOwnSocket(self.__socket_path):
+            os.unlink(self.__socket_path)
+
+    def serveForever(self):
+        """
+        Start the server and serve until interrupted with Ctrl+C
+        """
+        self.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            self.printStats()
+
+    def getStats(self):
+        """
+        @return: Dictionary of number of requests served, clients connected, requests waiting, and the count, total,
+                 p50, p95 and max in milliseconds of the time requests waited in the queue, of estimation, of
+                 classification and of whole requests
+        """
+        with self.__lock:
+            stats = {'served': self.__served, 'clients': len(self.__clients)}
+        stats['waiting'] = self.__requests.qsize()
+        for name, summary in self.__profiler.getSummary().items():
+            stats[name] = {key: float(value) for key, value in summary.items()}
+        return stats
+
+    def printStats(self, logger=None):
+        stats = self.getStats()
+        print('Served {} requests, {} clients connected'.format(stats['served'], stats['clients']))
+        self.__profiler.printSummary(logger)
+
+
+class EstimatorClient(PoseEstimatorBackend):
+    """
+    Pose estimator sending the images to an EstimatorServer, so a short script does not pay for starting OpenPose,
+    e.g. ImagePose(pose_estimator=EstimatorClient())
+    """
+
+    def __init__(self, socket_path=EstimatorService.default_socket_path, output_image=True, classify=False):
+        """
+        @param socket_path: Path of the Unix domain socket of the server, which must be owned by this user
+        @param output_image: Receive the images with the skeletons drawn by the server, otherwise getOutputImage
+                             returns the image sent
+        @param classify: Ask the server for the poses of the people, returned by getPosePredictions, the server
+                         must be started with classify=True
+        """
+        self.__socket_path = socket_path
+        self.__output_image = output_image
+        self.__classify = classify
+        if EstimatorService.isOwnSocket(socket_path) is False:
+            raise Exception("argument 'socket_path' in EstimatorClient() is not a socket of this user: " + socket_path)
+        self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__socket.connect(socket_path)
+        self.__image = None
+        self.__keypoints = np.array([])
+        self.__rendered_image = None
+        self.__predictions = None
+        self.__latency = None
+
+    def __request(self, header, arrays=()):
+        EstimatorService.send(self.__socket, header, arrays)
+        message = EstimatorService.receive(self.__socket)
+        if message is None:
+            raise ConnectionError("estimator server closed the connection")
+        header, arrays = message
+        if header['status'] != 'ok':
+            raise Exception("estimator server error: " + header.get('error', ''))
+        return header, arrays
+
+    def processImage(self, image):
+        start = time.perf_counter()
+        header, arrays = self.__request({'type': 'process', 'output_image': self.__output_image,
+                                         'classify': self.__classify}, [image])
+        self.__image = image
+        self.__keypoints = arrays[0] if len(arrays[0]) > 0 else np.array([])
+        self.__rendered_image = arrays[1] if self.__output_image is True else None
+        self.__predictions = (arrays[-2], arrays[-1]) if self.__classify is True else None
+        self.__latency = {'queue': header['queue'], 'process': header['process'],
+                          'round_trip': (time.perf_counter() - start) * 1000}
+
+    def getOutputImage(self):
+        if self.__output_image is True:
+            return self.__rendered_image
+        return self.__image
+
+    def getPoseKeypoints(self):
+        return self.__keypoints
+
+    def getPosePredictions(self):
+        return self.__predictions
+
+    def getLatency(self):
+        """
+        @return: Dictionary of the time the last request waited in the queue of the server, was processed by the
+                 server and took from sending to receiving, in milliseconds
+        """
+        return self.__latency
+
+    def getServerStats(self):
+        """
+        @return: EstimatorServer.getStats of the server
+        """
+        return self.__request({'type': 'stats'})[0]['stats']
+
+    def close(self):
+        self.__socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+if __name__ == "__main__":
+    EstimatorServer(classify=True).serveForever()
@@ -0,0 +1,327 @@
+import multiprocessing
+import queue
+import time
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class FrameRingBuffer:
+    """
+    Ring buffer of fixed-size frame slots in shared memory, to pass frames from one producer process to one consumer
+    process without pickling them, e.g. a video decoder process and the process running the pose estimator:
+
+        ring = FrameRingBuffer(num_slots=8, frame_shape=(1080, 1920, 3))
+        process = multiprocessing.Process(target=decode, args=(ring, ...))     # decode calls ring.put(frame)
+        process.start()                                                         # and ring.finish() at the end
+        while True:
+            slot = ring.get()
+            if slot is None:
+                break
+            seq, frame = slot                   # frame is a view of the slot, valid until it is released
+            pose_estimator.processImage(frame)
+            ring.release(seq)
+        ring.unlink()
+
+    The frames get sequence numbers 0, 1, 2, ... in the order they are put, and are got in the same order. A slot is
+    reused by the producer only after the consumer releases it, so the consumer must release the frames in the order it
+    got them. The process creating the ring buffer owns the shared memory and unlinks it with unlink(), when it is
+    garbage collected or at exit, and the resource tracker of multiprocessing unlinks it if the owner is killed.
+    """
+
+    # slot states in the control block
+    FREE = 0
+    WRITING = 1
+    READY = 2
+    READING = 3
+
+    # control block of int64 after the frames: number of frames put when finished (-1 before), error flag, stop flag,
+    # then the sequence number and state of every slot, then the error message
+    __END = 0
+    __ERROR = 1
+    __STOP = 2
+    __HEADER = 3
+    __MESSAGE_SIZE = 512
+
+    def __init__(self, num_slots, frame_shape, dtype=np.uint8, context=None):
+        """
+        @param num_slots: Number of frame slots, the number of frames the producer can be ahead of the consumer
+        @param frame_shape: Shape of every frame, e.g. (height, width, 3) of a BGR frame
+        @param dtype: Data type of the frames
+        @param context: multiprocessing context of the processes, the default context if None
+        """
+        if num_slots < 1:
+            raise Exception("argument 'num_slots' in FrameRingBuffer() cannot be less than 1")
+        if context is None:
+            context = multiprocessing.get_context()
+        self.__num_slots = int(num_slots)
+        self.__frame_shape = tuple(int(size) for size in frame_shape)
+        self.__dtype = np.dtype(dtype)
+        self.__slot_bytes = int(np.prod(self.__frame_shape)) * self.__dtype.itemsize
+        if self.__slot_bytes < 1:
+            raise Exception("argument 'frame_shape' in FrameRingBuffer() cannot be empty")
+        self.__shm = shared_memory.SharedMemory(create=True, size=FrameRingBuffer.__getSize(
+            self.__num_slots, self.__slot_bytes))
+        self.__owner = True
+        # number of free slots for the producer and of ready slots, and the end, for the consumer
+        self.__free = context.Semaphore(self.__num_slots)
+        self.__ready = context.Semaphore(0)
+        self.__attach()
+        self.__control[:] = 0
+        self.__control[FrameRingBuffer.__END] = -1
+        self.__slot_seqs[:] = -1
+        # the shared memory is unlinked even if unlink() is never called
+        self.__finalizer = weakref.finalize(self, FrameRingBuffer.__cleanup, self.__shm, True)
+
+    @staticmethod
+    def __getSize(num_slots, slot_bytes):
+        # the control block starts on a multiple of 8 bytes
+        frames_bytes = (num_slots * slot_bytes + 7) // 8 * 8
+        return frames_bytes + (FrameRingBuffer.__HEADER + 2 * num_slots) * 8 + FrameRingBuffer.__MESSAGE_SIZE
+
+    @staticmethod
+    def __cleanup(shm, unlink):
+        try:
+            shm.close()
+        except BufferError:
+            # views of the slots are still referenced, the memory is released with them
+            pass
+        if unlink is True:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __attach(self):
+        frames_bytes = (self.__num_slots * self.__slot_bytes + 7) // 8 * 8
+        self.__frames = np.ndarray((self.__num_slots,) + self.__frame_shape, dtype=self.__dtype,
+                                   buffer=self.__shm.buf)
+        self.__control = np.ndarray(FrameRingBuffer.__HEADER + 2 * self.__num_slots, dtype=np.int64,
+                                    buffer=self.__shm.buf, offset=frames_bytes)
+        self.__slot_seqs = self.__control[FrameRingBuffer.__HEADER::2]
+        self.__slot_states = self.__control[FrameRingBuffer.__HEADER + 1::2]
+        self.__message = np.ndarray(FrameRingBuffer.__MESSAGE_SIZE, dtype=np.uint8, buffer=self.__shm.buf,
+                                    offset=frames_bytes + self.__control.nbytes)
+        # sequence number of the next frame to be acquired, committed, got and released, each used by one side only
+        self.__next_put = 0
+        self.__next_commit = 0
+        self.__next_get = 0
+        self.__next_release = 0
+        self.__wait_time = 0.0
+
+    def __getstate__(self):
+        # the ring buffer is sent to the other process when it is started, which attaches to the same shared memory
+        return {
+            'name': self.__shm.name,
+            'num_slots': self.__num_slots,
+            'frame_shape': self.__frame_shape,
+            'dtype': self.__dtype.str,
+            'slot_bytes': self.__slot_bytes,
+            'free': self.__free,
+            'ready': self.__ready
+        }
+
+    def __setstate__(self, state):
+        self.__num_slots = state['num_slots']
+        self.__frame_shape = state['frame_shape']
+        self.__dtype = np.dtype(state['dtype'])
+        self.__slot_bytes = state['slot_bytes']
+        self.__free = state['free']
+        self.__ready = state['ready']
+        self.__shm = shared_memory.SharedMemory(name=state['name'])
+        self.__owner = False
+        self.__attach()
+        self.__finalizer = weakref.finalize(self, FrameRingBuffer.__cleanup, self.__shm, False)
+
+    def getNumSlots(self):
+        return self.__num_slots
+
+    def getFrameShape(self):
+        return self.__frame_shape
+
+    def getSlotBytes(self):
+        return self.__slot_bytes
+
+    def getName(self):
+        """
+        @return: Name of the shared memory
+        """
+        return self.__shm.name
+
+    def __acquire(self, semaphore, timeout, empty):
+        start = time.perf_counter()
+        acquired = semaphore.acquire(timeout=timeout)
+        self.__wait_time += time.perf_counter() - start
+        if acquired is False:
+            raise empty
+
+    # producer
+
+    def isStopped(self):
+        """
+        @return: True if the consumer has stopped the ring buffer, the producer should stop putting frames
+        """
+        return bool(self.__control[FrameRingBuffer.__STOP])
+
+    def acquire(self, timeout=None):
+        """
+        Wait for a free slot, to write the next frame into it directly, e.g. with cv2.VideoCapture.read(frame)
+        @param timeout: Maximum time to wait in seconds, forever if None
+        @return: tuple of (sequence number, writable view of the slot), None if the ring buffer is stopped
+        @raise queue.Full: if no slot becomes free within the timeout
+        """
+        if self.isStopped():
+            return None
+        self.__acquire(self.__free, timeout, queue.Full())
+        if self.isStopped():
+            return None
+        seq = self.__next_put
+        index = seq % self.__num_slots
+        if self.__slot_states[index] != FrameRingBuffer.FREE:
+            raise Exception("FrameRingBuffer slot " + str(index) + " is not free for frame " + str(seq))
+        self.__slot_states[index] = FrameRingBuffer.WRITING
+        self.__slot_seqs[index] = seq
+        self.__next_put += 1
+        return seq, self.__frames[index]
+
+    def commit(self, seq):
+        """
+        Make the frame written into the slot from acquire available to the consumer, the frames are committed in the
+        order they are acquired
+        @param seq: Sequence number returned by acquire
+        """
+        index = seq % self.__num_slots
+        if seq != self.__next_commit or self.__slot_seqs[index] != seq or \
+                self.__slot_states[index] != FrameRingBuffer.WRITING:
+            raise Exception("argument 'seq' in FrameRingBuffer.commit() is not the next acquired frame " +
+                            str(self.__next_commit) + ", got " + str(seq))
+        self.__slot_states[index] = FrameRingBuffer.READY
+        self.__next_commit += 1
+        self.__ready.release()
+
+    def put(self, frame, timeout=None):
+        """
+        Copy a frame into the next free slot
+        @param frame: Frame of the shape and data type of the ring buffer
+        @param timeout: Maximum time to wait for a free slot in seconds, forever if None
+        @return: Sequence number of the frame, None if the ring buffer is stopped
+        @raise queue.Full: if no slot becomes free within the timeout
+        """
+        if frame.shape != self.__frame_shape:
+            raise Exception("argument 'frame' in FrameRingBuffer.put() has shape " + str(frame.shape) +
+                            ", expected " + str(self.__frame_shape))
+        slot = self.acquire(timeout)
+        if slot is None:
+            return None
+        seq, view = slot
+        view[...] = frame
+        self.commit(seq)
+        return seq
+
+    def finish(self, error=None):
+        """
+        Tell the consumer that no more frames will be put, get returns None after the last frame committed, a slot
+        acquired and not committed is dropped
+        @param error: Error of the producer, which get raises in the consumer after the last frame
+        """
+        if error is not None:
+            message = str(error).encode('utf-8', errors='replace')[:FrameRingBuffer.__MESSAGE_SIZE]
+            self.__message[:] = 0
+            self.__message[:len(message)] = np.frombuffer(message, dtype=np.uint8)
+            self.__control[FrameRingBuffer.__ERROR] = 1
+        self.__control[FrameRingBuffer.__END] = self.__next_commit
+        self.__ready.release()
+
+    # consumer
+
+    def get(self, timeout=None):
+        """
+        Wait for the next frame
+        @param timeout: Maximum time to wait in seconds, forever if None
+        @return: tuple of (sequence number, view of the slot), None after the last frame, the view is valid until the
+                 frame is released
+        @raise queue.Empty: if no frame is put within the timeout
+        """
+        self.__acquire(self.__ready, timeout, queue.Empty())
+        seq = self.__next_get
+        end = self.__control[FrameRingBuffer.__END]
+        if 0 <= end <= seq:
+            # the end stays available for the next get
+            self.__ready.release()
+            if self.__control[FrameRingBuffer.__ERROR] != 0:
+                raise Exception("FrameRingBuffer producer failed: " +
+                                bytes(self.__message).rstrip(b'\0').decode('utf-8', errors='replace'))
+            return None
+        index = seq % self.__num_slots
+        if self.__slot_seqs[index] != seq or self.__slot_states[index] != FrameRingBuffer.READY:
+            raise Exception("FrameRingBuffer slot " + str(index) + " has frame " + str(self.__slot_seqs[index]) +
+                            ", expected " + str(seq))
+        self.__slot_states[index] = FrameRingBuffer.READING
+        self.__next_get += 1
+        return seq, self.__frames[index]
+
+    def release(self, seq):
+        """
+        Acknowledge a frame, its slot is reused for a later frame and its view must not be used any more
+        @param seq: Sequence number of the oldest frame got and not released
+        """
+        if seq != self.__next_release or seq >= self.__next_get:
+            raise Exception("argument 'seq' in FrameRingBuffer.release() must be the oldest frame not released " +
+                            str(self.__next_release) + ", got " + str(seq))
+        self.__slot_states[seq % self.__num_slots] = FrameRingBuffer.FREE
+        self.__next_release += 1
+        self.__free.release()
+
+    def stop(self):
+        """
+        Tell the producer to stop putting frames, e.g. when the consumer stops before the last frame
+        """
+        self.__control[FrameRingBuffer.__STOP] = 1
+        # wakes the producer waiting for a free slot
+        self.__free.release()
+
+    def getStats(self):
+        """
+        @return: Dictionary of the number of frames put (committed), got and released by this process and the time in
+                 seconds it waited for a slot or a frame
+        """
+        return {
+            'put': self.__next_commit,
+            'got': self.__next_get,
+            'released': self.__next_release,
+            'wait_time': self.__wait_time
+        }
+
+    def close(self):
+        """
+        Detach this process from the shared memory, the views of the slots must not be used any more
+        """
+        self.__frames = None
+        self.__slot_seqs = None
+        self.__slot_states = None
+        self.__control = None
+        self.__message = None
+        self.__finalizer.detach()
+        FrameRingBuffer.__cleanup(self.__shm, False)
+
+    def unlink(self):
+        """
+        Detach and free the shared memory, by the process that created the ring buffer
+        """
+        if self.__owner is False:
+            raise Exception("FrameRingBuffer.unlink() can only be called by the process that created it")
+        self.close()
+        try:
+            self.__shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.__owner is True:
+            self.unlink()
+        else:
+            self.close()
@@ -0,0 +1,88 @@
+import os
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+
+class FrameWriter:
+    """
+    Write images with cv2.imwrite on a pool of background threads, so that encoding the images does not block the
+    caller until the queue of images waiting to be written is full
+    """
+
+    def __init__(self, num_workers=2, queue_size=16):
+        """
+        @param num_workers: Number of threads writing images
+        @param queue_size: Maximum number of images waiting to be written, write blocks when the queue is full
+        """
+        if num_workers < 1:
+            raise Exception("argument 'num_workers' in FrameWriter() cannot be less than 1")
+        if queue_size < 1:
+            raise Exception("argument 'queue_size' in FrameWriter() cannot be less than 1")
+        self.__queue = queue.Queue(maxsize=queue_size)
+        self.__lock = threading.Lock()
+        self.__errors = []
+        self.__count = 0
+        self.__bytes_written = 0
+        self.__workers = [threading.Thread(target=self.__work, name='FrameWriter-' + str(i), daemon=True)
+                          for i in range(num_workers)]
+        for worker in self.__workers:
+            worker.start()
+
+    def __work(self):
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                break
+            path, image = item
+            try:
+                if cv2.imwrite(path, image) is False:
+                    raise Exception("FrameWriter could not write " + path)
+                size = os.path.getsize(path)
+                with self.__lock:
+                    self.__count += 1
+                    self.__bytes_written += size
+            except Exception as e:
+                with self.__lock:
+                    self.__errors.append(e)
+
+    def write(self, path, image):
+        """
+        Queue an image to be written, the image is copied so it can be changed after this returns
+        @param path: Path of the image file
+        @param image: Image
+        """
+        if self.__workers is None:
+            raise Exception("FrameWriter.write() cannot be called after close()")
+        self.__queue.put((path, np.array(image)))
+
+    def close(self, raise_error=True):
+        """
+        Wait until all queued images are written and stop the threads
+        @param raise_error: Raise the first error from writing the images
+        """
+        if self.__workers is not None:
+            for worker in self.__workers:
+                self.__queue.put(None)
+            for worker in self.__workers:
+                worker.join()
+            self.__workers = None
+        if raise_error is True and len(self.__errors) > 0:
+            raise self.__errors[0]
+
+    def getCount(self):
+        """
+        @return: Number of images written
+        """
+        return self.__count
+
+    def getBytesWritten(self):
+        """
+        @return: Total size of the images written in bytes
+        """
+        return self.__bytes_written
+
+    def getErrors(self):
+        return list(self.__errors)
@@ -1,6 +1,5 @@
 import cv2
 from utils.body25 import Body25
-from utils.pose_estimator import PoseEstimator
 
 
 class ImageProcessing:
@@ -46,6 +45,8 @@ class ImageProcessing:
 
 
 if __name__ == "__main__":
+    from utils.pose_estimator import PoseEstimator
+
     image_path = "../images/COCO/COCO_val2014_000000000328.jpg"
     imageToProcess = cv2.imread(image_path)
     pose_estimator = PoseEstimator(face=False, hand=False)
@@ -0,0 +1,135 @@
+import json
+import os
+
+import numpy as np
+
+from utils.body25 import Body25
+
+
+class KeypointRecorder:
+    """
+    Record the pose keypoints of every frame of a video into an append-only file, which is read by KeypointRecording.
+    The keypoints of all frames are stored one after another in the file at path, the frame number, offset and number
+    of people of each frame are stored in path + '.idx', and the frame size and fps in path + '.json'.
+    """
+
+    index_extension = '.idx'
+    metadata_extension = '.json'
+
+    def __init__(self, path, frame_width, frame_height, fps, dtype=np.float32):
+        """
+        @param path: Path of the recording, an existing recording is overwritten
+        @param frame_width: Width of the frames
+        @param frame_height: Height of the frames
+        @param fps: Number of frames recorded per second of the video
+        @param dtype: Data type of the keypoints stored, np.float16 halves the size but rounds coordinates above 2048
+        """
+        if np.dtype(dtype) not in (np.dtype(np.float16), np.dtype(np.float32)):
+            raise Exception("argument 'dtype' in KeypointRecorder() must be np.float16 or np.float32")
+        self.__path = path
+        self.__dtype = np.dtype(dtype)
+        self.__offset = 0
+        self.__last_frame = None
+        with open(path + KeypointRecorder.metadata_extension, 'w') as outfile:
+            json.dump({
+                'dtype': self.__dtype.name,
+                'frame_width': frame_width,
+                'frame_height': frame_height,
+                'fps': fps
+            }, outfile)
+        self.__data_file = open(path, 'wb')
+        self.__index_file = open(path + KeypointRecorder.index_extension, 'wb')
+
+    def write(self, frame_number, keypoints):
+        """
+        Append the keypoints of a frame, frames must be written in increasing frame number
+        @param frame_number: Frame number
+        @param keypoints: Pose keypoints from PoseEstimator.getPoseKeypoints, number of people x 25 keypoints x 3
+        """
+        if self.__data_file is None:
+            raise Exception("KeypointRecorder.write() cannot be called after close()")
+        if self.__last_frame is not None and frame_number <= self.__last_frame:
+            raise Exception("frame " + str(frame_number) + " is written after frame " + str(self.__last_frame))
+        keypoints = np.asarray(keypoints, dtype=self.__dtype).reshape((-1,) + Body25.Keypoint.getKeypointShape())
+        # the keypoints are written before the index, so every frame in the index is complete
+        self.__data_file.write(keypoints.tobytes())
+        self.__data_file.flush()
+        self.__index_file.write(np.array([frame_number, self.__offset, len(keypoints)], dtype=np.int64).tobytes())
+        self.__index_file.flush()
+        self.__offset += len(keypoints)
+        self.__last_frame = frame_number
+
+    def close(self):
+        if self.__data_file is not None:
+            self.__data_file.close()
+            self.__index_file.close()
+            self.__data_file = None
+            self.__index_file = None
+
+    def getPath(self):
+        return self.__path
+
+
+class KeypointRecording:
+    """
+    Read a recording created by KeypointRecorder, the keypoints are memory mapped so any frame can be read without
+    loading the whole recording
+    """
+
+    def __init__(self, path):
+        """
+        @param path: Path of the recording
+        """
+        with open(path + KeypointRecorder.metadata_extension) as infile:
+            self.__metadata = json.load(infile)
+        dtype = np.dtype(self.__metadata['dtype'])
+        shape = Body25.Keypoint.getKeypointShape()
+        num_people = os.path.getsize(path) // (dtype.itemsize * int(np.prod(shape)))
+        if num_people > 0:
+            self.__keypoints = np.memmap(path, dtype=dtype, mode='r', shape=(num_people,) + shape)
+        else:
+            self.__keypoints = np.zeros(shape=(0,) + shape, dtype=dtype)
+        index = np.fromfile(path + KeypointRecorder.index_extension, dtype=np.int64)
+        index = index[:len(index) // 3 * 3].reshape((-1, 3))
+        # a recording that was not closed may end with a frame that is not completely written
+        index = index[index[:, 1] + index[:, 2] <= num_people]
+        self.__frame_numbers = index[:, 0]
+        self.__offsets = index[:, 1]
+        self.__counts = index[:, 2]
+
+    def __len__(self):
+        return len(self.__frame_numbers)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield int(self.__frame_numbers[i]), self.__read(i)
+
+    def __read(self, i):
+        start = self.__offsets[i]
+        return np.array(self.__keypoints[start:start + self.__counts[i]], dtype=np.float32)
+
+    def getFrameNumbers(self):
+        return self.__frame_numbers.copy()
+
+    def hasFrame(self, frame_number):
+        i = np.searchsorted(self.__frame_numbers, frame_number)
+        return i < len(self) and self.__frame_numbers[i] == frame_number
+
+    def getKeypoints(self, frame_number):
+        """
+        @param frame_number: Frame number
+        @return: Pose keypoints of the frame as float32, number of people x 25 keypoints x 3
+        """
+        i = np.searchsorted(self.__frame_numbers, frame_number)
+        if i >= len(self) or self.__frame_numbers[i] != frame_number:
+            raise Exception("frame " + str(frame_number) + " is not in the recording")
+        return self.__read(i)
+
+    def getFrameWidth(self):
+        return self.__metadata['frame_width']
+
+    def getFrameHeight(self):
+        return self.__metadata['frame_height']
+
+    def getFps(self):
+        return self.__metadata['fps']
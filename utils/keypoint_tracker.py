@@ -1,13 +1,38 @@
 from collections import OrderedDict
+from enum import Enum
 import numpy as np
 
 from utils.body25 import Body25
-from utils.utilities import Utilities as Ut
 
 
 class KeypointTracker:
 
-    def __init__(self, frame_width, frame_height, max_disappeared=3, logger=None):
+    class Assignment(Enum):
+        GREEDY = 0
+        OPTIMAL = 1
+
+    class Motion(Enum):
+        STATIC = 0
+        CONSTANT_VELOCITY = 1
+
+    def __init__(self, frame_width, frame_height, max_disappeared=3, logger=None, assignment=Assignment.GREEDY,
+                 max_error=np.inf, prune=False, motion=Motion.STATIC, velocity_gain=0.5, verbose=True):
+        """
+        @param frame_width: Width of the frames
+        @param frame_height: Height of the frames
+        @param max_disappeared: Number of consecutive frames an object can be missing before it is unregistered
+        @param logger: Logger, the error matrix is logged at debug level
+        @param assignment: KeypointTracker.Assignment, GREEDY matches the pairs with the lowest error first,
+                           OPTIMAL minimizes the total error of all matched pairs
+        @param max_error: Pairs with error larger than this are never matched
+        @param prune: Only calculate the error of pairs whose frames are close enough to overlap, using a KD-tree
+                      over the frames, which is faster in crowded frames and gives the same assignments
+        @param motion: KeypointTracker.Motion, STATIC matches new keypoints against the last keypoints of each
+                       object, CONSTANT_VELOCITY moves the last keypoints by the velocity of the object first
+        @param velocity_gain: Weight of the newest displacement when updating the velocity of an object,
+                              1 uses the last displacement only
+        @param verbose: Print the existing, disappeared and all IDs after each update
+        """
         self.__next_ID = 0
         self.__frame_width = frame_width
         self.__frame_height = frame_height
@@ -16,20 +41,41 @@ class KeypointTracker:
         self.__in_frame = OrderedDict()
         self.__disappeared = OrderedDict()
         self.__max_disappeared = max_disappeared
+        self.__assignment = assignment
+        self.__max_error = max_error
+        self.__prune = prune
+        self.__motion = motion
+        self.__velocity_gain = velocity_gain
+        self.__velocity = OrderedDict()
+        self.__verbose = verbose
 
     def setMaxDisappeared(self, max_disappeared):
         self.__max_disappeared = max_disappeared
 
+    def setAssignment(self, assignment):
+        self.__assignment = assignment
+
+    def setMaxError(self, max_error):
+        self.__max_error = max_error
+
+    def setPrune(self, prune):
+        self.__prune = prune
+
+    def setMotion(self, motion):
+        self.__motion = motion
+
     def __register(self, keypoint):
         self.__keypoints[self.__next_ID] = keypoint
         self.__in_frame[self.__next_ID] = True
         self.__disappeared[self.__next_ID] = 0
+        self.__velocity[self.__next_ID] = None
         self.__next_ID += 1
 
     def __unregister(self, object_id):
         del self.__keypoints[object_id]
         del self.__in_frame[object_id]
         del self.__disappeared[object_id]
+        del self.__velocity[object_id]
 
     def getKeypointsInFrame(self):
         keypoints_in_frame = OrderedDict()
@@ -38,10 +84,88 @@ class KeypointTracker:
                 keypoints_in_frame[object_id] = keypoint
         return keypoints_in_frame
 
-    def __calculateError(self, keypoint1, keypoint2):
+    def __predict(self, object_id):
+        keypoint = self.__keypoints[object_id]
+        velocity = self.__velocity[object_id]
+        if self.__motion is KeypointTracker.Motion.STATIC or velocity is None:
+            return keypoint
+        # the object is expected in the next update, after the frames it has been missing
+        steps = self.__disappeared[object_id] + 1
+        predicted = np.array(keypoint)
+        detected = Body25.getValidMask(predicted)[0]
+        predicted[detected, :Body25.Keypoint.SCORE.value] += velocity * steps
+        return predicted
+
+    def __updateVelocity(self, object_id, keypoint):
+        # displacement of the parts detected in both keypoints per update, the median ignores misplaced parts
+        previous = self.__keypoints[object_id]
+        detected = Body25.getValidMask(previous)[0] & Body25.getValidMask(keypoint)[0]
+        if not detected.any():
+            return
+        displacement = np.median(
+            keypoint[detected, :Body25.Keypoint.SCORE.value] - previous[detected, :Body25.Keypoint.SCORE.value],
+            axis=0) / (self.__disappeared[object_id] + 1)
+        velocity = self.__velocity[object_id]
+        if velocity is None:
+            self.__velocity[object_id] = displacement
+        else:
+            self.__velocity[object_id] = velocity + self.__velocity_gain * (displacement - velocity)
+
+    def getPredictedKeypoints(self):
+        """
+        Get the keypoints of every object expected in the next update, which are matched against the new keypoints,
+        use Body25.getFrameCoordinates on them for the predicted frames
+        @return: OrderedDict of object ID to keypoints, the last keypoints if the motion is STATIC
+        """
+        predicted = OrderedDict()
+        for object_id in self.__keypoints.keys():
+            predicted[object_id] = self.__predict(object_id)
+        return predicted
+
+    def getVelocities(self):
+        """
+        @return: OrderedDict of object ID to velocity (x, y) in pixels per update, None if it is not known yet
+        """
+        return OrderedDict(self.__velocity)
+
+    __ERROR_WEIGHT = np.array([15, 3, 1, 3])
+
+    @staticmethod
+    def calculateErrorMatrix(keypoints1, keypoints2, frame_width, frame_height, prune=False):
+        """
+        Calculate the error between every pair of poses, as the weighted average of the distance error of the
+        parts, the centroid error, the area error and the overlap error of the frames
+        @param keypoints1: 3D array, M people x 25 keypoints x 3
+        @param keypoints2: 3D array, N people x 25 keypoints x 3
+        @param frame_width: Width of the frame, used to scale the x-coordinates
+        @param frame_height: Height of the frame, used to scale the y-coordinates
+        @param prune: Only calculate the pairs returned by candidatePairs, the other pairs have infinite error
+        @return: 2D array, M x N errors
+        """
+        keypoints1 = np.asarray(keypoints1).reshape((-1,) + Body25.Keypoint.getKeypointShape())
+        keypoints2 = np.asarray(keypoints2).reshape((-1,) + Body25.Keypoint.getKeypointShape())
+        frame = np.array([frame_width, frame_height], dtype=float)
+
+        # bounding boxes and centroids are computed once for each pose
+        # bounding boxes keep the dtype of the keypoints (float32 from OpenPose) like Body25.getFrameCoordinates
+        mask1 = Body25.getValidMask(keypoints1)
+        mask2 = Body25.getValidMask(keypoints2)
+        boxes1 = Body25.getFrameCoordinatesBatch(keypoints1, mask1)
+        boxes2 = Body25.getFrameCoordinatesBatch(keypoints2, mask2)
+        centroid1 = Body25.getCentroidBatch(keypoints1, mask1) / frame
+        centroid2 = Body25.getCentroidBatch(keypoints2, mask2) / frame
+
+        if prune is True:
+            rows, cols = KeypointTracker.__candidatePairs(boxes1, boxes2)
+        else:
+            rows = np.repeat(np.arange(len(keypoints1)), len(keypoints2))
+            cols = np.tile(np.arange(len(keypoints2)), len(keypoints1))
 
-        min_x1, min_y1, max_x1, max_y1 = Body25.getFrameCoordinates(keypoint1)
-        min_x2, min_y2, max_x2, max_y2 = Body25.getFrameCoordinates(keypoint2)
+        error_matrix = np.full(shape=(len(keypoints1), len(keypoints2)), fill_value=np.inf)
+        if len(rows) == 0:
+            return error_matrix
+        min_x1, min_y1, max_x1, max_y1 = boxes1[rows].T
+        min_x2, min_y2, max_x2, max_y2 = boxes2[cols].T
         width1 = max_x1 - min_x1
         width2 = max_x2 - min_x2
         height1 = max_y1 - min_y1
@@ -49,55 +173,145 @@ class KeypointTracker:
         total_area1 = width1 * height1
         total_area2 = width2 * height2
 
-        frame = np.full(shape=Body25.Keypoint.getCoordinatesShape(), fill_value=np.inf)
-        frame[Body25.Keypoint.X.value] = self.__frame_width
-        frame[Body25.Keypoint.Y.value] = self.__frame_height
-
-        def distanceError():
-            sum_dist = 0
-            num = 0
-            for part in Body25.Parts:
-                coord1 = Body25.getCoordinates(keypoint1, part)
-                coord2 = Body25.getCoordinates(keypoint2, part)
-                dist = Ut.distance(coord1 / frame, coord2 / frame, ignore_zero_vector=True)
-                if np.isnan(dist):
-                    continue
-                else:
-                    sum_dist += dist
-                num += 1
-            if num == 0:
-                return np.inf
-            else:
-                return sum_dist / num
-
-        def centroidError():
-            centroid1 = Body25.getCentroid(keypoint1)
-            centroid2 = Body25.getCentroid(keypoint2)
-            dist = Ut.distance(centroid1 / frame, centroid2 / frame, ignore_zero_vector=True)
-            if np.isnan(dist):
-                return np.inf
-            return dist
-
-        def areaError():
-            return abs(total_area1 - total_area2) / max(total_area1, total_area2)
-
-        def overlapError():
-            width = min(max_x1, max_x2) - max(min_x1, min_x2)
-            height = min(max_y1, max_y2) - max(min_y1, min_y2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # distance error, the average distance of the parts detected in both poses
+            # parts are put in the first axis and summed one by one, in the same order as the parts
+            coords1 = np.transpose(keypoints1[:, :, :Body25.Keypoint.SCORE.value] / frame, (1, 0, 2))[:, rows]
+            coords2 = np.transpose(keypoints2[:, :, :Body25.Keypoint.SCORE.value] / frame, (1, 0, 2))[:, cols]
+            both = mask1.T[:, rows] & mask2.T[:, cols]
+            difference = coords1 - coords2
+            distance = np.sqrt(difference[..., 0] * difference[..., 0] + difference[..., 1] * difference[..., 1])
+            sum_dist = np.zeros(shape=distance.shape[1:])
+            for part_distance in np.where(both, distance, 0):
+                sum_dist += part_distance
+            num = np.count_nonzero(both, axis=0)
+            distance_error = np.where(num > 0, sum_dist / num, np.inf)
+
+            # centroid error, poses without any detected part have zero centroids
+            difference = centroid1[rows] - centroid2[cols]
+            centroid_error = np.sqrt(difference[..., 0] * difference[..., 0] + difference[..., 1] * difference[..., 1])
+            no_centroid = ~np.any(centroid1 != 0, axis=1)[rows] | ~np.any(centroid2 != 0, axis=1)[cols]
+            centroid_error[no_centroid] = np.inf
+
+            # area error
+            area_error = np.abs(total_area1 - total_area2) / np.maximum(total_area1, total_area2)
+
+            # overlap error, infinite if the frames do not overlap
+            width, height = KeypointTracker.__overlap(min_x1, min_y1, max_x1, max_y1, min_x2, min_y2, max_x2, max_y2)
             overlapped_area = width * height
-            if abs(width) > width1 or abs(width) > width2 or \
-                    abs(height) > height1 or abs(height) > height2 or \
-                    abs(overlapped_area) > total_area1 or abs(overlapped_area) > total_area2:
-                return np.inf
-            return 1 - overlapped_area / (total_area1 + total_area2)
+            no_overlap = (np.abs(width) > width1) | (np.abs(width) > width2) | \
+                         (np.abs(height) > height1) | (np.abs(height) > height2) | \
+                         (np.abs(overlapped_area) > total_area1) | (np.abs(overlapped_area) > total_area2)
+            overlap_ratio = (overlapped_area / (total_area1 + total_area2)).astype(float)
+            overlap_error = np.where(no_overlap, np.inf, 1 - overlap_ratio)
+
+            errors = np.stack([distance_error, centroid_error, area_error, overlap_error], axis=-1)
+            error_matrix[rows, cols] = errors @ KeypointTracker.__ERROR_WEIGHT / np.sum(KeypointTracker.__ERROR_WEIGHT)
+        return error_matrix
+
+    @staticmethod
+    def __overlap(min_x1, min_y1, max_x1, max_y1, min_x2, min_y2, max_x2, max_y2):
+        # width and height of the overlapped frame, negative if the frames are apart
+        width = np.minimum(max_x1, max_x2) - np.maximum(min_x1, min_x2)
+        height = np.minimum(max_y1, max_y2) - np.maximum(min_y1, min_y2)
+        return width, height
+
+    @staticmethod
+    def __candidatePairs(boxes1, boxes2):
+        """
+        Find the pairs of frames close enough to have a finite overlap error, the overlap error is infinite when
+        the gap between the frames is larger than the width or height of either frame
+        @param boxes1: 2D array, M frames x (min_x, min_y, max_x, max_y)
+        @param boxes2: 2D array, N frames x (min_x, min_y, max_x, max_y)
+        @return: tuple of (rows, columns) of the candidate pairs, sorted by row then column
+        """
+        from scipy.spatial import cKDTree
+
+        # poses without any detected part have nan frames and never have a finite error
+        valid1 = np.flatnonzero(np.isfinite(boxes1).all(axis=1))
+        valid2 = np.flatnonzero(np.isfinite(boxes2).all(axis=1))
+        if len(valid1) == 0 or len(valid2) == 0:
+            return np.array([], dtype=int), np.array([], dtype=int)
+        size1 = boxes1[valid1, 2:].astype(float) - boxes1[valid1, :2]
+        size2 = boxes2[valid2, 2:].astype(float) - boxes2[valid2, :2]
+        centre1 = (boxes1[valid1, :2].astype(float) + boxes1[valid1, 2:]) / 2
+        centre2 = (boxes2[valid2, :2].astype(float) + boxes2[valid2, 2:]) / 2
 
-        errors = [distanceError(), centroidError(), areaError(), overlapError()]
-        weight = [15, 3, 1, 3]
-        return np.dot(errors, weight) / sum(weight)
+        # the centres of a candidate pair are at most 0.5 x the larger size + 1.5 x the smaller size apart on each
+        # axis, so the frames in the tree are searched with the Chebyshev distance on the coordinates scaled by the
+        # size of the largest frame in the tree
+        scale = np.maximum(np.max(size1, axis=0), 1)
+        radius = np.max((1.5 * size2 + 0.5 * np.max(size1, axis=0)) / scale, axis=1)
+        tree = cKDTree(centre1 / scale)
+        neighbours = tree.query_ball_point(centre2 / scale, r=radius * (1 + 1e-6) + 1e-6, p=np.inf)
+        cols = np.repeat(valid2, [len(neighbour) for neighbour in neighbours])
+        if len(cols) == 0:
+            return np.array([], dtype=int), np.array([], dtype=int)
+        rows = valid1[np.concatenate(neighbours).astype(int)]
+
+        # exact check with the same arithmetic and dtype as the overlap error
+        min_x1, min_y1, max_x1, max_y1 = boxes1[rows].T
+        min_x2, min_y2, max_x2, max_y2 = boxes2[cols].T
+        width, height = KeypointTracker.__overlap(min_x1, min_y1, max_x1, max_y1, min_x2, min_y2, max_x2, max_y2)
+        candidate = (np.abs(width) <= max_x1 - min_x1) & (np.abs(width) <= max_x2 - min_x2) & \
+                    (np.abs(height) <= max_y1 - min_y1) & (np.abs(height) <= max_y2 - min_y2)
+        order = np.lexsort((cols[candidate], rows[candidate]))
+        return rows[candidate][order], cols[candidate][order]
+
+    def __errorMatrix(self, object_keypoints, frame_keypoints):
+        error_matrix = KeypointTracker.calculateErrorMatrix(object_keypoints, frame_keypoints,
+                                                            self.__frame_width, self.__frame_height,
+                                                            prune=self.__prune)
+        with np.errstate(invalid='ignore'):
+            error_matrix[~(error_matrix <= self.__max_error)] = np.inf
+        return error_matrix
+
+    @staticmethod
+    def assignGreedy(error_matrix):
+        """
+        Match rows and columns from the pair with the lowest error, each row and column is matched at most once
+        @param error_matrix: 2D float array, pairs with infinite error are never matched
+        @return: tuple of (matched rows, matched columns)
+        """
+        order = np.argsort(error_matrix, axis=None, kind='stable')
+        # sorted errors are ascending, so the pairs after the first infinite one are never matched
+        order = order[:np.count_nonzero(np.isfinite(error_matrix))]
+        row_index, col_index = np.unravel_index(order, error_matrix.shape)
+        used_row = set()
+        used_col = set()
+        rows = []
+        cols = []
+        for (row, col) in zip(row_index.tolist(), col_index.tolist()):
+            if row in used_row or col in used_col:
+                continue
+            rows.append(row)
+            cols.append(col)
+            used_row.add(row)
+            used_col.add(col)
+        return np.array(rows, dtype=int), np.array(cols, dtype=int)
+
+    @staticmethod
+    def assignOptimal(error_matrix):
+        """
+        Match rows and columns with the minimum total error (Jonker-Volgenant), matching as many pairs with finite
+        error as possible
+        @param error_matrix: 2D float array, pairs with infinite error are never matched
+        @return: tuple of (matched rows, matched columns)
+        """
+        from scipy.optimize import linear_sum_assignment
+
+        finite = np.isfinite(error_matrix)
+        if not finite.any():
+            return np.array([], dtype=int), np.array([], dtype=int)
+        # a cost larger than the sum of all finite errors makes infinite pairs the last resort
+        cost = np.where(finite, error_matrix, np.abs(error_matrix[finite]).sum() * 2 + 1)
+        rows, cols = linear_sum_assignment(cost)
+        matched = finite[rows, cols]
+        return rows[matched], cols[matched]
 
     def update(self, frame_keypoints):
         if len(frame_keypoints) == 0:
-            objectIDs = self.__disappeared.keys()
+            objectIDs = list(self.__disappeared.keys())
             for objectID in objectIDs:
                 self.__disappeared[objectID] += 1
                 self.__in_frame[objectID] = False
@@ -113,40 +327,31 @@ class KeypointTracker:
         # if there are existing objects, try to match the input keypoints to existing keypoints
         else:
             objectID_list = list(self.__keypoints.keys())
-            objectKeypoints_list = list(self.__keypoints.values())
+            objectKeypoints_list = list(self.getPredictedKeypoints().values())
 
             # comparing object keypoints and input keypoints
-            errorMatrix = np.empty(shape=(len(objectKeypoints_list), len(frame_keypoints)), dtype=object)
-            for (i, keypoint) in enumerate(objectKeypoints_list):
-                for (j, inputKeypoint) in enumerate(frame_keypoints):
-                    err = self.__calculateError(keypoint, inputKeypoint)
-                    errorMatrix[i, j] = err
-
-            row_index, col_index = np.unravel_index(np.argsort(errorMatrix, axis=None), errorMatrix.shape)
+            errorMatrix = self.__errorMatrix(objectKeypoints_list, frame_keypoints)
+            if self.__assignment is KeypointTracker.Assignment.OPTIMAL:
+                row_index, col_index = KeypointTracker.assignOptimal(errorMatrix)
+            else:
+                row_index, col_index = KeypointTracker.assignGreedy(errorMatrix)
 
-            used_row = set()
-            used_col = set()
             existing_id = list()
             for (row, col) in zip(row_index, col_index):
-                if row in used_row or col in used_col:
-                    continue
-                if np.isinf(errorMatrix[row, col]):
-                    continue
-                # otherwise take the object ID for the current row and update its new keypoints
+                # take the object ID for the current row and update its new keypoints
                 # row number represents index of the current object
                 objectID = objectID_list[row]
                 existing_id.append(objectID)
-                # assign input keypoints which has shortest distance from to the existing object
+                if self.__motion is KeypointTracker.Motion.CONSTANT_VELOCITY:
+                    self.__updateVelocity(objectID, frame_keypoints[col])
+                # assign input keypoints matched to the existing object
                 # col number represents index of the input keypoint
                 self.__keypoints[objectID] = frame_keypoints[col]
                 self.__disappeared[objectID] = 0
                 self.__in_frame[objectID] = True
-                # update used rows and cols
-                used_row.add(row)
-                used_col.add(col)
 
-            unused_row = set(range(0, errorMatrix.shape[0])).difference(used_row)
-            unused_col = set(range(0, errorMatrix.shape[1])).difference(used_col)
+            unused_row = set(range(0, errorMatrix.shape[0])).difference(row_index.tolist())
+            unused_col = set(range(0, errorMatrix.shape[1])).difference(col_index.tolist())
             disappeared_id = list()
             for row in unused_row:
                 objectID = objectID_list[row]
@@ -155,21 +360,19 @@ class KeypointTracker:
                 self.__in_frame[objectID] = False
                 if self.__disappeared[objectID] >= self.__max_disappeared:
                     self.__unregister(objectID)
-            for col in unused_col:
+            for col in sorted(unused_col):
                 self.__register(frame_keypoints[col])
 
-            print('Error Matrix:\n' + str(errorMatrix))
-            print('Object ID List: ' + str(objectID_list))
-            print('Row Index: ' + str(row_index))
-            print('Col Index: ' + str(col_index))
-            print('Existing IDs: ' + str(sorted(existing_id)))
-            print('Disappeared IDs: ' + str(sorted(disappeared_id)))
-            print('All IDs: ' + str(sorted(list(self.__keypoints.keys()))))
+            if self.__verbose is True:
+                print('Existing IDs: ' + str(sorted(existing_id)))
+                print('Disappeared IDs: ' + str(sorted(disappeared_id)))
+                print('All IDs: ' + str(sorted(list(self.__keypoints.keys()))))
             if self.__logger is not None:
-                self.__logger.info('Error Matrix:\n' + str(errorMatrix))
-                self.__logger.info('Object ID List: ' + str(objectID_list))
-                self.__logger.info('Row Index: ' + str(row_index))
-                self.__logger.info('Col Index: ' + str(col_index))
+                # the arguments are only formatted when debug messages are logged, the error matrix can be large
+                self.__logger.debug('Error Matrix:\n%s', errorMatrix)
+                self.__logger.debug('Object ID List: %s', objectID_list)
+                self.__logger.debug('Row Index: %s', row_index)
+                self.__logger.debug('Col Index: %s', col_index)
                 self.__logger.info('Existing IDs: ' + str(sorted(existing_id)))
                 self.__logger.info('Disappeared IDs: ' + str(sorted(disappeared_id)))
                 self.__logger.info('All IDs: ' + str(sorted(list(self.__keypoints.keys()))))
@@ -10,3 +10,10 @@ class Log:
         logger.setLevel(level)
         logger.addHandler(handler)
         return logger
+
+    @staticmethod
+    def close_logger(logger):
+        # a logger with the same name set up again would otherwise also write to the previous log file
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
@@ -0,0 +1,95 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Decide whether a frame has changed enough since the last processed frame to be worth processing, by comparing
+    downscaled grayscale copies of the frames. A frame is static when the fraction of its pixels whose gray level
+    changed by more than pixel_threshold is below threshold.
+    """
+
+    def __init__(self, threshold=0.002, pixel_threshold=20, width=160, refresh_interval=30):
+        """
+        @param threshold: Fraction of changed pixels below which a frame is static
+        @param pixel_threshold: Change of gray level (0 to 255) above which a pixel has changed, larger than the noise
+                                of the video compression
+        @param width: Width of the downscaled frames compared, the height keeps the aspect ratio
+        @param refresh_interval: A frame is processed after this number of static frames in a row even if it is static
+        """
+        if threshold < 0:
+            raise Exception("argument 'threshold' in MotionGate() cannot be negative")
+        if width < 1:
+            raise Exception("argument 'width' in MotionGate() cannot be less than 1")
+        if refresh_interval < 0:
+            raise Exception("argument 'refresh_interval' in MotionGate() cannot be negative")
+        self.__threshold = threshold
+        self.__pixel_threshold = pixel_threshold
+        self.__width = width
+        self.__refresh_interval = refresh_interval
+        self.__reference = None
+        self.__static_in_row = 0
+        self.__checked = 0
+        self.__skipped = 0
+        self.__time = 0.0
+
+    def __downscale(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.__width, max(int(round(height * self.__width / width)), 1))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def getChange(self, frame):
+        """
+        @param frame: Frame
+        @return: Fraction of the pixels changed since the last processed frame, 1 if no frame has been processed
+        """
+        if self.__reference is None:
+            return 1.0
+        difference = cv2.absdiff(self.__downscale(frame), self.__reference)
+        return np.count_nonzero(difference > self.__pixel_threshold) / difference.size
+
+    def isStatic(self, frame):
+        """
+        Check a frame, a frame that is not static becomes the frame the next frames are compared with
+        @param frame: Frame
+        @return: True if the frame can be skipped and the results of the last processed frame reused
+        """
+        start = time.perf_counter()
+        small = self.__downscale(frame)
+        static = False
+        if self.__reference is not None and self.__static_in_row < self.__refresh_interval:
+            difference = cv2.absdiff(small, self.__reference)
+            static = np.count_nonzero(difference > self.__pixel_threshold) < self.__threshold * difference.size
+        if static is True:
+            self.__static_in_row += 1
+            self.__skipped += 1
+        else:
+            self.__reference = small
+            self.__static_in_row = 0
+        self.__checked += 1
+        self.__time += time.perf_counter() - start
+        return static
+
+    def getStats(self):
+        """
+        @return: Dictionary of number of frames checked and skipped, fraction skipped and total time of the checks in
+                 seconds
+        """
+        return {
+            'checked': self.__checked,
+            'skipped': self.__skipped,
+            'skip_rate': self.__skipped / self.__checked if self.__checked > 0 else np.nan,
+            'time': self.__time
+        }
+
+    def reset(self):
+        self.__reference = None
+        self.__static_in_row = 0
+        self.__checked = 0
+        self.__skipped = 0
+        self.__time = 0.0
@@ -0,0 +1,166 @@
+import json
+import os
+
+import numpy as np
+
+
+class NumpyModel:
+    """
+    Forward pass of the Keras pose classifiers using NumPy only, the weights are loaded from a file created by export
+    """
+
+    weights_file = "weights.npz"
+
+    __activations = {
+        'linear': lambda x: x,
+        'relu': lambda x: np.maximum(x, 0),
+        'tanh': np.tanh,
+        'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+        'hard_sigmoid': lambda x: np.clip(0.2 * x + 0.5, 0, 1),
+        'softmax': lambda x: NumpyModel.softmax(x),
+    }
+
+    def __init__(self, path):
+        """
+        @param path: Path of the weights file, or the saved model directory containing the weights file
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, NumpyModel.weights_file)
+        with np.load(path) as weights:
+            self.__layers = json.loads(str(weights['layers']))
+            self.__weights = [
+                [weights['layer{}_{}'.format(i, j)].astype(np.float32) for j in range(layer['num_weights'])]
+                for i, layer in enumerate(self.__layers)
+            ]
+
+    @staticmethod
+    def softmax(x):
+        e = np.exp(x - np.max(x, axis=-1, keepdims=True))
+        return e / np.sum(e, axis=-1, keepdims=True)
+
+    @staticmethod
+    def __activation(name):
+        if name not in NumpyModel.__activations:
+            raise Exception("activation '" + str(name) + "' is not supported by NumpyModel")
+        return NumpyModel.__activations[name]
+
+    @staticmethod
+    def __dense(x, layer, weights):
+        kernel, bias = weights
+        return NumpyModel.__activation(layer['activation'])(x @ kernel + bias)
+
+    @staticmethod
+    def __lstm(x, layer, weights):
+        # gates are ordered as input, forget, cell, output in the kernels, same as Keras
+        kernel, recurrent_kernel, bias = weights
+        units = recurrent_kernel.shape[0]
+        activation = NumpyModel.__activation(layer['activation'])
+        recurrent_activation = NumpyModel.__activation(layer['recurrent_activation'])
+        inputs = x @ kernel + bias
+        h = np.zeros(shape=(x.shape[0], units), dtype=x.dtype)
+        c = np.zeros(shape=(x.shape[0], units), dtype=x.dtype)
+        outputs = []
+        for t in range(x.shape[1]):
+            z = inputs[:, t] + h @ recurrent_kernel
+            i = recurrent_activation(z[:, :units])
+            f = recurrent_activation(z[:, units:2 * units])
+            o = recurrent_activation(z[:, 3 * units:])
+            c = f * c + i * activation(z[:, 2 * units:3 * units])
+            h = o * activation(c)
+            outputs.append(h)
+        if layer['return_sequences']:
+            return np.stack(outputs, axis=1)
+        return h
+
+    def __call__(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        for layer, weights in zip(self.__layers, self.__weights):
+            if layer['type'] == 'Dense':
+                x = NumpyModel.__dense(x, layer, weights)
+            elif layer['type'] == 'LSTM':
+                x = NumpyModel.__lstm(x, layer, weights)
+            elif layer['type'] == 'Flatten':
+                x = x.reshape((x.shape[0], -1))
+            elif layer['type'] == 'Activation':
+                x = NumpyModel.__activation(layer['activation'])(x)
+        return x
+
+    def predict(self, x):
+        """
+        Same as keras.Model.predict
+        @param x: Array of inputs, number of samples x input shape
+        @return: Array of outputs
+        """
+        return self(x)
+
+    @staticmethod
+    def export(keras_model, path):
+        """
+        Export the weights of a Keras Sequential model to a compressed NumPy file
+        @param keras_model: Keras model consisting of Dense, LSTM, Flatten, Dropout and Activation layers
+        @param path: Path of the weights file
+        """
+        layers = []
+        arrays = dict()
+        for layer in keras_model.layers:
+            layer_type = type(layer).__name__
+            if layer_type in ('Dropout', 'InputLayer'):
+                continue
+            if layer_type not in ('Dense', 'LSTM', 'Flatten', 'Activation'):
+                raise Exception("layer '" + layer_type + "' is not supported by NumpyModel")
+            config = layer.get_config()
+            weights = layer.get_weights()
+            layers.append({
+                'type': layer_type,
+                'num_weights': len(weights),
+                'activation': config.get('activation'),
+                'recurrent_activation': config.get('recurrent_activation'),
+                'return_sequences': config.get('return_sequences', False)
+            })
+            for j, weight in enumerate(weights):
+                arrays['layer{}_{}'.format(len(layers) - 1, j)] = weight
+        np.savez_compressed(path, layers=np.array(json.dumps(layers)), **arrays)
+
+    @staticmethod
+    def maxDifference(keras_model, numpy_model, x):
+        """
+        Compare the outputs of a Keras model and a NumpyModel
+        @param keras_model: Keras model
+        @param numpy_model: NumpyModel
+        @param x: Array of inputs
+        @return: Maximum absolute difference of the outputs
+        """
+        return np.max(np.abs(np.asarray(keras_model(x, training=False)) - numpy_model(x)))
+
+    @staticmethod
+    def exportModels(model_dir, tolerance=1e-4, num_samples=1000, seed=0):
+        """
+        Export every saved model in the model directory into a weights file inside its own directory,
+        and check that the outputs of the NumpyModel match the Keras model
+        @param model_dir: Directory of the saved models
+        @param tolerance: Maximum absolute difference of the outputs allowed
+        @param num_samples: Number of random inputs used for the check
+        @param seed: Seed of the random inputs
+        @return: List of paths of the weights files
+        """
+        from tensorflow import keras
+
+        paths = []
+        rng = np.random.default_rng(seed)
+        for model_path in sorted(os.listdir(model_dir)):
+            model_path = os.path.join(model_dir, model_path)
+            keras_model = keras.models.load_model(model_path)
+            path = os.path.join(model_path, NumpyModel.weights_file)
+            NumpyModel.export(keras_model, path)
+            x = rng.random(size=(num_samples,) + tuple(keras_model.input_shape[1:])).astype(np.float32)
+            difference = NumpyModel.maxDifference(keras_model, NumpyModel(path), x)
+            print(path + " Exported, max difference: " + str(difference))
+            if difference > tolerance:
+                raise Exception("outputs of " + path + " differ from the Keras model by " + str(difference))
+            paths.append(path)
+        return paths
+
+
+if __name__ == "__main__":
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    NumpyModel.exportModels(os.path.abspath(dir_path + "/../model"))
@@ -0,0 +1,148 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+
+class Pipeline:
+    """
+    Run the stages of processing a sequence of items on separate threads, connected by bounded queues, e.g.
+
+        pipeline = Pipeline(queue_size=4)
+        pipeline.run(('decode', readFrame), [('estimate', estimate)], ('sink', display))
+        pipeline.printOccupancy()
+
+    Every stage runs on one thread, so the items reach the sink in the order they are produced. A stage waits when the
+    queue after it is full, so a slow stage slows down the stages before it instead of filling the memory.
+    """
+
+    __end = object()
+
+    def __init__(self, queue_size=4):
+        """
+        @param queue_size: Maximum number of items waiting between two stages
+        """
+        if queue_size < 1:
+            raise Exception("argument 'queue_size' in Pipeline() cannot be less than 1")
+        self.__queue_size = queue_size
+        self.__stop = threading.Event()
+        self.__lock = threading.Lock()
+        self.__errors = []
+        self.__busy = OrderedDict()
+        self.__elapsed = 0
+
+    def __fail(self, error):
+        with self.__lock:
+            self.__errors.append(error)
+        self.__stop.set()
+
+    def __put(self, item_queue, item):
+        # the timeout lets the stage stop when another stage fails
+        while not self.__stop.is_set():
+            try:
+                item_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __get(self, item_queue):
+        while not self.__stop.is_set():
+            try:
+                return item_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return Pipeline.__end
+
+    def __runSource(self, name, function, output_queue):
+        try:
+            while not self.__stop.is_set():
+                start = time.perf_counter()
+                item = function()
+                self.__busy[name] += time.perf_counter() - start
+                if item is None or self.__put(output_queue, item) is False:
+                    break
+        except BaseException as e:
+            self.__fail(e)
+        finally:
+            self.__put(output_queue, Pipeline.__end)
+
+    def __runStage(self, name, function, input_queue, output_queue):
+        try:
+            while True:
+                item = self.__get(input_queue)
+                if item is Pipeline.__end:
+                    break
+                start = time.perf_counter()
+                item = function(item)
+                self.__busy[name] += time.perf_counter() - start
+                if self.__put(output_queue, item) is False:
+                    break
+        except BaseException as e:
+            self.__fail(e)
+        finally:
+            self.__put(output_queue, Pipeline.__end)
+
+    def run(self, source, stages, sink):
+        """
+        Run the pipeline until the source has no more items, the first error raised by any stage is raised again
+        @param source: tuple of (name, function), function() returns the next item, None when there are no more items
+        @param stages: List of tuple of (name, function), function(item) returns the item passed to the next stage
+        @param sink: tuple of (name, function), function(item) is called on the calling thread, e.g. to display images
+        """
+        self.__stop.clear()
+        self.__errors = []
+        self.__busy = OrderedDict([(source[0], 0.0)] + [(name, 0.0) for name, function in stages] + [(sink[0], 0.0)])
+        queues = [queue.Queue(maxsize=self.__queue_size) for i in range(len(stages) + 1)]
+        threads = [threading.Thread(target=self.__runSource, args=(source[0], source[1], queues[0]),
+                                    name=source[0], daemon=True)]
+        for i, (name, function) in enumerate(stages):
+            threads.append(threading.Thread(target=self.__runStage, args=(name, function, queues[i], queues[i + 1]),
+                                            name=name, daemon=True))
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            name, function = sink
+            while True:
+                item = self.__get(queues[-1])
+                if item is Pipeline.__end:
+                    break
+                stage_start = time.perf_counter()
+                function(item)
+                self.__busy[name] += time.perf_counter() - stage_start
+        except BaseException as e:
+            self.__fail(e)
+        finally:
+            self.__stop.set()
+            for thread in threads:
+                thread.join()
+            self.__elapsed = time.perf_counter() - start
+        if len(self.__errors) > 0:
+            raise self.__errors[0]
+
+    def getElapsedTime(self):
+        """
+        @return: Time taken by the last run in seconds
+        """
+        return self.__elapsed
+
+    def getOccupancy(self):
+        """
+        Get the fraction of time each stage was working instead of waiting for the other stages in the last run,
+        the stage closest to 1 is the bottleneck
+        @return: OrderedDict of stage name to occupancy
+        """
+        occupancy = OrderedDict()
+        for name, busy in self.__busy.items():
+            occupancy[name] = busy / self.__elapsed if self.__elapsed > 0 else 0.0
+        return occupancy
+
+    def printOccupancy(self, logger=None):
+        lines = ['{:<14} {:>10}'.format('Stage', 'Occupancy')]
+        for name, occupancy in self.getOccupancy().items():
+            lines.append('{:<14} {:>9.1f}%'.format(name, occupancy * 100))
+        print('\n'.join(lines))
+        if logger is not None:
+            logger.info('Pipeline Occupancy:\n' + '\n'.join(lines))
@@ -4,11 +4,10 @@ import numpy as np
 import math
 from enum import Enum
 
-from scipy.stats import stats
-from tensorflow import keras
-
 from utils.utilities import Utilities as Ut
 from utils.body25 import Body25
+from utils.numpy_model import NumpyModel
+from utils.prediction_cache import PredictionCache
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 model_dir = os.path.abspath(dir_path + "/../model")
@@ -20,38 +19,185 @@ class PoseClassifier:
         SITTING = 1
         STANDING = 2
 
+    class Backend(Enum):
+        KERAS = 0
+        NUMPY = 1
+
     class Model:
 
-        def __init__(self):
-            self.__models = self.__loadModels()
+        def __init__(self, backend=None):
+            if backend is None:
+                backend = PoseClassifier.Backend.KERAS
+            self.__backend = backend
+            if backend is PoseClassifier.Backend.NUMPY:
+                self.__models = self.__loadNumpyModels()
+                self.__functions = self.__models
+            else:
+                self.__models = self.__loadModels()
+                self.__functions = [self.__compile(model) for model in self.__models]
+
+        @staticmethod
+        def __loadNumpyModels():
+            # weights files are created by NumpyModel.exportModels
+            return [NumpyModel(os.path.join(model_dir, model_path)) for model_path in os.listdir(model_dir)]
 
         def __loadModels(self):
+            # tensorflow is imported here so that importing this module does not pay for it
+            from tensorflow import keras
             models = []
             model_paths = os.listdir(model_dir)
             for model_path in model_paths:
-                model = keras.models.load_model(model_dir + "\\" + model_path)
+                model = keras.models.load_model(os.path.join(model_dir, model_path))
                 model.trainable = False
                 models.append(model)
             return models
 
+        @staticmethod
+        def __compile(model):
+            import tensorflow as tf
+            # calling the model directly in a graph skips the per-call setup of model.predict
+            input_signature = [tf.TensorSpec(shape=(None,) + Body25.Keypoint.getKeypointShape(), dtype=tf.float32)]
+            return tf.function(lambda x: model(x, training=False), input_signature=input_signature)
+
+        def getBackend(self):
+            return self.__backend
+
         def getModels(self):
             return self.__models
 
-    __model = Model()
+        def getFunctions(self):
+            return self.__functions
+
+        def warmUp(self):
+            # the first call of each function traces the graph
+            keypoints = np.zeros(shape=(1,) + Body25.Keypoint.getKeypointShape(), dtype=np.float32)
+            for function in self.__functions:
+                function(keypoints)
+
+    __model = None
+    __backend = Backend.KERAS
+
+    @staticmethod
+    def setBackend(backend):
+        """
+        Set the backend used to run the models, the models are reloaded on the next use if the backend changes
+        @param backend: PoseClassifier.Backend
+        """
+        if PoseClassifier.__cache is not None and PoseClassifier.__backend is not backend:
+            # the predictions of the backends may differ slightly, so they are not reused
+            PoseClassifier.__cache.clear()
+        PoseClassifier.__backend = backend
+        if PoseClassifier.__model is not None and PoseClassifier.__model.getBackend() is not backend:
+            PoseClassifier.__model = None
+
+    @staticmethod
+    def getModel():
+        """
+        Get the models in the model directory, the models are only loaded on the first call
+        @return: PoseClassifier.Model
+        """
+        if PoseClassifier.__model is None:
+            PoseClassifier.__model = PoseClassifier.Model(PoseClassifier.__backend)
+        return PoseClassifier.__model
+
+    @staticmethod
+    def warmUp():
+        """
+        Load the models and trace them, so that the first prediction does not pay for it
+        """
+        PoseClassifier.getModel().warmUp()
+
+    __cache = None
+
+    @staticmethod
+    def enableCache(max_size=4096, step=0.02):
+        """
+        Cache the predictions of people whose normalized keypoints are nearly identical
+        @param max_size: Maximum number of predictions cached
+        @param step: Quantization step of the normalized keypoints
+        @return: PredictionCache
+        """
+        PoseClassifier.__cache = PredictionCache(max_size=max_size, step=step)
+        return PoseClassifier.__cache
+
+    @staticmethod
+    def disableCache():
+        PoseClassifier.__cache = None
+
+    @staticmethod
+    def getCache():
+        return PoseClassifier.__cache
+
+    @staticmethod
+    def __lookUpCache(name, normalized_keypoints, aspect_ratios=None):
+        """
+        @return: tuple of (keys, cached predictions with None for people not cached, indices of people not cached)
+        """
+        cache = PoseClassifier.__cache
+        if cache is None:
+            return None, [None] * len(normalized_keypoints), np.arange(len(normalized_keypoints))
+        keys = cache.getKeys(normalized_keypoints, aspect_ratios)
+        cached = [cache.get(name, key) for key in keys]
+        missing = np.array([i for i, prediction in enumerate(cached) if prediction is None], dtype=int)
+        return keys, cached, missing
+
+    @staticmethod
+    def __getAspectRatios(keypoints):
+        """
+        The rule based classifier uses angles in pixels, which change when the normalization scales x and y
+        differently, so the aspect ratio of the frame of each person is added to its cache keys
+        @param keypoints: 3D array, number of people x 25 keypoints x 3 (x, y, score)
+        @return: 1D array, height over width of the frame of each person
+        """
+        frames = Body25.getFrameCoordinatesBatch(keypoints)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (frames[:, 3] - frames[:, 1]) / (frames[:, 2] - frames[:, 0])
 
     @staticmethod
     def predictPoseModel(keypoint, logger=None):
         keypoint = Body25.normalizeKeypoint(keypoint)
-        poses = {pose: 0 for pose in PoseClassifier.Pose}
-        for model in PoseClassifier.__model.getModels():
-            pose_prediction = model.predict(np.array([keypoint]))
-            for i in range(len(pose_prediction[0])):
-                poses[PoseClassifier.Pose(i)] += pose_prediction[0][i]
+        keys, cached, _ = PoseClassifier.__lookUpCache('model', np.array([keypoint]))
+        if cached[0] is not None:
+            poses = {pose: cached[0][pose.value] for pose in PoseClassifier.Pose}
+        else:
+            poses = {pose: 0 for pose in PoseClassifier.Pose}
+            for model in PoseClassifier.getModel().getModels():
+                pose_prediction = model.predict(np.array([keypoint]))
+                for i in range(len(pose_prediction[0])):
+                    poses[PoseClassifier.Pose(i)] += pose_prediction[0][i]
+            if keys is not None:
+                PoseClassifier.__cache.put('model', keys[0], np.array([poses[pose] for pose in PoseClassifier.Pose]))
         print(poses)
         if logger is not None:
             logger.info(str(poses))
         return max(poses, key=poses.get)
 
+    @staticmethod
+    def predictPoseModelBatch(keypoints, logger=None):
+        """
+        Batch version of predictPoseModel, every model is called once for all people in a frame
+        @param keypoints: 3D array, number of people x 25 keypoints x 3 (x, y, score)
+        @param logger: Logger to log the probabilities
+        @return: tuple of (pose values, probabilities), probabilities are summed over all models and have shape
+                 number of people x number of poses, both in the same order as the input
+        """
+        keypoints = Body25.normalizeKeypointBatch(keypoints).astype(np.float32)
+        probabilities = np.zeros(shape=(len(keypoints), len(PoseClassifier.Pose)))
+        keys, cached, missing = PoseClassifier.__lookUpCache('model', keypoints)
+        for i, prediction in enumerate(cached):
+            if prediction is not None:
+                probabilities[i] = prediction
+        if len(missing) > 0:
+            for function in PoseClassifier.getModel().getFunctions():
+                probabilities[missing] += np.asarray(function(keypoints[missing]))
+            if keys is not None:
+                for i in missing:
+                    PoseClassifier.__cache.put('model', keys[i], probabilities[i].copy())
+        poses = np.argmax(probabilities, axis=1)
+        if logger is not None:
+            logger.info(str(probabilities))
+        return poses, probabilities
+
     class Scores:
         def __init__(self, logger=None):
             self.__logger = logger
@@ -167,6 +313,12 @@ class PoseClassifier:
         @return:
         """
         keypoint = np.array(keypoint)
+        if PoseClassifier.__cache is not None:
+            key = PoseClassifier.__cache.getKeys(Body25.normalizeKeypointBatch(keypoint),
+                                                 PoseClassifier.__getAspectRatios(keypoint))[0]
+            prediction = PoseClassifier.__cache.get('body25', key)
+            if prediction is not None:
+                return PoseClassifier.Pose(prediction[0])
         Neck = Body25.getCoordinates(keypoint, Body25.Parts.NECK)
         MidHip = Body25.getCoordinates(keypoint, Body25.Parts.MID_HIP)
         RHip = Body25.getCoordinates(keypoint, Body25.Parts.R_HIP)
@@ -212,7 +364,118 @@ class PoseClassifier:
             scores.log()
 
         # Comparing left and right score
-        return PoseClassifier.__determinePose(scores.left_score, scores.right_score)
+        pose = PoseClassifier.__determinePose(scores.left_score, scores.right_score)
+        if PoseClassifier.__cache is not None:
+            joint_scores = np.array([scores.RBody_hip_score, scores.RKnee_hip_score, scores.RKnee_score,
+                                     scores.LBody_hip_score, scores.LKnee_hip_score, scores.LKnee_score])
+            PoseClassifier.__cache.put('body25', key, (pose.value, scores.left_score, scores.right_score, joint_scores))
+        return pose
+
+    __VECTOR_START = [Body25.Parts.MID_HIP.value, Body25.Parts.MID_HIP.value, Body25.Parts.MID_HIP.value,
+                      Body25.Parts.R_KNEE.value, Body25.Parts.R_KNEE.value,
+                      Body25.Parts.L_KNEE.value, Body25.Parts.L_KNEE.value]
+    __VECTOR_END = [Body25.Parts.NECK.value, Body25.Parts.R_KNEE.value, Body25.Parts.L_KNEE.value,
+                    Body25.Parts.R_HIP.value, Body25.Parts.R_ANKLE.value,
+                    Body25.Parts.L_HIP.value, Body25.Parts.L_ANKLE.value]
+    __ANGLE_SIGN = np.array([-1, 1, 1, -1, 1, 1])[:, None]
+
+    @staticmethod
+    def __angleScoreBatch(angle):
+        with np.errstate(invalid='ignore'):
+            return np.where(angle < 2.416,
+                            np.sin(0.5 * (angle + math.pi / 2)),
+                            np.sin(angle) - 0.25 * np.sin(2 * angle))
+
+    @staticmethod
+    def __finalScoreBatch(scores, weights):
+        nan = np.isnan(scores)
+        weights = np.where(nan, 0, np.asarray(weights, dtype=float))
+        sum_score = np.sum(np.where(nan, 0, scores) * weights, axis=-1)
+        sum_weight = np.sum(weights, axis=-1)
+        return np.divide(sum_score, sum_weight, out=np.full_like(sum_score, np.nan), where=sum_weight > 0)
+
+    @staticmethod
+    def __determinePoseBatch(left_score, right_score, threshold=0.5):
+        left_nan = np.isnan(left_score)
+        right_nan = np.isnan(right_score)
+        with np.errstate(invalid='ignore'):
+            probability_sitting = left_score * right_score
+            probability_standing = (1 - left_score) * (1 - right_score)
+            sitting_more = probability_sitting > probability_standing
+            conditions = [
+                left_nan & right_nan,
+                right_nan & (left_score >= threshold),
+                left_nan & (right_score >= threshold),
+                probability_sitting >= threshold ** 2,
+                probability_standing >= threshold ** 2,
+                sitting_more & ((left_score > threshold) | (right_score > threshold)),
+                sitting_more & (((1 - left_score) > threshold) | ((1 - right_score) > threshold))
+            ]
+        choices = [
+            PoseClassifier.Pose.UNKNOWN.value,
+            PoseClassifier.Pose.SITTING.value,
+            PoseClassifier.Pose.SITTING.value,
+            PoseClassifier.Pose.SITTING.value,
+            PoseClassifier.Pose.STANDING.value,
+            PoseClassifier.Pose.SITTING.value,
+            PoseClassifier.Pose.STANDING.value
+        ]
+        return np.select(conditions, choices, default=PoseClassifier.Pose.UNKNOWN.value)
+
+    @staticmethod
+    def predictPoseBody25Batch(keypoints):
+        """
+        Batch version of predictPoseBody25, nothing is printed or logged
+        @param keypoints: 3D array, number of people x 25 keypoints x 3 (x, y, score)
+        @return: tuple of (pose values, left scores, right scores, joint scores), joint scores has shape
+                 number of people x 6, ordered as RBody_hip, RKnee_hip, RKnee, LBody_hip, LKnee_hip, LKnee
+        """
+        keypoints = np.asarray(keypoints, dtype=float).reshape((-1,) + Body25.Keypoint.getKeypointShape())
+        if PoseClassifier.__cache is not None:
+            return PoseClassifier.__predictPoseBody25Cached(keypoints)
+        return PoseClassifier.__predictPoseBody25Batch(keypoints)
+
+    @staticmethod
+    def __predictPoseBody25Batch(keypoints):
+        coords = keypoints[:, :, :Body25.Keypoint.SCORE.value]
+
+        # define vectors of body parts, in the order of
+        # MidHip_Neck, MidHip_RKnee, MidHip_LKnee, RKnee_RHip, RKnee_RAnkle, LKnee_LHip, LKnee_LAnkle
+        vectors = Ut.pointToVectorBatch(coords[:, PoseClassifier.__VECTOR_START],
+                                        coords[:, PoseClassifier.__VECTOR_END],
+                                        ignore_zero_vector=True)
+
+        # find angles in radians between body parts, in the order of
+        # RBody_hip, RKnee_hip, RKnee, LBody_hip, LKnee_hip, LKnee
+        first = vectors[:, [0, 0, 3, 0, 0, 5]]
+        second = vectors[:, [3, 1, 4, 5, 2, 6]] * PoseClassifier.__ANGLE_SIGN
+        joint_scores = PoseClassifier.__angleScoreBatch(Ut.angleBetweenBatch(first, second))
+
+        # find final score of right and left side, each ordered as (body hip, knee, knee hip)
+        side_scores = PoseClassifier.__finalScoreBatch(joint_scores[:, [[0, 2, 1], [3, 5, 4]]], (1, 1, 2))
+        right_score = side_scores[:, 0]
+        left_score = side_scores[:, 1]
+
+        poses = PoseClassifier.__determinePoseBatch(left_score, right_score)
+        return poses, left_score, right_score, joint_scores
+
+    @staticmethod
+    def __predictPoseBody25Cached(keypoints):
+        keys, cached, missing = PoseClassifier.__lookUpCache('body25', Body25.normalizeKeypointBatch(keypoints),
+                                                             PoseClassifier.__getAspectRatios(keypoints))
+        poses = np.zeros(shape=len(keypoints), dtype=int)
+        left_score = np.zeros(shape=len(keypoints))
+        right_score = np.zeros(shape=len(keypoints))
+        joint_scores = np.zeros(shape=(len(keypoints), 6))
+        for i, prediction in enumerate(cached):
+            if prediction is not None:
+                poses[i], left_score[i], right_score[i], joint_scores[i] = prediction
+        if len(missing) > 0:
+            predictions = PoseClassifier.__predictPoseBody25Batch(keypoints[missing])
+            poses[missing], left_score[missing], right_score[missing], joint_scores[missing] = predictions
+            for i in missing:
+                PoseClassifier.__cache.put('body25', keys[i], (poses[i], left_score[i], right_score[i], joint_scores[i].copy()))
+        return poses, left_score, right_score, joint_scores
 
 
 if __name__ == "__main__":
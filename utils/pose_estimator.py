@@ -1,78 +1,337 @@
+import time
+
 import cv2
 import numpy as np
 
+from utils.body25 import Body25
 from utils.openpose import OpenPose
-from collections import OrderedDict
+from utils.pose_estimator_backend import PoseEstimatorBackend
+from collections import OrderedDict, deque
 
 op = OpenPose.op
 
 
-class PoseEstimator:
+class WrapperCache:
+    """
+    Bounded least recently used cache of started OpenPose wrappers, keyed on their full parameters, so that switching
+    between configurations does not load the networks again. An evicted wrapper is stopped to free its memory.
+    """
+
+    def __init__(self, max_size=2):
+        """
+        @param max_size: Maximum number of wrappers kept started, each one holds its own copy of the networks
+        """
+        if max_size < 1:
+            raise Exception("argument 'max_size' in WrapperCache() cannot be less than 1")
+        self.__max_size = max_size
+        self.__wrappers = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    @staticmethod
+    def getKey(params):
+        return tuple(sorted((name, str(value)) for name, value in params.items()))
+
+    def get(self, params):
+        """
+        @param params: Dictionary of OpenPose parameters
+        @return: Started op.WrapperPython configured with params, created and started if it is not cached
+        """
+        key = WrapperCache.getKey(params)
+        if key in self.__wrappers:
+            self.__wrappers.move_to_end(key)
+            self.__hits += 1
+            return self.__wrappers[key]
+        self.__misses += 1
+        # the least recently used wrappers are stopped before the new one is started, so the memory stays bounded
+        while len(self.__wrappers) >= self.__max_size:
+            self.__wrappers.popitem(last=False)[1].stop()
+            self.__evictions += 1
+        wrapper = op.WrapperPython()
+        wrapper.configure(dict(params))
+        wrapper.start()
+        self.__wrappers[key] = wrapper
+        return wrapper
+
+    def clear(self):
+        """
+        Stop all wrappers
+        """
+        while len(self.__wrappers) > 0:
+            self.__wrappers.popitem(last=False)[1].stop()
+
+    def __len__(self):
+        return len(self.__wrappers)
+
+    def getMaxSize(self):
+        return self.__max_size
+
+    def getStats(self):
+        return {
+            'size': len(self.__wrappers),
+            'hits': self.__hits,
+            'misses': self.__misses,
+            'evictions': self.__evictions
+        }
 
-    def __init__(self, face=False, hand=False):
+
+class PoseEstimator(PoseEstimatorBackend):
+
+    # height of the network input used by OpenPose when net_resolution is not given
+    default_net_resolution = 368
+    # heights of the network input chosen from in adaptive mode, OpenPose requires multiples of 16
+    adaptive_net_resolutions = (368, 320, 256, 208, 160, 128)
+
+    def __init__(self, face=False, hand=False, net_resolution=None, adaptive_resolution=False, min_person_height=96,
+                 resolution_window=30, max_wrappers=2):
+        """
+        @param face: Detect face keypoints
+        @param hand: Detect hand keypoints
+        @param net_resolution: Height of the network input in pixels, a multiple of 16, the OpenPose default if not
+                               given, a smaller input is faster but misses small people
+        @param adaptive_resolution: Choose the height of the network input of each image from adaptive_net_resolutions,
+                                    as the smallest one at which the median height of the people in recent images is
+                                    at least min_person_height
+        @param min_person_height: Height of a person in the network input in pixels below which the pose is not
+                                  estimated reliably, used in adaptive mode
+        @param resolution_window: Number of recent images whose people are used in adaptive mode, an image is also
+                                  processed at the largest resolution once per window so that people missed at a small
+                                  resolution are found again
+        @param max_wrappers: Maximum number of OpenPose wrappers kept started, switching back to a configuration
+                             (face, hand or resolution) still cached is cheap, in adaptive mode at least 2 so that the
+                             largest resolution and the one in use stay started
+        """
+        if net_resolution is not None and (net_resolution < 16 or net_resolution % 16 != 0):
+            raise Exception("argument 'net_resolution' in PoseEstimator() must be a positive multiple of 16")
+        if resolution_window < 1:
+            raise Exception("argument 'resolution_window' in PoseEstimator() cannot be less than 1")
         self.__params = dict()
         self.__params["model_folder"] = OpenPose.model_path
         self.__params["face"] = face
         self.__params["hand"] = hand
+        if net_resolution is not None:
+            self.__params["net_resolution"] = "-1x" + str(net_resolution)
 
-        self.__opWrapper = self.__createWrapper(self.__params)
-        self.__opWrapper.start()
+        self.__wrappers = WrapperCache(max_size=max_wrappers)
+        # in adaptive mode the wrappers of the resolutions used are created when they are first used
+        self.__opWrapper = self.__wrappers.get(self.__params) if adaptive_resolution is False else None
 
         self.__datum = op.Datum()
 
-    def __createWrapper(self, params):
-        opWrapper = op.WrapperPython()
-        opWrapper.configure(self.__params)
-        return opWrapper
+        self.__adaptive_resolution = adaptive_resolution
+        self.__min_person_height = min_person_height
+        self.__resolution_window = resolution_window
+        self.__person_heights = deque(maxlen=resolution_window)
+        self.__num_images = 0
+        self.__net_resolution = net_resolution
+        self.__scale = 1.0
+        self.__output_image = None
+        self.__pose_keypoints = None
+        self.__face_keypoints = None
+        self.__hand_keypoints = [None, None]
+        self.__resolution_stats = OrderedDict()
+
+    def __reconfigure(self):
+        # a configuration used recently is still started in the cache
+        if self.__adaptive_resolution is False:
+            self.__opWrapper = self.__wrappers.get(self.__params)
+
+    def __getWrapper(self):
+        if self.__opWrapper is None:
+            self.__opWrapper = self.__wrappers.get(self.__params)
+        return self.__opWrapper
 
     def setFace(self, face):
         self.__params["face"] = face
-        self.__opWrapper = self.__createWrapper(self.__params)
-        self.__opWrapper.start()
+        self.__reconfigure()
 
     def setHand(self, hand):
         self.__params["hand"] = hand
-        self.__opWrapper = self.__createWrapper(self.__params)
-        self.__opWrapper.start()
+        self.__reconfigure()
 
     def setParams(self, face, hand):
         self.__params["face"] = face
         self.__params["hand"] = hand
-        self.__opWrapper = self.__createWrapper(self.__params)
-        self.__opWrapper.start()
+        self.__reconfigure()
+
+    def shutdown(self):
+        """
+        Stop all OpenPose wrappers to free their memory, the next image processed starts a wrapper again
+        """
+        self.__wrappers.clear()
+        self.__opWrapper = None
+
+    def getWrapperStats(self):
+        """
+        @return: Dictionary of number of wrappers started, hits, misses and evictions of the wrapper cache
+        """
+        return self.__wrappers.getStats()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        return False
+
+    def __chooseNetResolution(self, image_height):
+        # a probe at the largest resolution once per window finds the people missed at a smaller one
+        if len(self.__person_heights) == 0 or self.__num_images % self.__resolution_window == 0:
+            return max(PoseEstimator.adaptive_net_resolutions)
+        heights = np.concatenate(self.__person_heights)
+        if len(heights) == 0:
+            return max(PoseEstimator.adaptive_net_resolutions)
+        required = self.__min_person_height * image_height / np.median(heights)
+        for net_resolution in sorted(PoseEstimator.adaptive_net_resolutions):
+            if net_resolution >= required:
+                return net_resolution
+        return max(PoseEstimator.adaptive_net_resolutions)
+
+    def __getAdaptiveWrapper(self, net_resolution):
+        params = dict(self.__params)
+        params["net_resolution"] = "-1x" + str(net_resolution)
+        return self.__wrappers.get(params)
+
+    @staticmethod
+    def __keypointsOf(keypoints, scale):
+        try:
+            len(keypoints)
+        except TypeError:
+            return None
+        if scale == 1:
+            return keypoints
+        # zero keypoints of undetected parts stay zero
+        keypoints = np.array(keypoints)
+        keypoints[..., :Body25.Keypoint.SCORE.value] /= scale
+        return keypoints
 
     def processImage(self, image):
-        self.__datum.cvInputData = image
-        self.__opWrapper.emplaceAndPop([self.__datum])
+        if self.__adaptive_resolution is False:
+            self.__datum.cvInputData = image
+            self.__getWrapper().emplaceAndPop([self.__datum])
+            self.__output_image = self.__datum.cvOutputData
+            self.__pose_keypoints = self.__datum.poseKeypoints
+            self.__face_keypoints = self.__datum.faceKeypoints
+            self.__hand_keypoints = self.__datum.handKeypoints
+            return
+
+        start = time.perf_counter()
+        image_height, image_width = image.shape[:2]
+        net_resolution = self.__chooseNetResolution(image_height)
+        # the image is shrunk to the network input here, instead of by OpenPose, and the keypoints are mapped back
+        self.__scale = min(net_resolution / image_height, 1.0)
+        if self.__scale < 1:
+            self.__datum.cvInputData = cv2.resize(image, (max(int(round(image_width * self.__scale)), 1),
+                                                          net_resolution), interpolation=cv2.INTER_AREA)
+        else:
+            self.__datum.cvInputData = image
+        self.__getAdaptiveWrapper(net_resolution).emplaceAndPop([self.__datum])
+        self.__net_resolution = net_resolution
+        self.__num_images += 1
+
+        self.__output_image = self.__datum.cvOutputData
+        if self.__scale < 1 and self.__output_image is not None:
+            self.__output_image = cv2.resize(self.__output_image, (image_width, image_height),
+                                             interpolation=cv2.INTER_LINEAR)
+        self.__pose_keypoints = PoseEstimator.__keypointsOf(self.__datum.poseKeypoints, self.__scale)
+        self.__face_keypoints = PoseEstimator.__keypointsOf(self.__datum.faceKeypoints, self.__scale)
+        self.__hand_keypoints = [PoseEstimator.__keypointsOf(keypoints, self.__scale)
+                                 for keypoints in (self.__datum.handKeypoints or [None, None])]
+
+        heights = np.array([])
+        if self.__pose_keypoints is not None and len(self.__pose_keypoints) > 0:
+            frames = Body25.getFrameCoordinatesBatch(self.__pose_keypoints)
+            heights = frames[:, 3] - frames[:, 1]
+            heights = heights[heights > 0]
+        self.__person_heights.append(heights)
+
+        if net_resolution not in self.__resolution_stats:
+            self.__resolution_stats[net_resolution] = {'images': 0, 'time': 0.0}
+        self.__resolution_stats[net_resolution]['images'] += 1
+        self.__resolution_stats[net_resolution]['time'] += time.perf_counter() - start
+
+    def processImages(self, images, output_images=False):
+        """
+        Estimate the poses of several images in one call to OpenPose with one datum per image, so the results of each
+        image are independent and stay valid after the next call. The results of the last image are also returned by
+        the get methods. In adaptive mode the images are processed one by one, as the resolution is chosen per image.
+        @param images: List of images
+        @param output_images: Also return the images with the skeletons drawn on them
+        @return: tuple of (list of pose keypoints of each image, list of output images or None)
+        """
+        if self.__adaptive_resolution is True:
+            return PoseEstimatorBackend.processImages(self, images, output_images)
+        if len(images) == 0:
+            return [], [] if output_images is True else None
+        datums = [op.Datum() for image in images]
+        for datum, image in zip(datums, images):
+            datum.cvInputData = image
+        self.__getWrapper().emplaceAndPop(datums)
+
+        keypoints = []
+        for datum in datums:
+            try:
+                len(datum.poseKeypoints)
+                keypoints.append(datum.poseKeypoints)
+            except TypeError:
+                keypoints.append(np.array([]))
+        self.__output_image = datums[-1].cvOutputData
+        self.__pose_keypoints = datums[-1].poseKeypoints
+        self.__face_keypoints = datums[-1].faceKeypoints
+        self.__hand_keypoints = datums[-1].handKeypoints
+        if output_images is True:
+            return keypoints, [datum.cvOutputData for datum in datums]
+        return keypoints, None
+
+    def getNetResolution(self):
+        """
+        @return: Height of the network input used for the last image, None for the OpenPose default
+        """
+        return self.__net_resolution
+
+    def getResolutionStats(self):
+        """
+        @return: OrderedDict of height of the network input to the number of images processed and the mean latency in
+                 milliseconds, in adaptive mode
+        """
+        stats = OrderedDict()
+        for net_resolution in sorted(self.__resolution_stats.keys(), reverse=True):
+            images = self.__resolution_stats[net_resolution]['images']
+            stats[net_resolution] = {
+                'images': images,
+                'latency': self.__resolution_stats[net_resolution]['time'] * 1000 / images
+            }
+        return stats
 
     def getOutputImage(self):
-        return self.__datum.cvOutputData
+        return self.__output_image
 
     def getPoseKeypoints(self):
         try:
-            len(self.__datum.poseKeypoints)
-            return self.__datum.poseKeypoints
+            len(self.__pose_keypoints)
+            return self.__pose_keypoints
         except TypeError:
             return np.array([])
 
     def getFaceKeypoints(self):
         try:
-            len(self.__datum.faceKeypoints)
-            return self.__datum.faceKeypoints
+            len(self.__face_keypoints)
+            return self.__face_keypoints
         except TypeError:
             return np.array([])
 
     def getLeftHandKeypoints(self):
         try:
-            len(self.__datum.handKeypoints[0])
-            return self.__datum.handKeypoints[0]
+            len(self.__hand_keypoints[0])
+            return self.__hand_keypoints[0]
         except TypeError:
             return np.array([])
 
     def getRightHandKeypoints(self):
         try:
-            len(self.__datum.handKeypoints[1])
-            return self.__datum.handKeypoints[1]
+            len(self.__hand_keypoints[1])
+            return self.__hand_keypoints[1]
         except TypeError:
             return np.array([])
 
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+class PoseEstimatorBackend:
+    """
+    Interface of the pose estimators used by VideoPose, ImagePose and generate_dataset, implemented by PoseEstimator
+    with OpenPose and by SyntheticPoseEstimator. An image is processed with processImage, then the results of that
+    image are read with the get methods, e.g.
+
+        pose_estimator.processImage(image)
+        keypoints = pose_estimator.getPoseKeypoints()
+    """
+
+    def processImage(self, image):
+        """
+        @param image: Image to estimate the poses of
+        """
+        raise NotImplementedError(type(self).__name__ + ".processImage() is not implemented")
+
+    def getOutputImage(self):
+        """
+        @return: Image processed by the last processImage with the skeletons drawn on it
+        """
+        raise NotImplementedError(type(self).__name__ + ".getOutputImage() is not implemented")
+
+    def getPoseKeypoints(self):
+        """
+        @return: BODY_25 keypoints of the image processed by the last processImage, number of people x 25 keypoints x
+                 3 (x, y, score), an empty array if there is no person
+        """
+        raise NotImplementedError(type(self).__name__ + ".getPoseKeypoints() is not implemented")
+
+    def processImages(self, images, output_images=False):
+        """
+        Estimate the poses of several images, the results are independent of the estimator and of each other, so they
+        stay valid after the next call. The results of the last image are also returned by the get methods.
+        @param images: List of images
+        @param output_images: Also return the images with the skeletons drawn on them
+        @return: tuple of (list of pose keypoints of each image, list of output images or None)
+        """
+        keypoints = []
+        outputs = [] if output_images is True else None
+        for image in images:
+            self.processImage(image)
+            keypoints.append(np.array(self.getPoseKeypoints()))
+            if output_images is True:
+                outputs.append(np.array(self.getOutputImage()))
+        return keypoints, outputs
+
+    def getPosePredictions(self):
+        """
+        @return: tuple of (pose values, probabilities) of the people in the last image as returned by
+                 PoseClassifier.predictPoseModelBatch, if the estimator classifies the poses itself, otherwise None
+        """
+        return None
+
+    def getFaceKeypoints(self):
+        return np.array([])
+
+    def getLeftHandKeypoints(self):
+        return np.array([])
+
+    def getRightHandKeypoints(self):
+        return np.array([])
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    Bounded least recently used cache of classifier predictions, keyed on quantized normalized keypoints
+    """
+
+    def __init__(self, max_size=4096, step=0.02):
+        """
+        @param max_size: Maximum number of predictions kept, the least recently used one is evicted first
+        @param step: Quantization step of the normalized keypoints, keypoints that round to the same multiples
+                     of step share the same prediction
+        """
+        if max_size < 1:
+            raise Exception("argument 'max_size' in PredictionCache() cannot be less than 1")
+        if step <= 0:
+            raise Exception("argument 'step' in PredictionCache() must be positive")
+        self.__max_size = max_size
+        self.__step = step
+        self.__predictions = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def getKeys(self, normalized_keypoints, aspect_ratios=None):
+        """
+        Get the cache keys of normalized keypoints
+        @param normalized_keypoints: 3D array, number of people x 25 keypoints x 3, output of
+                                     Body25.normalizeKeypointBatch
+        @param aspect_ratios: 1D array, height over width of the frame of each person, added to the keys of
+                              classifiers whose prediction changes with it
+        @return: List of keys, one for each person
+        """
+        # keypoints of people with a zero width or height frame contain nan after normalization
+        quantized = np.round(np.nan_to_num(normalized_keypoints, nan=-1.0) / self.__step).astype(np.int32)
+        keys = [keypoint.tobytes() for keypoint in quantized]
+        if aspect_ratios is None:
+            return keys
+        # the logarithm makes the quantization the same for tall and wide frames
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_ratios = np.log(np.asarray(aspect_ratios, dtype=float))
+        quantized_ratios = np.round(np.nan_to_num(log_ratios, nan=0.0, posinf=1e6, neginf=-1e6) / self.__step)
+        return [key + ratio.tobytes() for key, ratio in zip(keys, quantized_ratios.astype(np.int32))]
+
+    def get(self, name, key):
+        """
+        @param name: Name of the classifier
+        @param key: Key from getKeys
+        @return: The cached prediction, None if it is not cached
+        """
+        try:
+            prediction = self.__predictions[(name, key)]
+        except KeyError:
+            self.__misses += 1
+            return None
+        self.__predictions.move_to_end((name, key))
+        self.__hits += 1
+        return prediction
+
+    def put(self, name, key, prediction):
+        """
+        @param name: Name of the classifier
+        @param key: Key from getKeys
+        @param prediction: Prediction to be cached
+        """
+        self.__predictions[(name, key)] = prediction
+        self.__predictions.move_to_end((name, key))
+        while len(self.__predictions) > self.__max_size:
+            self.__predictions.popitem(last=False)
+            self.__evictions += 1
+
+    def clear(self):
+        self.__predictions.clear()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def getStep(self):
+        return self.__step
+
+    def getMaxSize(self):
+        return self.__max_size
+
+    def getHits(self):
+        return self.__hits
+
+    def getMisses(self):
+        return self.__misses
+
+    def getEvictions(self):
+        return self.__evictions
+
+    def getStats(self):
+        total = self.__hits + self.__misses
+        return {
+            'size': len(self.__predictions),
+            'hits': self.__hits,
+            'misses': self.__misses,
+            'evictions': self.__evictions,
+            'hit_rate': self.__hits / total if total > 0 else np.nan
+        }
+
+    def __len__(self):
+        return len(self.__predictions)
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+import numpy as np
+
+
+class Profiler:
+    """
+    Time the stages of processing each frame, e.g.
+
+        profiler = Profiler()
+        with profiler.stage('estimate'):
+            pose_estimator.processImage(frame)
+        profiler.printSummary()
+
+    A disabled profiler returns the same empty context for every stage, so it costs almost nothing to leave the
+    calls in place
+    """
+
+    class Stage:
+
+        def __init__(self, profiler, name, frame=None):
+            self.__profiler = profiler
+            self.__name = name
+            self.__frame = frame
+            self.__start = None
+
+        def __enter__(self):
+            self.__start = time.perf_counter()
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            self.__profiler.record(self.__name, self.__start, time.perf_counter(), self.__frame)
+            return False
+
+    __null_stage = nullcontext()
+
+    def __init__(self, enabled=True, trace=False):
+        """
+        @param enabled: Time the stages, a disabled profiler records nothing
+        @param trace: Keep every stage as an event for exportTrace, otherwise only the durations are kept
+        """
+        self.__enabled = enabled
+        self.__trace = trace
+        self.__origin = time.perf_counter()
+        self.__frame = None
+        self.__durations = OrderedDict()
+        self.__events = []
+        self.__lock = threading.Lock()
+
+    def isEnabled(self):
+        return self.__enabled
+
+    def setFrame(self, frame):
+        """
+        Set the frame number attached to the stages recorded afterwards
+        @param frame: Frame number
+        """
+        self.__frame = frame
+
+    def stage(self, name, frame=None):
+        """
+        @param name: Name of the stage
+        @param frame: Frame number, the frame set by setFrame if not given, required when frames are processed on
+                      several threads at the same time
+        @return: Context manager timing the code inside it
+        """
+        if self.__enabled is False:
+            return Profiler.__null_stage
+        return Profiler.Stage(self, name, frame)
+
+    def record(self, name, start, end, frame=None):
+        """
+        Record a stage timed outside of stage()
+        @param name: Name of the stage
+        @param start: Start time from time.perf_counter()
+        @param end: End time from time.perf_counter()
+        @param frame: Frame number, the frame set by setFrame if not given
+        """
+        if self.__enabled is False:
+            return
+        if frame is None:
+            frame = self.__frame
+        with self.__lock:
+            if name not in self.__durations:
+                self.__durations[name] = []
+            self.__durations[name].append(end - start)
+            if self.__trace is True:
+                self.__events.append({
+                    'name': name,
+                    'ph': 'X',
+                    'ts': (start - self.__origin) * 1e6,
+                    'dur': (end - start) * 1e6,
+                    'pid': os.getpid(),
+                    'tid': threading.get_ident(),
+                    'args': {'frame': frame}
+                })
+
+    def getDurations(self, name):
+        """
+        @param name: Name of the stage
+        @return: List of durations of the stage in seconds
+        """
+        return list(self.__durations.get(name, []))
+
+    def getSummary(self):
+        """
+        @return: Dictionary of stage name to count, total, p50, p95 and max in milliseconds
+        """
+        summary = OrderedDict()
+        with self.__lock:
+            for name, durations in self.__durations.items():
+                durations = np.array(durations) * 1000
+                summary[name] = {
+                    'count': len(durations),
+                    'total': np.sum(durations),
+                    'p50': np.percentile(durations, 50),
+                    'p95': np.percentile(durations, 95),
+                    'max': np.max(durations)
+                }
+        return summary
+
+    def printSummary(self, logger=None):
+        lines = ['{:<12} {:>7} {:>12} {:>10} {:>10} {:>10}'.format('Stage', 'Count', 'Total (ms)', 'p50', 'p95', 'Max')]
+        for name, stats in self.getSummary().items():
+            lines.append('{:<12} {:>7} {:>12.2f} {:>10.2f} {:>10.2f} {:>10.2f}'.format(
+                name, stats['count'], stats['total'], stats['p50'], stats['p95'], stats['max']))
+        print('\n'.join(lines))
+        if logger is not None:
+            logger.info('Profile:\n' + '\n'.join(lines))
+
+    def exportTrace(self, path):
+        """
+        Write the recorded stages in Chrome trace event format, which can be opened in chrome://tracing or Perfetto
+        @param path: Path of the json file
+        """
+        if self.__trace is False:
+            raise Exception("Profiler.exportTrace() requires the profiler to be created with trace=True")
+        with self.__lock:
+            events = list(self.__events)
+        with open(path, 'w') as outfile:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, outfile)
+
+    def reset(self):
+        with self.__lock:
+            self.__durations.clear()
+            self.__events.clear()
+        self.__origin = time.perf_counter()
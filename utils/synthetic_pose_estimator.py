@@ -0,0 +1,155 @@
+import math
+
+import cv2
+import numpy as np
+
+from utils.body25 import Body25
+from utils.pose_classifier import PoseClassifier
+from utils.pose_estimator_backend import PoseEstimatorBackend
+
+
+class SyntheticPoseEstimator(PoseEstimatorBackend):
+    """
+    Pose estimator generating a crowd of standing and sitting people instead of estimating the poses in the image, to
+    run and benchmark VideoPose, ImagePose and generate_dataset without OpenPose. The people are created on the first
+    processImage within the size of that image, and every processImage is the next frame of the same crowd, so the
+    same seed and sequence of image sizes always give the same keypoints. Standing people walk around the image and
+    bounce off its edges, sitting people stay in place.
+    """
+
+    # keypoints of a standing person facing the camera and a sitting person facing right, in units of the height of a
+    # standing person, with the mid hip at the origin
+    __STANDING = np.array([
+        [0.000, -0.400], [0.000, -0.320], [-0.100, -0.310], [-0.120, -0.170], [-0.120, -0.040],
+        [0.100, -0.310], [0.120, -0.170], [0.120, -0.040], [0.000, 0.000], [-0.055, 0.000],
+        [-0.055, 0.240], [-0.055, 0.460], [0.055, 0.000], [0.055, 0.240], [0.055, 0.460],
+        [-0.020, -0.420], [0.020, -0.420], [-0.040, -0.410], [0.040, -0.410], [0.045, 0.500],
+        [0.075, 0.500], [0.055, 0.480], [-0.045, 0.500], [-0.075, 0.500], [-0.055, 0.480]
+    ])
+    __SITTING = np.array([
+        [0.060, -0.400], [0.000, -0.320], [-0.010, -0.310], [0.010, -0.170], [0.120, -0.080],
+        [0.010, -0.310], [0.030, -0.170], [0.140, -0.080], [0.000, 0.000], [-0.010, 0.000],
+        [0.230, -0.010], [0.220, 0.220], [0.010, 0.000], [0.250, -0.010], [0.240, 0.220],
+        [0.070, -0.420], [0.080, -0.420], [0.010, -0.410], [0.030, -0.410], [0.310, 0.240],
+        [0.290, 0.245], [0.220, 0.240], [0.290, 0.240], [0.270, 0.245], [0.200, 0.240]
+    ])
+    __LIMBS = [(1, 8), (1, 2), (1, 5), (2, 3), (3, 4), (5, 6), (6, 7), (8, 9), (9, 10), (10, 11), (8, 12), (12, 13),
+               (13, 14), (1, 0), (0, 15), (15, 17), (0, 16), (16, 18), (14, 19), (19, 20), (14, 21), (11, 22),
+               (22, 23), (11, 24)]
+
+    def __init__(self, num_people=10, speed=2.0, occlusion=0.1, sitting_ratio=0.5, jitter=1.0,
+                 person_height=(0.25, 0.45), draw_skeleton=True, seed=0):
+        """
+        @param num_people: Number of people in every frame
+        @param speed: Distance walked by standing people in pixels per frame
+        @param occlusion: Probability of each part of a person not being detected in a frame, the part is zeroed
+        @param sitting_ratio: Fraction of the people sitting
+        @param jitter: Standard deviation of the noise added to every keypoint in pixels
+        @param person_height: tuple of (min, max) height of a standing person as a fraction of the image height
+        @param draw_skeleton: Draw the skeletons on a copy of the image in getOutputImage, otherwise the image is
+                              returned as it is
+        @param seed: Seed of the crowd
+        """
+        if num_people < 0:
+            raise Exception("argument 'num_people' in SyntheticPoseEstimator() cannot be negative")
+        if not 0 <= occlusion <= 1:
+            raise Exception("argument 'occlusion' in SyntheticPoseEstimator() must be between 0 and 1")
+        if not 0 <= sitting_ratio <= 1:
+            raise Exception("argument 'sitting_ratio' in SyntheticPoseEstimator() must be between 0 and 1")
+        self.__num_people = int(num_people)
+        self.__speed = speed
+        self.__occlusion = occlusion
+        self.__sitting_ratio = sitting_ratio
+        self.__jitter = jitter
+        self.__person_height = person_height
+        self.__draw_skeleton = draw_skeleton
+        self.__seed = seed
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the crowd, the next processImage creates it again from the seed
+        """
+        self.__rng = np.random.default_rng(self.__seed)
+        self.__frame_size = None
+        self.__shapes = None
+        self.__sitting = None
+        self.__positions = None
+        self.__velocities = None
+        self.__low = None
+        self.__high = None
+        self.__keypoints = np.array([])
+        self.__output_image = None
+
+    def __createPeople(self, frame_width, frame_height):
+        rng = self.__rng
+        n = self.__num_people
+        self.__sitting = np.zeros(n, dtype=bool)
+        self.__sitting[rng.permutation(n)[:int(round(n * self.__sitting_ratio))]] = True
+        heights = rng.uniform(self.__person_height[0], self.__person_height[1], size=n) * frame_height
+        shapes = np.where(self.__sitting[:, None, None], SyntheticPoseEstimator.__SITTING,
+                          SyntheticPoseEstimator.__STANDING) + rng.normal(0, 0.01, size=(n, 25, 2))
+        # sitting people face left or right
+        shapes[:, :, 0] *= np.where(self.__sitting & (rng.random(size=n) < 0.5), -1, 1)[:, None]
+        self.__shapes = shapes * heights[:, None, None]
+
+        # the mid hip stays where the whole person is inside the image
+        self.__low = -np.min(self.__shapes, axis=1)
+        self.__high = np.maximum([frame_width, frame_height] - np.max(self.__shapes, axis=1), self.__low)
+        self.__positions = self.__low + rng.random(size=(n, 2)) * (self.__high - self.__low)
+        angles = rng.uniform(0, 2 * math.pi, size=n)
+        self.__velocities = self.__speed * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        self.__velocities[self.__sitting] = 0
+        self.__frame_size = (frame_width, frame_height)
+
+    def __move(self):
+        positions = self.__positions + self.__velocities
+        below = positions < self.__low
+        above = positions > self.__high
+        positions = np.where(below, 2 * self.__low - positions, positions)
+        positions = np.where(above, 2 * self.__high - positions, positions)
+        self.__positions = np.clip(positions, self.__low, self.__high)
+        self.__velocities[below | above] *= -1
+
+    def processImage(self, image):
+        """
+        Generate the next frame of the crowd, the crowd is created again when the size of the image changes
+        @param image: Image, only its size is used unless the skeletons are drawn
+        """
+        frame_height, frame_width = image.shape[:2]
+        if self.__frame_size != (frame_width, frame_height):
+            self.__createPeople(frame_width, frame_height)
+        else:
+            self.__move()
+
+        rng = self.__rng
+        n = self.__num_people
+        keypoints = np.zeros((n,) + Body25.Keypoint.getKeypointShape(), dtype=np.float32)
+        keypoints[:, :, :Body25.Keypoint.SCORE.value] = self.__positions[:, None, :] + self.__shapes + \
+            rng.normal(0, self.__jitter, size=(n, 25, 2))
+        keypoints[:, :, Body25.Keypoint.SCORE.value] = rng.uniform(0.4, 0.95, size=(n, 25))
+        keypoints[rng.random(size=(n, 25)) < self.__occlusion] = 0
+        self.__keypoints = keypoints if n > 0 else np.array([])
+
+        if self.__draw_skeleton is True:
+            self.__output_image = np.array(image)
+            # every limb with both ends detected is drawn in one call
+            limbs = keypoints[:, SyntheticPoseEstimator.__LIMBS]
+            detected = np.all(limbs[:, :, :, Body25.Keypoint.SCORE.value] > 0, axis=2)
+            cv2.polylines(self.__output_image, list(limbs[detected][:, :, :Body25.Keypoint.SCORE.value]
+                                                    .astype(np.int32)), False, (0, 255, 0), 2)
+        else:
+            self.__output_image = image
+
+    def getOutputImage(self):
+        return self.__output_image
+
+    def getPoseKeypoints(self):
+        return self.__keypoints
+
+    def getPoses(self):
+        """
+        @return: List of the true PoseClassifier.Pose of the people, in the order of getPoseKeypoints
+        """
+        return [PoseClassifier.Pose.SITTING if sitting else PoseClassifier.Pose.STANDING
+                for sitting in self.__sitting] if self.__sitting is not None else []
@@ -0,0 +1,132 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.body25 import Body25
+from utils.pose_classifier import PoseClassifier
+
+
+class TrackedPoseClassifier:
+    """
+    Classify the poses of the people tracked by KeypointTracker with PoseClassifier.predictPoseBody25Batch, the pose of
+    a person is reused in the following frames until the person moves or the pose is too old
+    """
+
+    def __init__(self, drift_threshold=0.05, max_age=30):
+        """
+        @param drift_threshold: A person is classified again when the mean distance between the normalized keypoints
+                                and the normalized keypoints when it was last classified is larger than this,
+                                a part detected in only one of them counts as a distance of 1
+        @param max_age: A person is classified again after this number of frames, and the pose of a person missing
+                        for this number of frames is forgotten
+        """
+        if drift_threshold < 0:
+            raise Exception("argument 'drift_threshold' in TrackedPoseClassifier() cannot be negative")
+        if max_age < 1:
+            raise Exception("argument 'max_age' in TrackedPoseClassifier() cannot be less than 1")
+        self.__drift_threshold = drift_threshold
+        self.__max_age = max_age
+        self.__frame = 0
+        self.__normalized = OrderedDict()
+        self.__detected = OrderedDict()
+        self.__predictions = OrderedDict()
+        self.__classified_frame = OrderedDict()
+        self.__last_seen = OrderedDict()
+        self.__classified = 0
+        self.__reused = 0
+
+    def __forget(self, object_id):
+        del self.__normalized[object_id]
+        del self.__detected[object_id]
+        del self.__predictions[object_id]
+        del self.__classified_frame[object_id]
+        del self.__last_seen[object_id]
+
+    def getDrift(self, object_id, normalized_keypoint, detected):
+        """
+        @param object_id: Object ID from KeypointTracker
+        @param normalized_keypoint: Normalized keypoints of the person, output of Body25.normalizeKeypointBatch
+        @param detected: Detected parts of the person, output of Body25.getValidMask
+        @return: Mean distance from the normalized keypoints when the person was last classified,
+                 np.inf if the person has not been classified
+        """
+        if object_id not in self.__normalized:
+            return np.inf
+        previous = self.__normalized[object_id]
+        previous_detected = self.__detected[object_id]
+        both = detected & previous_detected
+        num_parts = np.count_nonzero(detected | previous_detected)
+        if num_parts == 0:
+            return 0.0
+        difference = normalized_keypoint[both, :Body25.Keypoint.SCORE.value] - \
+            previous[both, :Body25.Keypoint.SCORE.value]
+        distance = np.sum(np.sqrt(np.sum(difference * difference, axis=1)))
+        return (distance + np.count_nonzero(detected ^ previous_detected)) / num_parts
+
+    def predict(self, keypoints_in_frame):
+        """
+        Predict the poses of the people in a frame, only the people who are new, have moved or whose pose is too old
+        are classified
+        @param keypoints_in_frame: OrderedDict of object ID to keypoints, output of KeypointTracker.getKeypointsInFrame
+        @return: tuple of (pose values, left scores, right scores), in the order of keypoints_in_frame
+        """
+        self.__frame += 1
+        object_ids = list(keypoints_in_frame.keys())
+        keypoints = np.array(list(keypoints_in_frame.values()), dtype=float) \
+            .reshape((-1,) + Body25.Keypoint.getKeypointShape())
+        detected = Body25.getValidMask(keypoints)
+        normalized = Body25.normalizeKeypointBatch(keypoints, detected)
+
+        stale = list()
+        for i, object_id in enumerate(object_ids):
+            if object_id in self.__classified_frame and \
+                    self.__frame - self.__classified_frame[object_id] < self.__max_age and \
+                    self.getDrift(object_id, normalized[i], detected[i]) <= self.__drift_threshold:
+                continue
+            stale.append(i)
+
+        if len(stale) > 0:
+            poses, left_scores, right_scores, _ = PoseClassifier.predictPoseBody25Batch(keypoints[stale])
+            for i, pose, left_score, right_score in zip(stale, poses, left_scores, right_scores):
+                object_id = object_ids[i]
+                self.__normalized[object_id] = normalized[i]
+                self.__detected[object_id] = detected[i]
+                self.__predictions[object_id] = (pose, left_score, right_score)
+                self.__classified_frame[object_id] = self.__frame
+        self.__classified += len(stale)
+        self.__reused += len(object_ids) - len(stale)
+
+        for object_id in object_ids:
+            self.__last_seen[object_id] = self.__frame
+        for object_id in list(self.__last_seen.keys()):
+            if self.__frame - self.__last_seen[object_id] >= self.__max_age:
+                self.__forget(object_id)
+
+        poses = np.array([self.__predictions[object_id][0] for object_id in object_ids], dtype=int)
+        left_scores = np.array([self.__predictions[object_id][1] for object_id in object_ids], dtype=float)
+        right_scores = np.array([self.__predictions[object_id][2] for object_id in object_ids], dtype=float)
+        return poses, left_scores, right_scores
+
+    def getClassified(self):
+        return self.__classified
+
+    def getReused(self):
+        return self.__reused
+
+    def getStats(self):
+        total = self.__classified + self.__reused
+        return {
+            'classified': self.__classified,
+            'reused': self.__reused,
+            'reuse_rate': self.__reused / total if total > 0 else np.nan
+        }
+
+    def reset(self):
+        self.__frame = 0
+        self.__normalized.clear()
+        self.__detected.clear()
+        self.__predictions.clear()
+        self.__classified_frame.clear()
+        self.__last_seen.clear()
+        self.__classified = 0
+        self.__reused = 0
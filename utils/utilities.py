@@ -70,6 +70,41 @@ class Utilities:
                 angle = angle / math.pi * 180
                 return angle
 
+    @staticmethod
+    def pointToVectorBatch(p1, p2, ignore_zero_vector=False):
+        """
+        Batch version of pointToVector, points are stored in the last axis
+        @param ignore_zero_vector: If either point 1 or point 2 is zero vector, the vector is filled with np.nan
+        @param p1: Array of point 1
+        @param p2: Array of point 2
+        @return: Array of vectors
+        """
+        p1 = np.asarray(p1, dtype=float)
+        p2 = np.asarray(p2, dtype=float)
+        vector = np.subtract(p1, p2)
+        if ignore_zero_vector:
+            zero = ~np.any(p1 != 0, axis=-1) | ~np.any(p2 != 0, axis=-1)
+            vector[zero] = np.nan
+        return vector
+
+    @staticmethod
+    def angleBetweenBatch(v1, v2, radians=True):
+        """
+        Batch version of angleBetween, vectors are stored in the last axis
+        @param v1: Array of vector 1
+        @param v2: Array of vector 2
+        @param radians: Return angle in radians
+        @return: Array of angles, np.nan where either vector contains np.nan
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            uv1 = v1 / np.linalg.norm(v1, axis=-1, keepdims=True)
+            uv2 = v2 / np.linalg.norm(v2, axis=-1, keepdims=True)
+            angle = np.abs(np.arccos(np.sum(uv1 * uv2, axis=-1)))
+        if radians is True:
+            return angle
+        else:
+            return angle / math.pi * 180
+
 
 if __name__ == "__main__":
     path = "image/processed/image.jpg"
@@ -1,22 +1,178 @@
+import multiprocessing
 import os
+import queue
+import time
 from datetime import datetime
 
 import cv2
 import numpy as np
 
 from utils.file_path import FilePath
+from utils.frame_ring_buffer import FrameRingBuffer
+from utils.frame_writer import FrameWriter
 from utils.image_processing import ImageProcessing
+from utils.keypoint_recording import KeypointRecorder, KeypointRecording
 from utils.keypoint_tracker import KeypointTracker
 from utils.log import Log
+from utils.motion_gate import MotionGate
+from utils.pipeline import Pipeline
 from utils.pose_classifier import PoseClassifier
-from utils.pose_estimator import PoseEstimator
+from utils.profiler import Profiler
+from utils.tracked_pose_classifier import TrackedPoseClassifier
 
 
 class VideoPose:
 
-    def __init__(self):
-        self.__pose_estimator = PoseEstimator(face=False, hand=False)
+    def __init__(self, pose_estimator=None):
+        """
+        @param pose_estimator: Pose estimator implementing PoseEstimatorBackend, e.g. SyntheticPoseEstimator, a
+                               PoseEstimator with OpenPose is created when the first video is analyzed if not given
+        """
+        self.__pose_estimator = pose_estimator
         self.__keypoint_tracker = None
+        self.__tracked_pose_classifier = None
+        self.__pipeline = None
+        self.__motion_gate_stats = None
+
+    def __getPoseEstimator(self):
+        # OpenPose is only loaded when a video is analyzed, replay does not need it
+        if self.__pose_estimator is None:
+            from utils.pose_estimator import PoseEstimator
+            self.__pose_estimator = PoseEstimator(face=False, hand=False)
+        return self.__pose_estimator
+
+    def __createKeypointTracker(self, frame_width, frame_height, frames_to_disappear, predict_motion, logger,
+                                verbose=True):
+        if predict_motion is True:
+            motion = KeypointTracker.Motion.CONSTANT_VELOCITY
+        else:
+            motion = KeypointTracker.Motion.STATIC
+        if frames_to_disappear is None:
+            self.__keypoint_tracker = KeypointTracker(
+                frame_width=frame_width,
+                frame_height=frame_height,
+                logger=logger,
+                motion=motion,
+                verbose=verbose
+            )
+        else:
+            self.__keypoint_tracker = KeypointTracker(
+                frame_width=frame_width,
+                frame_height=frame_height,
+                max_disappeared=frames_to_disappear,
+                logger=logger,
+                motion=motion,
+                verbose=verbose
+            )
+
+    @staticmethod
+    def skipFrames(cap, num_frames):
+        """
+        Skip frames of a video with grab(), which does not decode the frames like read()
+        @param cap: cv2.VideoCapture
+        @param num_frames: Number of frames to skip
+        @return: False if the end of the video is reached
+        """
+        for i in range(num_frames):
+            if cap.grab() is False:
+                return False
+        return True
+
+    @staticmethod
+    def seek(cap, video_path, frame_index):
+        """
+        Move to a frame of the video by seeking, if the video cannot seek to the exact frame, the video is opened again
+        and the frames before it are skipped with grab()
+        @param cap: cv2.VideoCapture of the video
+        @param video_path: Path of the video
+        @param frame_index: Index of the next frame to be read, starting from 0
+        @return: cv2.VideoCapture at the frame, which may be a new one
+        """
+        if frame_index <= 0:
+            return cap
+        if cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index) is True and \
+                int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_index:
+            return cap
+        cap.release()
+        cap = cv2.VideoCapture(video_path)
+        VideoPose.skipFrames(cap, frame_index)
+        return cap
+
+    @staticmethod
+    def decodeToRingBuffer(ring, video_path, frame_index, step, num_frames, seek=True):
+        """
+        Decode frames of a video into the slots of a FrameRingBuffer, run in a separate process by analyze with
+        decode_process=True, every frame is read straight into its slot
+        @param ring: FrameRingBuffer with slots of the size of the frames
+        @param video_path: Path of the video
+        @param frame_index: Index of the first frame to be decoded, starting from 0
+        @param step: Number of frames from one decoded frame to the next
+        @param num_frames: Maximum number of frames decoded
+        @param seek: Move to the first frame by seeking, otherwise the frames before it are skipped with grab()
+        """
+        cap = None
+        parent = multiprocessing.parent_process()
+        try:
+            cap = cv2.VideoCapture(video_path)
+            if seek is True:
+                cap = VideoPose.seek(cap, video_path, frame_index)
+            else:
+                VideoPose.skipFrames(cap, frame_index)
+            count = 0
+            while count < num_frames and cap.isOpened():
+                try:
+                    slot = ring.acquire(timeout=1.0)
+                except queue.Full:
+                    if parent is not None and parent.is_alive() is False:
+                        # the analyzing process has died without stopping the ring buffer
+                        return
+                    continue
+                if slot is None:
+                    break
+                seq, view = slot
+                VideoPose.skipFrames(cap, step - 1)
+                ret, frame = cap.read(view)
+                if ret is False or frame is None:
+                    break
+                if frame is not view:
+                    # the frame is not the size of the slot
+                    view[...] = frame
+                ring.commit(seq)
+                count += 1
+            ring.finish()
+        except Exception as e:
+            ring.finish(error=repr(e))
+        finally:
+            if cap is not None:
+                cap.release()
+            ring.close()
+
+    @staticmethod
+    def __stopDecoder(ring, decoder):
+        ring.stop()
+        decoder.join(timeout=5)
+        if decoder.is_alive():
+            decoder.terminate()
+            decoder.join()
+        ring.unlink()
+
+    def getOccupancy(self):
+        """
+        Get the fraction of time each stage of the last threaded analyze was working, the stage closest to 1 is the
+        bottleneck
+        @return: OrderedDict of stage name to occupancy, None if analyze has not been run with threaded=True
+        """
+        if self.__pipeline is None:
+            return None
+        return self.__pipeline.getOccupancy()
+
+    def getMotionGateStats(self):
+        """
+        Get the statistics of the motion gate of the last analyze with motion_gate=True
+        @return: Dictionary of MotionGate.getStats with 'time_saved', the estimated time in seconds of estimating and
+                 post-processing the skipped frames, None if analyze has not been run with motion_gate=True
+        """
+        return self.__motion_gate_stats
 
     def analyze(self,
                 video_path,
@@ -33,16 +189,41 @@ class VideoPose:
                 display_image=True,
                 wait_key=1,
                 log=False,
-                export_frame=False):
+                export_frame=False,
+                profiler=None,
+                predict_motion=False,
+                reuse_pose=False,
+                pose_drift_threshold=0.05,
+                pose_max_age=30,
+                seek=True,
+                threaded=False,
+                queue_size=4,
+                export_video=False,
+                video_codec='mp4v',
+                writer_threads=2,
+                record_keypoints=None,
+                motion_gate=False,
+                motion_threshold=0.002,
+                motion_refresh=30,
+                decode_process=False,
+                ring_slots=8):
 
         if start_frame < 1:
             raise Exception("argument 'start_frame' in VideoPose.analyze() cannot be less than 1")
+        if reuse_pose is True and (classify_pose is False or track_pose_id is False):
+            raise Exception("argument 'reuse_pose' in VideoPose.analyze() requires 'classify_pose' and 'track_pose_id'")
+        if profiler is None:
+            profiler = Profiler(enabled=False)
+        if queue_size < 1:
+            raise Exception("argument 'queue_size' in VideoPose.analyze() cannot be less than 1")
+        if ring_slots < 1:
+            raise Exception("argument 'ring_slots' in VideoPose.analyze() cannot be less than 1")
 
         fp = FilePath(video_path)
         dir_name = fp.getDirectory() + "\\" + fp.getFileName() + "\\"
         time_identifier = datetime.now().strftime("%Y%m%d-%H%M%S-")
 
-        if export_frame is True or log is True:
+        if export_frame is True or export_video is True or log is True:
             try:
                 os.mkdir(dir_name)
                 print("Directory", dir_name, "Created ")
@@ -56,6 +237,13 @@ class VideoPose:
         else:
             logger = None
 
+        frame_writer = None
+        recorder = None
+        # the video writer is created with the size of the first output image
+        video_writer = [None]
+        ring = None
+        decoder = None
+        output_video_path = dir_name + time_identifier + fp.getFileName() + ".mp4"
         try:
             cap = cv2.VideoCapture(video_path)
             original_fps = cap.get(cv2.CAP_PROP_FPS)
@@ -64,100 +252,359 @@ class VideoPose:
             if fps is None:
                 fps = original_fps
             if track_pose_id is True:
-                if frames_to_disappear is None:
-                    self.__keypoint_tracker = KeypointTracker(
-                        frame_width=frame_width,
-                        frame_height=frame_height,
-                        logger=logger
-                    )
-                else:
-                    self.__keypoint_tracker = KeypointTracker(
-                        frame_width=frame_width,
-                        frame_height=frame_height,
-                        max_disappeared=frames_to_disappear,
-                        logger=logger
-                    )
-
-            num_frame = start_frame
-            for i in range(start_frame):
-                cap.read()
-                for j in range(int(original_fps / fps) - 1):
-                    cap.read()
-
-            while cap.isOpened() and (max_frame is None or num_frame <= max_frame):
-                ret, frame = cap.read()
-                for i in range(int(original_fps / fps) - 1):
-                    ret, frame = cap.read()
+                self.__createKeypointTracker(frame_width, frame_height, frames_to_disappear, predict_motion, logger)
+            if reuse_pose is True:
+                self.__tracked_pose_classifier = TrackedPoseClassifier(
+                    drift_threshold=pose_drift_threshold,
+                    max_age=pose_max_age
+                )
 
+            # every frame processed is the last of int(original_fps / fps) frames, the frames before are skipped
+            step = max(int(original_fps / fps), 1)
+            if decode_process is True and cap.isOpened():
+                # the frames are decoded by another process into shared memory, the process is spawned without the
+                # state of this process, which OpenPose and CUDA require
+                cap.release()
+                context = multiprocessing.get_context('spawn')
+                ring = FrameRingBuffer(ring_slots, (int(frame_height), int(frame_width), 3), context=context)
+                num_frames = np.inf if max_frame is None else max_frame - start_frame + 1
+                decoder = context.Process(target=VideoPose.decodeToRingBuffer,
+                                          args=(ring, video_path, start_frame * step, step, num_frames, seek),
+                                          daemon=True)
+                decoder.start()
+            elif seek is True:
+                cap = VideoPose.seek(cap, video_path, start_frame * step)
+            else:
+                VideoPose.skipFrames(cap, start_frame * step)
+            pose_estimator = self.__getPoseEstimator()
+            if record_keypoints is not None:
+                recorder = KeypointRecorder(record_keypoints, frame_width, frame_height,
+                                            original_fps / step if original_fps > 0 else fps)
+            if export_frame is True:
+                frame_writer = FrameWriter(num_workers=writer_threads, queue_size=writer_threads * 8)
+            if motion_gate is True:
+                gate = MotionGate(threshold=motion_threshold, refresh_interval=motion_refresh)
+            else:
+                gate = None
+            # keypoints of the last frame estimated, output image and keypoints of the last frame post-processed,
+            # and the time taken to estimate and post-process the frames processed and their number, each written by
+            # one stage only
+            last_keypoints = [np.array([])]
+            last_output = [None, None]
+            processed_time = [0.0, 0.0, 0]
+
+            # each frame goes through decode, estimate, postProcess and sink, as one tuple of
+            # (frame number, start time, output image, keypoints)
+            next_frame = [start_frame]
+
+            def decodeFromRingBuffer():
+                num_frame = next_frame[0]
+                frame_start = time.perf_counter()
+                with profiler.stage('decode', num_frame):
+                    while True:
+                        try:
+                            slot = ring.get(timeout=1.0)
+                            break
+                        except queue.Empty:
+                            if decoder.is_alive() is False:
+                                raise Exception("VideoPose.analyze() decoder process exited with code " +
+                                                str(decoder.exitcode))
+                if slot is None:
+                    return None
+                # the frame is a view of its slot, which is released by the sink, so the sequence number of the
+                # frame is its frame number from the start frame
+                _, frame = slot
+                next_frame[0] += 1
+                return num_frame, frame_start, frame, None
+
+            def decode():
+                num_frame = next_frame[0]
+                if ring is not None:
+                    return decodeFromRingBuffer()
+                if not cap.isOpened() or (max_frame is not None and num_frame > max_frame):
+                    return None
+                frame_start = time.perf_counter()
+                with profiler.stage('decode', num_frame):
+                    VideoPose.skipFrames(cap, step - 1)
+                    ret, frame = cap.read()
                 if ret is False or frame is None:
-                    break
+                    return None
+                next_frame[0] += 1
+                return num_frame, frame_start, frame, None
 
+            def estimate(item):
+                num_frame, frame_start, frame, _ = item
+                static = False
+                if gate is not None:
+                    with profiler.stage('gate', num_frame):
+                        static = gate.isStatic(frame)
+                if static is True:
+                    # no output image tells postProcess to reuse the results of the last processed frame
+                    outputImage = None
+                    keypoints = last_keypoints[0]
+                else:
+                    estimate_start = time.perf_counter()
+                    with profiler.stage('estimate', num_frame):
+                        pose_estimator.processImage(frame)
+                        if show_skeleton is True:
+                            outputImage = pose_estimator.getOutputImage()
+                        else:
+                            outputImage = frame
+                        keypoints = pose_estimator.getPoseKeypoints()
+                        if threaded is True or (ring is not None and gate is not None):
+                            # the estimator may reuse its buffers for the next frame, and the output image may be the
+                            # slot of the frame in the ring buffer, which is reused after the sink while the output of
+                            # the last processed frame is kept for static frames
+                            outputImage = np.array(outputImage)
+                            keypoints = np.array(keypoints)
+                    last_keypoints[0] = keypoints
+                    processed_time[0] += time.perf_counter() - estimate_start
+                    processed_time[2] += 1
+                if recorder is not None:
+                    with profiler.stage('record', num_frame):
+                        recorder.write(num_frame, keypoints)
+                return num_frame, frame_start, outputImage, keypoints
+
+            def postProcess(item):
+                num_frame, frame_start, outputImage, keypoints = item
+                if outputImage is None:
+                    print("Processing Frame:", num_frame, "(static)")
+                    if log is True:
+                        logger.info('Processing Frame: ' + str(num_frame) + ' (static)')
+                    return num_frame, frame_start, last_output[0], last_output[1]
+                post_start = time.perf_counter()
                 print("Processing Frame:", num_frame)
                 if log is True:
                     logger.info('Processing Frame: ' + str(num_frame))
 
-                self.__pose_estimator.processImage(frame)
-                if show_skeleton is True:
-                    outputImage = self.__pose_estimator.getOutputImage()
-                else:
-                    outputImage = frame
-                keypoints = self.__pose_estimator.getPoseKeypoints()
                 if show_num_of_people is True:
-                    ImageProcessing.outputNumberOfPeopleToImage(outputImage, len(keypoints))
+                    with profiler.stage('draw', num_frame):
+                        ImageProcessing.outputNumberOfPeopleToImage(outputImage, len(keypoints))
+
+                if track_pose_id is True:
+                    with profiler.stage('track', num_frame):
+                        self.__keypoint_tracker.update(keypoints)
+                        tracked_keypoints = self.__keypoint_tracker.getKeypointsInFrame()
 
                 if classify_pose is True:
+                    with profiler.stage('classify', num_frame):
+                        if reuse_pose is True:
+                            # poses are attached to the tracked people, which are all the people in the frame
+                            keypoints = list(tracked_keypoints.values())
+                            poses, left_scores, right_scores = self.__tracked_pose_classifier.predict(
+                                tracked_keypoints)
+                        else:
+                            poses, left_scores, right_scores, _ = PoseClassifier.predictPoseBody25Batch(keypoints)
+                    pose_texts = []
                     index = 1
-                    for keypoint in keypoints:
+                    for keypoint, pose, left_score, right_score in zip(keypoints, poses, left_scores, right_scores):
                         print('Passenger', index)
                         if log is True:
                             logger.info('Passenger' + str(index))
                             logger.info('\n' + str(keypoint))
-                        pose = PoseClassifier.predictPoseBody25(keypoint, logger)
+                            logger.info('Right_score: ' + str(right_score))
+                            logger.info('Left_score: ' + str(left_score))
+                        pose = PoseClassifier.Pose(pose)
                         text = str(index) + ': ' + pose.name
                         print(text + "\n")
                         if log is True:
                             logger.info('Passenger ' + text + '\n')
-                        if show_pose is True:
-                            ImageProcessing.outputIndividualPoseToImage(outputImage, text, keypoint)
+                        pose_texts.append(text)
                         index += 1
+                    if show_pose is True:
+                        with profiler.stage('draw', num_frame):
+                            for keypoint, text in zip(keypoints, pose_texts):
+                                ImageProcessing.outputIndividualPoseToImage(outputImage, text, keypoint)
 
-                if track_pose_id is True:
-                    self.__keypoint_tracker.update(keypoints)
-                    keypoints = self.__keypoint_tracker.getKeypointsInFrame()
-                    if show_pose_id is True:
-                        for (pose_id, keypoint) in zip(keypoints.keys(), keypoints.values()):
+                if track_pose_id is True and show_pose_id is True:
+                    with profiler.stage('draw', num_frame):
+                        for (pose_id, keypoint) in zip(tracked_keypoints.keys(), tracked_keypoints.values()):
                             ImageProcessing.outputIndividualIdToImage(outputImage, pose_id, keypoint)
+                last_output[0] = outputImage
+                last_output[1] = keypoints
+                processed_time[1] += time.perf_counter() - post_start
+                return item[:2] + (outputImage, keypoints)
 
+            def sink(item):
+                num_frame, frame_start, outputImage, _ = item
                 if export_frame is True:
                     output_path = dir_name + time_identifier + 'Frame ' + str(num_frame) + ".jpg"
-                    cv2.imwrite(output_path, outputImage)
+                    with profiler.stage('export', num_frame):
+                        frame_writer.write(output_path, outputImage)
                     print(output_path)
-                    print('Successfully saved' + '\n')
+                    print('Queued for saving' + '\n')
                     if log is True:
                         logger.info(output_path)
-                        logger.info('Successfully saved' + '\n')
+                        logger.info('Queued for saving' + '\n')
+
+                if export_video is True:
+                    with profiler.stage('export', num_frame):
+                        if video_writer[0] is None:
+                            height, width = outputImage.shape[:2]
+                            video_fps = original_fps / step if original_fps > 0 else fps
+                            video_writer[0] = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*video_codec),
+                                                              video_fps, (width, height))
+                            if video_writer[0].isOpened() is False:
+                                raise Exception("VideoPose.analyze() could not open video writer for " +
+                                                output_video_path)
+                        video_writer[0].write(outputImage)
 
                 if display_image is True:
                     try:
-                        cv2.imshow(video_path, outputImage)
-                        cv2.waitKey(wait_key)
+                        with profiler.stage('display', num_frame):
+                            cv2.imshow(video_path, outputImage)
+                            cv2.waitKey(wait_key)
                     except Exception as e:
                         if log is True:
                             logger.error(e)
                         print(e)
 
-                num_frame += 1
+                profiler.record('frame', frame_start, time.perf_counter(), num_frame)
+                if ring is not None:
+                    ring.release(num_frame - start_frame)
+
+            if threaded is True:
+                # the sink runs on this thread, as cv2.imshow may only work on the main thread
+                self.__pipeline = Pipeline(queue_size=queue_size)
+                self.__pipeline.run(('decode', decode),
+                                    [('estimate', estimate), ('post-process', postProcess)],
+                                    ('sink', sink))
+            else:
+                while True:
+                    item = decode()
+                    if item is None:
+                        break
+                    sink(postProcess(estimate(item)))
+
+            if decoder is not None:
+                stats = ring.getStats()
+                VideoPose.__stopDecoder(ring, decoder)
+                text = 'Decoder Process: {} frames through {} slots of {:.2f} MB, waited {:.2f} s for frames'.format(
+                    stats['got'], ring_slots, ring.getSlotBytes() / 2 ** 20, stats['wait_time'])
+                print(text)
+                if log is True:
+                    logger.info(text)
+            if recorder is not None:
+                recorder.close()
+                text = 'Recorded keypoints: ' + record_keypoints
+                print(text)
+                if log is True:
+                    logger.info(text)
+            if frame_writer is not None:
+                frame_writer.close()
+                text = 'Exported {} frames: {:.2f} MB'.format(frame_writer.getCount(),
+                                                              frame_writer.getBytesWritten() / 2 ** 20)
+                print(text)
+                if log is True:
+                    logger.info(text)
+            if video_writer[0] is not None:
+                video_writer[0].release()
+                text = 'Exported video {}: {:.2f} MB'.format(output_video_path,
+                                                             os.path.getsize(output_video_path) / 2 ** 20)
+                print(text)
+                if log is True:
+                    logger.info(text)
 
             print("Done")
             if log is True:
                 logger.info("Done")
+            if reuse_pose is True:
+                stats = self.__tracked_pose_classifier.getStats()
+                text = 'Pose Classification: {} classified, {} reused ({:.1%})'.format(
+                    stats['classified'], stats['reused'], stats['reuse_rate'])
+                print(text)
+                if log is True:
+                    logger.info(text)
+            if gate is not None:
+                self.__motion_gate_stats = gate.getStats()
+                self.__motion_gate_stats['time_saved'] = self.__motion_gate_stats['skipped'] * \
+                    ((processed_time[0] + processed_time[1]) / processed_time[2] if processed_time[2] > 0 else 0.0)
+                text = 'Motion Gate: {} of {} frames skipped ({:.1%}), about {:.2f} s saved, ' \
+                       'the gate took {:.2f} s'.format(self.__motion_gate_stats['skipped'],
+                                                        self.__motion_gate_stats['checked'],
+                                                        self.__motion_gate_stats['skip_rate'],
+                                                        self.__motion_gate_stats['time_saved'],
+                                                        self.__motion_gate_stats['time'])
+                print(text)
+                if log is True:
+                    logger.info(text)
+            if profiler.isEnabled():
+                profiler.printSummary(logger)
+            if threaded is True:
+                self.__pipeline.printOccupancy(logger)
+            if log is True:
+                Log.close_logger(logger)
 
         except Exception as e:
+            if decoder is not None:
+                VideoPose.__stopDecoder(ring, decoder)
+            if recorder is not None:
+                recorder.close()
+            if frame_writer is not None:
+                frame_writer.close(raise_error=False)
+            if video_writer[0] is not None:
+                video_writer[0].release()
             if log is True:
                 logger.error(e)
+                Log.close_logger(logger)
             print(e)
             raise e
 
+    def replay(self,
+               recording_path,
+               start_frame=None,
+               max_frame=np.inf,
+               classify_pose=True,
+               reuse_pose=False,
+               pose_drift_threshold=0.05,
+               pose_max_age=30,
+               track_pose_id=True,
+               frames_to_disappear=None,
+               predict_motion=False):
+        """
+        Track and classify the people in the keypoints recorded by analyze(record_keypoints=...), without reading the
+        video or running OpenPose, to try other tracker and classifier settings quickly
+        @param recording_path: Path of the recording
+        @param start_frame: First frame number replayed, the first recorded frame if not given
+        @param max_frame: Last frame number replayed
+        @return: List of dictionary of each frame with 'frame' (frame number), 'keypoints', 'ids' (ID of each person if
+                 track_pose_id) and 'poses' (pose value of each person if classify_pose), the people are in the order
+                 of KeypointTracker.getKeypointsInFrame if track_pose_id
+        """
+        if reuse_pose is True and (classify_pose is False or track_pose_id is False):
+            raise Exception("argument 'reuse_pose' in VideoPose.replay() requires 'classify_pose' and 'track_pose_id'")
+
+        recording = KeypointRecording(recording_path)
+        if track_pose_id is True:
+            self.__createKeypointTracker(recording.getFrameWidth(), recording.getFrameHeight(), frames_to_disappear,
+                                         predict_motion, None, verbose=False)
+        if reuse_pose is True:
+            self.__tracked_pose_classifier = TrackedPoseClassifier(
+                drift_threshold=pose_drift_threshold,
+                max_age=pose_max_age
+            )
+
+        results = []
+        for num_frame, keypoints in recording:
+            if start_frame is not None and num_frame < start_frame:
+                continue
+            if max_frame is not None and num_frame > max_frame:
+                break
+            result = {'frame': num_frame, 'keypoints': keypoints, 'ids': None, 'poses': None}
+            if track_pose_id is True:
+                self.__keypoint_tracker.update(keypoints)
+                tracked_keypoints = self.__keypoint_tracker.getKeypointsInFrame()
+                result['ids'] = list(tracked_keypoints.keys())
+                result['keypoints'] = np.array(list(tracked_keypoints.values()), dtype=np.float32) \
+                    .reshape(keypoints.shape)
+            if classify_pose is True:
+                if reuse_pose is True:
+                    result['poses'] = self.__tracked_pose_classifier.predict(tracked_keypoints)[0]
+                else:
+                    result['poses'] = PoseClassifier.predictPoseBody25Batch(result['keypoints'])[0]
+            results.append(result)
+        return results
+
 
 if __name__ == "__main__":
 